@@ -0,0 +1,57 @@
+"""Snippet import throughput, one POST per snippet vs. the bulk endpoint.
+
+    python -m benchmarks.bulk_snippets [--count 1000]
+
+Both variants upload the same snippets with distinct code so every one
+of them has to be rendered.
+"""
+import argparse
+import json
+import time
+
+from benchmarks.utils import setup_django, test_database
+
+
+def make_items(count, offset):
+    return [{'code': 'def f{0}(x):\n    return x * {0}\n'.format(offset + i),
+             'language': 'python'}
+            for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+
+    with test_database():
+        user = User.objects.create_user(username='bench')
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        items = make_items(args.count, 0)
+        start = time.perf_counter()
+        for item in items:
+            res = client.post('/snippets/', item, format='json')
+            assert res.status_code == 201, res.data
+        single = time.perf_counter() - start
+
+        items = make_items(args.count, args.count)
+        body = '\n'.join(json.dumps(item) for item in items)
+        start = time.perf_counter()
+        res = client.post('/snippets/bulk/', body,
+                          content_type='application/x-ndjson')
+        assert res.status_code == 207, res.data
+        bulk = time.perf_counter() - start
+
+        print('{:>10} {:>10} {:>12}'.format('mode', 'seconds', 'snippets/s'))
+        for mode, seconds in (('single', single), ('bulk', bulk)):
+            print('{:>10} {:>10.2f} {:>12.0f}'.format(
+                mode, seconds, args.count / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Compare two result files written by ``benchmarks.suite``.
+
+    python -m benchmarks.compare before.json after.json [--threshold 20]
+
+Prints the p50 latency, query count and peak allocation of each
+endpoint and lexer side by side. Exits with status 1 when a p50 grew by
+more than ``--threshold`` percent or an endpoint runs more queries.
+"""
+import argparse
+import json
+import sys
+
+
+def change(before, after):
+    if not before:
+        return 0.0
+    return (after - before) / before * 100
+
+
+def compare_section(title, before, after, threshold):
+    """Print one section and return the names that regressed"""
+    regressions = []
+    print('{:<28} {:>9} {:>9} {:>8} {:>8} {:>11}'.format(
+        title, 'p50 ms', 'after', 'change', 'queries', 'peak KiB'))
+    for name in sorted(set(before) & set(after)):
+        old, new = before[name], after[name]
+        p50_change = change(old['p50'], new['p50'])
+        queries = ''
+        if 'queries' in new:
+            queries = '{}->{}'.format(old.get('queries'), new['queries'])
+        peak = ''
+        if 'alloc_peak_kib' in new:
+            peak = '{:.0f}->{:.0f}'.format(old.get('alloc_peak_kib', 0),
+                                           new['alloc_peak_kib'])
+        regressed = (p50_change > threshold or
+                     new.get('queries', 0) > old.get('queries', 0))
+        if regressed:
+            regressions.append(name)
+        print('{:<28} {:>9.2f} {:>9.2f} {:>+7.0f}% {:>8} {:>11}{}'.format(
+            name, old['p50'], new['p50'], p50_change, queries, peak,
+            '  !' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='Allowed p50 increase in percent.')
+    args = parser.parse_args()
+
+    with open(args.before) as before_file:
+        before = json.load(before_file)
+    with open(args.after) as after_file:
+        after = json.load(after_file)
+
+    for key in ('dataset', 'database'):
+        if before['meta'][key] != after['meta'][key]:
+            print('Warning: {} differs ({} vs {})'.format(
+                key, before['meta'][key], after['meta'][key]))
+
+    regressions = compare_section('endpoint', before['endpoints'],
+                                  after['endpoints'], args.threshold)
+    print()
+    regressions += compare_section('Snippet.save render', before['render'],
+                                   after['render'], args.threshold)
+    if regressions:
+        print('\nRegressed: ' + ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
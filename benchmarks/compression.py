@@ -0,0 +1,90 @@
+"""Size and latency of compressed highlights.
+
+    python -m benchmarks.compression [--size small] [--repeat 30]
+
+Reports, over the distinct highlights of a synthetic dataset, the stored
+size and the compression and decompression time of each codec, then the
+latency of reading highlights through the API with compressed rows and
+with rows stored as plain text.
+"""
+import argparse
+import time
+
+from benchmarks.datasets import SIZES, create_dataset
+from benchmarks.utils import measure, setup_django, summarize, test_database
+
+CODECS = [('plain', None), ('zlib', None), ('zlib+dict', 'highlight-1')]
+READ_SAMPLE = 50
+
+
+def benchmark_codecs(texts, repeat):
+    from snippets import compression
+
+    plain_size = sum(len(text.encode('utf-8')) for text in texts)
+    print('{:<10} {:>12} {:>7} {:>14} {:>16}'.format(
+        'codec', 'bytes', 'ratio', 'compress ms', 'decompress ms'))
+    for name, dictionary in CODECS:
+        if name == 'plain':
+            print('{:<10} {:>12} {:>7.2f} {:>14} {:>16}'.format(
+                name, plain_size, 1.0, '-', '-'))
+            continue
+        stored = [compression.compress(text, dictionary) for text in texts]
+        compressing = summarize(measure(
+            lambda: [compression.compress(text, dictionary)
+                     for text in texts], repeat=repeat))
+        decompressing = summarize(measure(
+            lambda: [compression.decompress(data) for data in stored],
+            repeat=repeat))
+        size = sum(len(data) for data in stored)
+        print('{:<10} {:>12} {:>7.2f} {:>14.2f} {:>16.2f}'.format(
+            name, size, plain_size / size, compressing['p50'],
+            decompressing['p50']))
+
+
+def benchmark_reads(client, urls, repeat):
+    def read():
+        for url in urls:
+            client.get(url)
+
+    return summarize(measure(read, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+    from snippets.models import HighlightBlob, Snippet
+
+    with test_database():
+        start = time.perf_counter()
+        create_dataset(args.size)
+        print('Created {} snippets in {:.1f}s\n'.format(
+            Snippet.objects.count(), time.perf_counter() - start))
+
+        blobs = list(HighlightBlob.objects.all())
+        texts = [blob.content for blob in blobs]
+        print('{} distinct highlights\n'.format(len(texts)))
+        benchmark_codecs(texts, args.repeat)
+
+        client = APIClient()
+        urls = [reverse('snippet-highlight', args=[snippet_id])
+                for snippet_id in Snippet.objects.values_list(
+                    'id', flat=True)[:READ_SAMPLE]]
+        compressed = benchmark_reads(client, urls, args.repeat)
+        for blob in blobs:
+            # Bytes are stored as they are, like rows not yet compressed.
+            blob.content = blob.content.encode('utf-8')
+        HighlightBlob.objects.bulk_update(blobs, ['content'])
+        uncompressed = benchmark_reads(client, urls, args.repeat)
+        print('\n{} highlight reads: {:.2f}ms compressed, {:.2f}ms '
+              'uncompressed (p50)'.format(len(urls), compressed['p50'],
+                                          uncompressed['p50']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Throughput and latency of the sync and async entry points under mixed
+read and write load.
+
+    python -m benchmarks.concurrency [--size small] [--concurrency 16]
+        [--requests 400] [--write-ratio 0.2]
+
+Sends the same requests through the WSGI handler from a pool of
+``--concurrency`` threads, like threaded sync workers, then through the
+ASGI handler and the async views of ``tutorial.asgi_urls`` from as many
+concurrent tasks in one event loop. Reads fetch snippet details,
+highlights and script sources. Writes create snippets with code not seen
+before, so each one is rendered by Pygments: in the request thread with
+WSGI, in the render process pool with ASGI.
+
+Both handlers run in this process against the test database. SQLite
+serializes writes, so set ``DATABASE_URL`` to a PostgreSQL database for
+figures closer to a deployment.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.datasets import SAMPLES, SIZES, create_dataset, make_code
+from benchmarks.utils import setup_django, summarize, test_database
+
+WRITE_REPEAT = 32
+
+
+class Request:
+    def __init__(self, kind, url, data=None):
+        self.kind = kind
+        self.url = url
+        self.data = data
+
+
+def make_plan(count, write_ratio, tag, seed=0):
+    """Return ``count`` requests, reads and writes interleaved at random.
+    Written code includes ``tag`` so it differs between plans."""
+    from django.urls import reverse
+    from snippets.models import Script, Snippet
+
+    rng = random.Random(seed)
+    snippet_ids = list(Snippet.objects.values_list('id', flat=True))
+    script_ids = list(Script.objects.values_list('id', flat=True))
+    plan = []
+    for index in range(count):
+        if rng.random() < write_ratio:
+            language = rng.choice(list(SAMPLES))
+            code = (make_code(language, WRITE_REPEAT) +
+                    f'# {tag} {index}\n')
+            plan.append(Request('write', reverse('snippet-list'),
+                                {'code': code, 'language': language}))
+            continue
+        # Query strings are part of the url, AsyncClient ignores data.
+        url = rng.choice([
+            reverse('snippet-detail', args=[rng.choice(snippet_ids)]),
+            reverse('snippet-highlight', args=[rng.choice(snippet_ids)]),
+            reverse('script-source', args=[rng.choice(script_ids)]) +
+            '?highlighted=true',
+        ])
+        plan.append(Request('read', url))
+    return plan
+
+
+def read_content(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def run_sync(plan, concurrency, user):
+    from django.test import Client
+
+    local = threading.local()
+
+    def send(request):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+            local.client.force_login(user)
+        start = time.perf_counter()
+        if request.kind == 'write':
+            response = local.client.post(request.url,
+                                         json.dumps(request.data),
+                                         content_type='application/json')
+        else:
+            response = local.client.get(request.url)
+        read_content(response)
+        return request.kind, time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, plan))
+    return results, time.perf_counter() - start
+
+
+async def run_async(plan, concurrency, user):
+    from asgiref.sync import sync_to_async
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    await sync_to_async(client.force_login)(user)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(request):
+        async with semaphore:
+            start = time.perf_counter()
+            if request.kind == 'write':
+                response = await client.post(
+                    request.url, json.dumps(request.data),
+                    content_type='application/json')
+            else:
+                response = await client.get(request.url)
+            read_content(response)
+            return (request.kind, time.perf_counter() - start,
+                    response.status_code)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(send(request) for request in plan))
+    return results, time.perf_counter() - start
+
+
+def get_asgi_middleware():
+    """Middleware ``tutorial.settings`` uses with ``SERVER_MODE=asgi``"""
+    from django.conf import settings
+
+    return ['snippets.metrics.MetricsMiddleware',
+            'snippets.asynchronous.BufferStreamingMiddleware'] + [
+        middleware for middleware in settings.MIDDLEWARE[1:]
+        if middleware != 'whitenoise.middleware.WhiteNoiseMiddleware']
+
+
+def report(name, results, elapsed):
+    errors = sum(1 for _, _, status in results if status >= 400)
+    line = '{:<6} {:>8.1f} {:>7}'.format(name, len(results) / elapsed, errors)
+    for kind in ('read', 'write'):
+        latencies = [duration for request_kind, duration, _ in results
+                     if request_kind == kind]
+        if latencies:
+            stats = summarize(latencies)
+            line += ' {:>10.1f} {:>10.1f}'.format(stats['p50'], stats['p99'])
+        else:
+            line += ' {:>10} {:>10}'.format('-', '-')
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test import override_settings
+    from snippets.models import Snippet
+    from snippets.render_cache import get_render_cache
+    from snippets import budgets
+
+    if connection.vendor == 'sqlite':
+        # Writers wait for the lock of a file database, while those of an
+        # in-memory one fail.
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            tempfile.gettempdir(), 'benchmark-concurrency.sqlite3')
+    with test_database():
+        start = time.perf_counter()
+        users = create_dataset(args.size)
+        print('Created {} snippets in {:.1f}s\n'.format(
+            Snippet.objects.count(), time.perf_counter() - start))
+        # Start the render processes before measuring.
+        budgets.render(code='', language='text', style='default',
+                       linenos=False, title='')
+
+        print('{:<6} {:>8} {:>7} {:>10} {:>10} {:>10} {:>10}'.format(
+            'mode', 'req/s', 'errors', 'read p50', 'read p99', 'write p50',
+            'write p99'))
+        for mode in ('wsgi', 'asgi'):
+            plan = make_plan(args.requests, args.write_ratio, tag=mode)
+            get_render_cache().clear()
+            if mode == 'wsgi':
+                results, elapsed = run_sync(plan, args.concurrency, users[0])
+            else:
+                with override_settings(ROOT_URLCONF='tutorial.asgi_urls',
+                                       MIDDLEWARE=get_asgi_middleware()):
+                    results, elapsed = (
+                        asyncio.get_event_loop().run_until_complete(
+                            run_async(plan, args.concurrency, users[0])))
+            report(mode, results, elapsed)
+        print('\nLatencies in milliseconds.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Synthetic datasets for the benchmarks.
+
+Snippets are built from per-language samples repeated to realistic
+lengths, so only a few distinct snippets have to be highlighted; the
+rest reuse their rendered HTML. Generation is seeded and therefore
+identical between runs.
+"""
+import random
+
+SIZES = {
+    'small': {'users': 10, 'snippets': 1000, 'scripts': 50},
+    'medium': {'users': 50, 'snippets': 10000, 'scripts': 200},
+    'large': {'users': 200, 'snippets': 100000, 'scripts': 1000},
+}
+
+SAMPLES = {
+    'python': (
+        'def fibonacci(n):\n'
+        '    """Return the n-th Fibonacci number"""\n'
+        '    a, b = 0, 1\n'
+        '    for _ in range(n):\n'
+        '        a, b = b, a + b\n'
+        '    return a\n\n'
+    ),
+    'js': (
+        'function debounce(fn, wait) {\n'
+        '  let timeout;\n'
+        '  return (...args) => {\n'
+        '    clearTimeout(timeout);\n'
+        '    timeout = setTimeout(() => fn(...args), wait);\n'
+        '  };\n'
+        '}\n\n'
+    ),
+    'rb': (
+        'class Stack\n'
+        '  def initialize\n'
+        '    @items = []\n'
+        '  end\n\n'
+        '  def push(item)\n'
+        '    @items.push(item)\n'
+        '  end\n'
+        'end\n\n'
+    ),
+    'sql': (
+        'SELECT owner_id, COUNT(*) AS total\n'
+        '  FROM snippets_snippet\n'
+        ' WHERE language = \'python\'\n'
+        ' GROUP BY owner_id\n'
+        ' ORDER BY total DESC;\n\n'
+    ),
+    'bash': (
+        'for file in *.log; do\n'
+        '  if grep -q "ERROR" "$file"; then\n'
+        '    echo "$file"\n'
+        '  fi\n'
+        'done\n\n'
+    ),
+    'html': (
+        '<ul class="menu">\n'
+        '  <li><a href="/">Home</a></li>\n'
+        '  <li><a href="/about/">About</a></li>\n'
+        '</ul>\n\n'
+    ),
+}
+STYLES = ['friendly', 'monokai', 'default', 'emacs']
+# Number of times a sample is repeated, from one-liners to long files.
+REPEATS = [1, 2, 4, 8, 32]
+SCRIPT_SIZES = [1, 5, 20, 100, 500]
+BATCH_SIZE = 1000
+
+
+def make_code(language, repeat):
+    return SAMPLES[language] * repeat
+
+
+def create_dataset(size, seed=0):
+    """Fill the database with the dataset ``size`` and return its users"""
+    from django.contrib.auth.models import User
+    from snippets import search
+    from snippets.conf import get_setting
+    from snippets.models import Script, ScriptSnippet, Snippet
+    from snippets.render_cache import render
+
+    counts = SIZES[size]
+    rng = random.Random(seed)
+    full = get_setting('HIGHLIGHT_STORAGE') == Snippet.FORMAT_DOCUMENT
+    highlight_format = (Snippet.FORMAT_DOCUMENT if full
+                        else Snippet.FORMAT_FRAGMENT)
+
+    User.objects.bulk_create(
+        User(username=f'bench{i}') for i in range(counts['users']))
+    users = list(User.objects.filter(username__startswith='bench')
+                 .order_by('id'))
+
+    def make_snippet():
+        language = rng.choice(list(SAMPLES))
+        style = rng.choice(STYLES)
+        code = make_code(language, rng.choice(REPEATS))
+        return Snippet(
+            owner=rng.choice(users), code=code, language=language,
+            style=style, highlight_format=highlight_format, revision=1,
+            highlighted=render(code=code, language=language, style=style,
+                               linenos=False, title='', full=full))
+
+    remaining = counts['snippets']
+    while remaining:
+        batch = min(remaining, BATCH_SIZE)
+        snippets = [make_snippet() for _ in range(batch)]
+        Snippet.store_blobs(snippets)
+        Snippet.objects.bulk_create(snippets)
+        remaining -= batch
+
+    snippet_ids = list(Snippet.objects.values_list('id', flat=True))
+    for i in range(counts['scripts']):
+        script = Script.objects.create(name=f'script {i}',
+                                       owner=rng.choice(users))
+        length = SCRIPT_SIZES[i % len(SCRIPT_SIZES)]
+        ScriptSnippet.objects.bulk_create(
+            (ScriptSnippet(script=script, snippet_id=snippet_id,
+                           position=position)
+             for position, snippet_id in enumerate(
+                 rng.choices(snippet_ids, k=length))),
+            batch_size=BATCH_SIZE)
+    search.rebuild_index()
+    return users
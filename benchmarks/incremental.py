@@ -0,0 +1,90 @@
+"""Latency of highlighting an edit against the size of the snippet.
+
+    python -m benchmarks.incremental [--lines 100 1000 10000 50000]
+        [--repeat 10]
+
+For each sample language ``snippets.incremental`` supports, and snippets
+of about ``--lines`` lines, a line in the middle is duplicated and the
+edited code is rendered:
+
+- ``full``: with ``highlighting.render``, as before;
+- ``first``: incrementally without a previous line state, what the first
+  save of a snippet costs;
+- ``edit``: incrementally from the line state of the code before the edit;
+
+in this process, then in the render processes of ``snippets.budgets``,
+where the line state is sent along with the inputs.
+"""
+import argparse
+
+from benchmarks.datasets import SAMPLES, make_code
+from benchmarks.utils import measure, setup_django, summarize
+
+INPUTS = {'style': 'friendly', 'linenos': False, 'title': '', 'full': False}
+
+
+def make_edit(language, lines):
+    """Return code of about ``lines`` lines and the code with its middle
+    line duplicated"""
+    sample = SAMPLES[language]
+    code = make_code(language, max(1, lines // sample.count('\n')))
+    lines = code.splitlines(True)
+    middle = len(lines) // 2
+    return code, ''.join(lines[:middle + 1] + lines[middle:])
+
+
+def benchmark(language, lines, repeat):
+    from snippets import budgets, highlighting, incremental
+
+    code, edited = make_edit(language, lines)
+    _, previous = incremental.render(code, language, **INPUTS)
+
+    def p50(func):
+        return summarize(measure(func, repeat=repeat))['p50']
+
+    return [
+        p50(lambda: highlighting.render(edited, language, **INPUTS)),
+        p50(lambda: incremental.render(edited, language, **INPUTS)),
+        p50(lambda: incremental.render(edited, language, previous=previous,
+                                       **INPUTS)),
+        p50(lambda: budgets.render(code=edited, language=language,
+                                   **INPUTS)),
+        p50(lambda: budgets.render_incremental(
+            code=edited, language=language, previous=previous, **INPUTS)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, nargs='+',
+                        default=[100, 1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+    from snippets import incremental
+
+    languages = [language for language in SAMPLES
+                 if incremental.supports(language)]
+    print('{:<8} {:>7} {:>9} {:>9} {:>9} {:>11} {:>11} {:>8}'.format(
+        'language', 'lines', 'full', 'first', 'edit', 'pool full',
+        'pool edit', 'speedup'))
+    # Large snippets mustn't go over the budgets.
+    with override_settings(SNIPPETS={'RENDER_MAX_SIZE': 1 << 30,
+                                     'RENDER_SLOW_MAX_SIZE': 1 << 30,
+                                     'RENDER_MEMORY_LIMIT': None}):
+        for language in languages:
+            for lines in args.lines:
+                full, first, edit, pool_full, pool_edit = benchmark(
+                    language, lines, args.repeat)
+                print('{:<8} {:>7} {:>9.2f} {:>9.2f} {:>9.2f} {:>11.2f} '
+                      '{:>11.2f} {:>7.1f}x'.format(
+                          language, lines, full, first, edit, pool_full,
+                          pool_edit, pool_full / pool_edit))
+    print('\nLatencies in milliseconds, speedup of the edit in the render '
+          'processes.')
+
+
+if __name__ == '__main__':
+    main()
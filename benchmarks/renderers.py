@@ -0,0 +1,118 @@
+"""Encode time and payload size of each API response format.
+
+    python -m benchmarks.renderers [--size small] [--repeat 50]
+
+Requests the list and detail endpoints of ``snippets.urls`` and
+``scripts.urls`` over a synthetic dataset (see ``benchmarks.datasets``),
+lists at ``?page_size=100``, and encodes the response data with:
+
+- ``json``: DRF's ``JSONRenderer``, the standard library encoder;
+- ``orjson``: ``snippets.renderers.ORJSONRenderer``;
+- ``msgpack``: ``snippets.renderers.MessagePackRenderer``;
+
+skipping those whose package isn't installed. It then times serializing
+list pages with ``FastListSerializer`` and with DRF's ``ListSerializer``,
+as before.
+"""
+import argparse
+
+from benchmarks.datasets import SIZES, create_dataset
+from benchmarks.utils import measure, setup_django, summarize, test_database
+
+PAGE = '?page_size=100'
+
+
+def get_endpoints():
+    from django.urls import reverse
+    from snippets.models import Script, Snippet
+
+    snippet = Snippet.objects.order_by('id').first()
+    script = Script.objects.order_by('-id').first()
+    return [
+        ('snippet-list', reverse('snippet-list') + PAGE),
+        ('snippet-list code', reverse('snippet-list') + PAGE +
+         '&include=code'),
+        ('snippet-detail', reverse('snippet-detail', args=[snippet.id])),
+        ('user-list', reverse('user-list') + PAGE),
+        ('script-list', reverse('script-list') + PAGE),
+        ('script-detail', reverse('script-detail', args=[script.id])),
+    ]
+
+
+def get_renderers():
+    from rest_framework.renderers import JSONRenderer
+    from snippets import renderers
+
+    found = [('json', JSONRenderer())]
+    if renderers.orjson is not None:
+        found.append(('orjson', renderers.ORJSONRenderer()))
+    if renderers.msgpack is not None:
+        found.append(('msgpack', renderers.MessagePackRenderer()))
+    return found
+
+
+def benchmark_encoding(client, repeat):
+    renderers = get_renderers()
+    print('{:<18} {:<8} {:>10} {:>10}'.format(
+        'endpoint', 'format', 'encode ms', 'bytes'))
+    for name, url in get_endpoints():
+        data = client.get(url).data
+        baseline = None
+        for format_name, renderer in renderers:
+            payload = renderer.render(data)
+            encoding = summarize(measure(lambda: renderer.render(data),
+                                         repeat=repeat))['p50']
+            baseline = baseline or encoding
+            print('{:<18} {:<8} {:>10.3f} {:>10} {:>6.1f}x'.format(
+                name, format_name, encoding, len(payload),
+                baseline / encoding))
+
+
+def benchmark_serializers(repeat):
+    from rest_framework.serializers import ListSerializer
+    from scripts.serializers import ScriptSerializer
+    from snippets.models import Script, Snippet
+    from snippets.serializers import (SnippetSerializer,
+                                      SnippetSummarySerializer)
+
+    snippets = list(Snippet.objects.select_related('owner', 'code_blob')
+                    .order_by('id')[:100])
+    scripts = list(Script.objects.select_related('owner')
+                   .prefetch_related('entries').order_by('id')[:100])
+    print('\n{:<18} {:>10} {:>10} {:>8}'.format(
+        'list', 'drf ms', 'fast ms', 'speedup'))
+    for name, serializer_class, instances in [
+            ('snippet-list', SnippetSummarySerializer, snippets),
+            ('snippet-list code', SnippetSerializer, snippets),
+            ('script-list', ScriptSerializer, scripts)]:
+        def regular():
+            serializer = serializer_class(instances, many=True)
+            return ListSerializer.to_representation(serializer, instances)
+
+        drf = summarize(measure(regular, repeat=repeat))['p50']
+        fast = summarize(measure(
+            lambda: serializer_class(instances, many=True).data,
+            repeat=repeat))['p50']
+        print('{:<18} {:>10.3f} {:>10.3f} {:>7.1f}x'.format(
+            name, drf, fast, drf / fast))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.test import APIClient
+
+    with test_database():
+        create_dataset(args.size)
+        benchmark_encoding(APIClient(), args.repeat)
+        benchmark_serializers(args.repeat)
+    print('\nMedian latencies in milliseconds, speedups against the first '
+          'row.')
+
+
+if __name__ == '__main__':
+    main()
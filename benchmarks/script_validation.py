@@ -0,0 +1,61 @@
+"""Script write latency as the snippet table grows.
+
+    python -m benchmarks.script_validation [--sizes 1000 10000 50000]
+
+Creates a script referencing a fixed number of snippets while the
+snippet table holds an increasing number of rows. Latency should stay
+flat because validation only looks up the submitted ids.
+"""
+import argparse
+
+from benchmarks.utils import measure, setup_django, summarize, test_database
+
+
+def fill_snippets(owner, total):
+    from snippets.models import Snippet
+
+    missing = total - Snippet.objects.count()
+    snippets = [Snippet(owner=owner, code='print({})'.format(i))
+                for i in range(missing)]
+    Snippet.store_blobs(snippets)
+    Snippet.objects.bulk_create(snippets, batch_size=1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 50000])
+    parser.add_argument('--script-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from snippets.models import Snippet
+
+    with test_database():
+        user = User.objects.create_user(username='bench')
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        print('{:>10} {:>10} {:>10} {:>10}'.format(
+            'snippets', 'p50 ms', 'p90 ms', 'p99 ms'))
+        for size in sorted(args.sizes):
+            fill_snippets(user, size)
+            ids = Snippet.objects.order_by('-id').values_list(
+                'id', flat=True)[:args.script_size]
+            payload = {'name': 'bench',
+                       'snippets': ','.join(str(s_id) for s_id in ids)}
+
+            def create_script():
+                res = client.post('/scripts/', payload)
+                assert res.status_code == 201, res.data
+
+            stats = summarize(measure(create_script, repeat=args.repeat))
+            print('{:>10} {p50:>10.2f} {p90:>10.2f} {p99:>10.2f}'.format(
+                size, **stats))
+
+
+if __name__ == '__main__':
+    main()
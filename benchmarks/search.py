@@ -0,0 +1,57 @@
+"""Search latency against a large corpus.
+
+    python -m benchmarks.search [--size medium] [--repeat 30]
+
+Compares the indexed word search with a plain ``icontains`` scan over
+the snippet code that finds every match, for queries of different
+selectivity. Set ``DATABASE_URL`` to benchmark the PostgreSQL backend.
+"""
+import argparse
+import time
+
+from benchmarks.datasets import SIZES, create_dataset
+from benchmarks.utils import measure, setup_django, summarize, test_database
+
+QUERIES = ['fibonacci', 'timeout', 'owner_id total', 'items push',
+           'nothing_matches_this']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', choices=sorted(SIZES), default='medium')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+    from snippets import search
+    from snippets.models import Snippet
+
+    with test_database():
+        start = time.perf_counter()
+        create_dataset(args.size)
+        print('Created and indexed {} snippets in {:.1f}s\n'.format(
+            Snippet.objects.count(), time.perf_counter() - start))
+
+        print('{:<22} {:>8} {:>10} {:>10} {:>10}'.format(
+            'query', 'results', 'index p50', 'index p90', 'scan p50'))
+        for query in QUERIES:
+            results = search.search(query)
+            indexed = summarize(measure(lambda: search.search(query),
+                                        repeat=args.repeat))
+            words = query.split()
+
+            def scan():
+                snippets = Snippet.objects.all()
+                for word in words:
+                    snippets = snippets.filter(
+                        code_blob__content__icontains=word)
+                list(snippets.values_list('id', flat=True))
+
+            scanned = summarize(measure(scan, repeat=args.repeat))
+            print('{:<22} {:>8} {:>10.2f} {:>10.2f} {:>10.2f}'.format(
+                query, len(results), indexed['p50'], indexed['p90'],
+                scanned['p50']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Cold start cost of ``django.setup()``.
+
+    python -m benchmarks.startup [--repeat 10]
+
+Every run happens in a fresh interpreter. "registry" is the current
+setup, which reads the precomputed lexer registry. "live scan" adds the
+``get_all_lexers()``/``get_all_styles()`` scan the models used to run at
+import time, including the plugin entry point lookup.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from benchmarks.utils import summarize
+
+SETUP = '''
+import time
+start = time.perf_counter()
+import django
+django.setup()
+import snippets.models, snippets.serializers
+{extra}
+print(time.perf_counter() - start)
+'''
+
+LIVE_SCAN = '''
+from pygments.lexers import get_all_lexers
+from pygments.styles import get_all_styles
+sorted((item[1][0], item[0]) for item in get_all_lexers() if item[1])
+sorted(get_all_styles())
+'''
+
+
+def cold_start(extra=''):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='tutorial.settings')
+    output = subprocess.check_output(
+        [sys.executable, '-c', SETUP.format(extra=extra)], env=env)
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    print('{:>10} {:>10} {:>10}'.format('mode', 'p50 ms', 'p90 ms'))
+    for mode, extra in (('registry', ''), ('live scan', LIVE_SCAN)):
+        samples = [cold_start(extra) for _ in range(args.repeat)]
+        stats = summarize(samples)
+        print('{:>10} {p50:>10.1f} {p90:>10.1f}'.format(mode, **stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""Latency, queries and allocations of every API endpoint.
+
+    python -m benchmarks.suite [--size small] [--output results.json]
+
+Fills a throwaway database with a synthetic dataset (see
+``benchmarks.datasets``) and requests each endpoint of ``snippets.urls``
+and ``scripts.urls`` through the test client. For each endpoint it
+records latency percentiles, the number of queries per request and the
+peak memory allocated while handling it. It also measures the cost of
+rendering a snippet in ``Snippet.save`` for a set of lexers.
+
+Runs on SQLite by default. Set ``DATABASE_URL`` to benchmark another
+database, e.g. a local PostgreSQL:
+
+    DATABASE_URL=postgres://localhost/snippets python -m benchmarks.suite
+
+Results written with ``--output`` can be compared between commits with
+``benchmarks.compare``.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from benchmarks.datasets import SAMPLES, SIZES, create_dataset, make_code
+from benchmarks.utils import measure, setup_django, summarize, test_database
+
+ALLOCATION_SAMPLES = 3
+
+
+class Endpoint:
+    def __init__(self, name, method, url, data=None, format='json',
+                 expected=200):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.data = data
+        self.format = format
+        self.expected = expected
+
+
+def get_endpoints(user):
+    """Return the endpoints to benchmark, using objects owned by ``user``"""
+    from django.db.models import Count
+    from django.urls import reverse
+    from snippets.models import Script, Snippet
+
+    snippet = Snippet.objects.filter(owner=user).first()
+    script = Script.objects.filter(owner=user).first()
+    large_script = Script.objects.annotate(
+        length=Count('entries')).order_by('-length').first()
+    snippet_ids = ','.join(str(s_id) for s_id in Snippet.objects.filter(
+        owner=user).values_list('id', flat=True)[:50])
+    code = make_code('python', 4)
+
+    endpoints = [
+        Endpoint('api-root', 'get', reverse('api-root')),
+        Endpoint('snippet-list', 'get', reverse('snippet-list')),
+        Endpoint('snippet-list-code', 'get',
+                 reverse('snippet-list') + '?include=code'),
+        Endpoint('snippet-detail', 'get',
+                 reverse('snippet-detail', args=[snippet.id])),
+        Endpoint('snippet-highlight', 'get',
+                 reverse('snippet-highlight', args=[snippet.id])),
+        Endpoint('snippet-export', 'get', reverse('snippet-export')),
+        Endpoint('snippet-search', 'get',
+                 reverse('snippet-search') + '?q=fibonacci'),
+        Endpoint('snippet-create', 'post', reverse('snippet-list'),
+                 {'code': code, 'language': 'python'}, expected=201),
+        Endpoint('snippet-update', 'patch',
+                 reverse('snippet-detail', args=[snippet.id]),
+                 {'title': 'benchmark'}),
+        Endpoint('snippet-bulk-create', 'post', reverse('snippet-bulk'),
+                 [{'code': code, 'language': 'python'}] * 20,
+                 expected=207),
+        Endpoint('user-list', 'get', reverse('user-list')),
+        Endpoint('user-detail', 'get',
+                 reverse('user-detail', args=[user.id])),
+        Endpoint('stylesheet', 'get',
+                 reverse('stylesheet', args=[snippet.style])),
+        Endpoint('render-cache-stats', 'get',
+                 reverse('render-cache-stats')),
+        Endpoint('response-cache-stats', 'get',
+                 reverse('response-cache-stats')),
+        Endpoint('render-budget-stats', 'get',
+                 reverse('render-budget-stats')),
+        Endpoint('script-list', 'get', reverse('script-list')),
+        Endpoint('script-detail', 'get',
+                 reverse('script-detail', args=[script.id])),
+        Endpoint('script-source', 'get',
+                 reverse('script-source', args=[script.id])),
+        Endpoint('script-source-highlighted', 'get',
+                 reverse('script-source', args=[script.id]) +
+                 '?highlighted=true'),
+        Endpoint('script-export', 'get', reverse('script-export')),
+        Endpoint('script-create', 'post', reverse('script-list'),
+                 {'name': 'benchmark', 'snippets': snippet_ids},
+                 expected=201),
+    ]
+    if large_script is not None:
+        endpoints += [
+            Endpoint('script-detail-large', 'get',
+                     reverse('script-detail', args=[large_script.id])),
+            Endpoint('script-source-large', 'get',
+                     reverse('script-source', args=[large_script.id])),
+        ]
+    return endpoints
+
+
+def make_request(client, endpoint):
+    response = getattr(client, endpoint.method)(
+        endpoint.url, endpoint.data, format=endpoint.format)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    assert response.status_code == endpoint.expected, (
+        endpoint.name, response.status_code)
+    return response
+
+
+def count_queries(func):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as context:
+        func()
+    return len(context.captured_queries)
+
+
+def peak_allocation(func):
+    """Return the peak memory traced while calling ``func``, in KiB"""
+    peaks = []
+    for _ in range(ALLOCATION_SAMPLES):
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peaks.append(peak / 1024)
+    return statistics.median(peaks)
+
+
+def benchmark_endpoints(client, endpoints, repeat):
+    results = {}
+    for endpoint in endpoints:
+        def request():
+            make_request(client, endpoint)
+
+        stats = summarize(measure(request, repeat=repeat))
+        stats['queries'] = count_queries(request)
+        stats['alloc_peak_kib'] = peak_allocation(request)
+        results[endpoint.name] = stats
+        print('{:<28} {p50:>9.2f} {p90:>9.2f} {p99:>9.2f} {queries:>8} '
+              '{alloc_peak_kib:>11.0f}'.format(endpoint.name, **stats))
+    return results
+
+
+def benchmark_render(user, languages, repeat):
+    """Time ``Snippet.save`` when it has to render, per lexer"""
+    from snippets.models import Snippet
+    from snippets.render_cache import get_render_cache
+
+    results = {}
+    for language in languages:
+        code = make_code(language if language in SAMPLES else 'python', 8)
+        snippet = Snippet(owner=user, code=code, language=language)
+        counter = iter(range(repeat * 2 + 10))
+
+        def save():
+            # A new title forces a render, the cleared cache a miss.
+            snippet.title = str(next(counter))
+            get_render_cache().clear()
+            snippet.save()
+
+        stats = summarize(measure(save, repeat=repeat))
+        results[language] = stats
+        print('{:<28} {p50:>9.2f} {p90:>9.2f} {p99:>9.2f}'.format(
+            language, **stats))
+    return results
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_metadata(size, connection):
+    import django
+    import pygments
+
+    return {
+        'commit': get_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'dataset': size,
+        'counts': SIZES[size],
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'pygments': pygments.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--only', nargs='+', metavar='ENDPOINT',
+                        help='Only benchmark these endpoints.')
+    parser.add_argument('--languages', nargs='+', default=sorted(SAMPLES),
+                        help='Lexers to measure the render cost of.')
+    parser.add_argument('--output', help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    # Repeated requests mustn't be throttled.
+    snippets_settings = dict(settings.SNIPPETS, THROTTLE_RATES={})
+    with override_settings(SNIPPETS=snippets_settings), \
+            test_database() as connection:
+        start = time.perf_counter()
+        users = create_dataset(args.size)
+        print('Created the {} dataset in {:.1f}s'.format(
+            args.size, time.perf_counter() - start))
+
+        client = APIClient()
+        client.force_authenticate(user=users[0])
+        endpoints = get_endpoints(users[0])
+        if args.only:
+            endpoints = [endpoint for endpoint in endpoints
+                         if endpoint.name in args.only]
+
+        print('{:<28} {:>9} {:>9} {:>9} {:>8} {:>11}'.format(
+            'endpoint', 'p50 ms', 'p90 ms', 'p99 ms', 'queries',
+            'peak KiB'))
+        results = {
+            'meta': get_metadata(args.size, connection),
+            'endpoints': benchmark_endpoints(client, endpoints,
+                                             args.repeat),
+        }
+        print('\n{:<28} {:>9} {:>9} {:>9}'.format(
+            'Snippet.save render', 'p50 ms', 'p90 ms', 'p99 ms'))
+        results['render'] = benchmark_render(users[0], args.languages,
+                                             args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks are plain modules run with ``python -m benchmarks.<name>``.
+Each one runs against a throwaway test database so it never touches the
+development data.
+"""
+import contextlib
+import os
+import statistics
+import time
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutorial.settings')
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database(verbosity=0):
+    """Create the test database for the duration of the block"""
+    from django.db import connection
+    from django.test.utils import (setup_test_environment,
+                                   teardown_test_environment)
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity,
+                                       autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def measure(func, repeat=20, warmup=2):
+    """Call ``func`` repeatedly and return the durations in seconds"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    """Return latency percentiles in milliseconds"""
+    ordered = sorted(samples)
+
+    def percentile(p):
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    return {
+        'p50': percentile(50),
+        'p90': percentile(90),
+        'p99': percentile(99),
+        'mean': statistics.mean(ordered) * 1000,
+    }
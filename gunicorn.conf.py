@@ -0,0 +1,10 @@
+"""
+Gunicorn settings, read from the working directory.
+
+The Procfile serves ``tutorial.$SERVER_MODE``; ASGI needs the uvicorn
+worker class.
+"""
+import os
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
@@ -0,0 +1,109 @@
+"""
+Assembly of a script's source from its snippets.
+
+Assembled sources are materialized in the Django cache under the script id
+and removed by the signal handlers in ``scripts.signals`` whenever the
+script or one of its snippets changes. Scripts whose snippets add up to
+more than ``SCRIPT_SOURCE_STREAM_THRESHOLD`` characters are streamed from
+the database in chunks instead of being built in memory.
+"""
+from django.core.cache import caches
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Length
+
+from snippets.conf import get_setting
+from snippets.models import ScriptSnippet, Snippet
+
+FORMAT_TEXT = 'text'
+FORMAT_HTML = 'html'
+SEPARATOR = '\n'
+CHUNK_SIZE = 200
+
+
+def get_cache():
+    return caches[get_setting('SCRIPT_SOURCE_CACHE')]
+
+
+def get_cache_key(script_id, fmt):
+    return f'script-source:{script_id}:{fmt}'
+
+
+def invalidate(script_ids):
+    """Drop the materialized sources of ``script_ids``"""
+    get_cache().delete_many([get_cache_key(script_id, fmt)
+                             for script_id in script_ids
+                             for fmt in (FORMAT_TEXT, FORMAT_HTML)])
+
+
+def get_source_size(script):
+    """Return the number of snippets and characters of code in ``script``"""
+    totals = ScriptSnippet.objects.filter(script=script).aggregate(
+        count=Count('id'), size=Sum(Length('snippet__code_blob__content')))
+    return totals['count'], totals['size'] or 0
+
+
+def iter_entries(script, fields, related=()):
+    """Yield the script's snippets in order, reading bounded chunks"""
+    last_position = -1
+    while True:
+        chunk = list(
+            Snippet.objects
+            .filter(script_entries__script=script,
+                    script_entries__position__gt=last_position)
+            .annotate(position=F('script_entries__position'))
+            .order_by('position')
+            .select_related(*related)
+            .only(*fields)[:CHUNK_SIZE])
+        if not chunk:
+            return
+        yield from chunk
+        last_position = chunk[-1].position
+
+
+def render_snippet(snippet, fmt):
+    if fmt == FORMAT_HTML:
+        return snippet.get_highlighted_fragment()
+    return snippet.code
+
+
+def iter_source(script, fmt):
+    """Yield the assembled source of ``script`` piece by piece"""
+    if fmt == FORMAT_HTML:
+        related = ('highlight_blob', 'code_blob')
+        fields = ('id', 'highlight_blob', 'highlight_blob__content',
+                  'highlight_format', 'style', 'title', 'code_blob',
+                  'code_blob__content', 'language', 'linenos')
+    else:
+        related = ('code_blob',)
+        fields = ('id', 'code_blob', 'code_blob__content')
+    for index, snippet in enumerate(iter_entries(script, fields, related)):
+        if index:
+            yield SEPARATOR
+        yield render_snippet(snippet, fmt)
+
+
+def get_source(script, fmt):
+    """Return the assembled source from the cache, building it on a miss.
+
+    Returns None when the script is too large to be built in memory, in
+    which case ``iter_source`` should be streamed instead.
+    """
+    cache = get_cache()
+    key = get_cache_key(script.id, fmt)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == script.revision:
+        return cached[1]
+
+    _, size = get_source_size(script)
+    if size > get_setting('SCRIPT_SOURCE_STREAM_THRESHOLD'):
+        return None
+    source = ''.join(iter_source(script, fmt))
+    cache.set(key, (script.revision, source),
+              get_setting('SCRIPT_SOURCE_CACHE_TIMEOUT'))
+    return source
+
+
+def get_styles(script):
+    """Return the highlight styles used by the script's snippets"""
+    return sorted(set(Snippet.objects.filter(script_entries__script=script)
+                      .values_list('style', flat=True)))
@@ -0,0 +1,56 @@
+"""
+Async script views, routed by ``tutorial.asgi_urls``.
+"""
+from django.http import (Http404, HttpResponse, HttpResponseNotAllowed,
+                         HttpResponseNotModified)
+from django.utils.http import parse_etags, quote_etag
+
+from scripts import assembly
+from snippets.asynchronous import database
+from snippets.models import Script
+from snippets.views import get_stylesheet_url
+
+
+def get_script(pk):
+    script = Script.objects.filter(pk=pk).first()
+    if script is None:
+        raise Http404
+    return script
+
+
+def assemble(script, fmt):
+    source = assembly.get_source(script, fmt)
+    if source is None:
+        # Django 3.1 can't stream from async code, the source is built in
+        # memory instead.
+        source = ''.join(assembly.iter_source(script, fmt))
+    return source
+
+
+async def script_source(request, pk):
+    """Async ``ScriptViewSet.source``, assembling the source in the sync
+    thread"""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    script = await database(get_script)(pk)
+    if request.GET.get('highlighted') in ('true', '1'):
+        fmt = assembly.FORMAT_HTML
+        content_type = 'text/html; charset=utf-8'
+    else:
+        fmt = assembly.FORMAT_TEXT
+        content_type = 'text/plain; charset=utf-8'
+
+    etag = quote_etag(f'{script.pk}-{script.revision}-{fmt}')
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(await database(assemble)(script, fmt),
+                                content_type=content_type)
+        if fmt == assembly.FORMAT_HTML:
+            styles = await database(assembly.get_styles)(script)
+            urls = [request.build_absolute_uri(get_stylesheet_url(style))
+                    for style in styles]
+            response['Link'] = ', '.join(f'<{url}>; rel="stylesheet"'
+                                         for url in urls)
+    response['ETag'] = etag
+    return response
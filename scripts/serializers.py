@@ -1,51 +1,71 @@
 from rest_framework import serializers
+from snippets.metrics import TimedSerializerMixin, timer
 from snippets.models import Script, Snippet
+from snippets.serializers import FastListSerializer
 
+# Upper bound on ids sent in one ``id__in`` lookup, kept below the
+# SQLite host parameter limit.
+SNIPPET_ID_CHUNK_SIZE = 500
 
-class ScriptSerializer(serializers.ModelSerializer):
+
+class ScriptSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.username')
+    snippets = serializers.CharField(required=False, allow_blank=True,
+                                     default='')
 
     class Meta:
         model = Script
         fields = '__all__'
-        read_only_fields = ['id', 'owner']
+        read_only_fields = ['id', 'owner', 'revision', 'updated']
+        list_serializer_class = FastListSerializer
 
     def validate_snippets(self, value):
         """snippets field must be
         a comma separated string of existing snippet id"""
         try:
-            id_set = {int(s_id.strip())
-                      for s_id in value.split(',') if s_id.strip()}
-            existing_ids = set(Snippet.objects.values_list('id', flat=True))
-            common_ids = id_set & existing_ids
-            if common_ids == id_set:
-                return value
-            else:
-                msg = 'Invalid snippets id.'
-                raise serializers.ValidationError(msg)
+            id_list = [int(s_id.strip())
+                       for s_id in value.split(',') if s_id.strip()]
         except ValueError:
             msg = 'Cannot convert id to int.'
             raise serializers.ValidationError(msg)
 
+        missing_ids = set(id_list)
+        ids = sorted(missing_ids)
+        for start in range(0, len(ids), SNIPPET_ID_CHUNK_SIZE):
+            chunk = ids[start:start + SNIPPET_ID_CHUNK_SIZE]
+            missing_ids = missing_ids - set(
+                Snippet.objects.filter(id__in=chunk)
+                .values_list('id', flat=True))
+        if missing_ids:
+            msg = 'Invalid snippets id: {}.'.format(
+                ', '.join(str(s_id) for s_id in sorted(missing_ids)))
+            raise serializers.ValidationError(msg)
+        return id_list
+
 
 class ScriptDetailSerializer(ScriptSerializer):
     """Handle representation of script objects with snippets code included"""
 
-    def expand_snippets(self, snippets):
-        id_list = [int(s_id.strip())
-                   for s_id in snippets.split(',') if s_id.strip()]
-        snippets_objects = Snippet.objects.filter(id__in=id_list)
-        ret = {snippet_id: snippets_objects.get(id=snippet_id).code
-               for snippet_id in id_list}
+    def expand_snippets(self, script):
+        """Map each snippet id to its code, in script order.
+
+        Snippets are loaded with a single indexed join over the script
+        entries and code blobs, fetching only the ids and the code.
+        """
+        rows = (Snippet.objects
+                .filter(script_entries__script=script)
+                .order_by('script_entries__position')
+                .values_list('id', 'code_blob__content'))
+        ret = {snippet_id: code for snippet_id, code in rows}
         return ret
 
     def to_representation(self, instance):
-        super_serializer = ScriptSerializer(instance)
-        ret = dict(super_serializer.data)
-        if super_serializer.data['snippets']:
-            ret.update({
-                'snippets_expanded':
-                    self.expand_snippets(super_serializer.data['snippets'])
-            })
+        with timer('serialize'):
+            super_serializer = ScriptSerializer(instance)
+            ret = dict(super_serializer.data)
+            if super_serializer.data['snippets']:
+                ret.update({
+                    'snippets_expanded': self.expand_snippets(instance)
+                })
 
         return ret
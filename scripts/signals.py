@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from scripts import assembly
+from snippets.models import Script, ScriptSnippet, Snippet
+from snippets.signals import snippets_updated
+
+
+@receiver(post_save, sender=Script)
+@receiver(post_delete, sender=Script)
+def script_changed(sender, instance, **kwargs):
+    assembly.invalidate([instance.id])
+
+
+@receiver(post_save, sender=Snippet)
+def snippet_saved(sender, instance, created, **kwargs):
+    if not created:
+        assembly.invalidate(set(
+            ScriptSnippet.objects.filter(snippet_id=instance.id)
+            .values_list('script_id', flat=True)))
+
+
+@receiver(snippets_updated)
+def snippets_bulk_updated(sender, ids, **kwargs):
+    assembly.invalidate(set(
+        ScriptSnippet.objects.filter(snippet_id__in=ids)
+        .values_list('script_id', flat=True)))
+
+
+@receiver(post_delete, sender=Snippet)
+def snippet_deleted(sender, instance, **kwargs):
+    # The referencing scripts are collected by snippets.signals before the
+    # cascade removes the entries.
+    script_ids = getattr(instance, '_script_ids', None)
+    if script_ids:
+        assembly.invalidate(set(script_ids))
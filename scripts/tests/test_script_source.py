@@ -0,0 +1,150 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from scripts import assembly
+from snippets.models import Script, Snippet
+
+
+def get_script_source_url(pk):
+    """Return script source url"""
+    return reverse('script-source', args=[pk])
+
+
+class ScriptSourceTest(TestCase):
+    """Testing the assembled script source endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.snippet1 = Snippet.objects.create(owner=self.user,
+                                               code='import os')
+        self.snippet2 = Snippet.objects.create(owner=self.user,
+                                               code='print(os.getcwd())',
+                                               style='monokai')
+        self.script = Script.objects.create(
+            owner=self.user, name='TestScript',
+            snippets=f'{self.snippet1.id},{self.snippet2.id},'
+                     f'{self.snippet1.id}')
+        cache.clear()
+
+    def get_source(self, **params):
+        res = self.client.get(get_script_source_url(self.script.id), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        if res.streaming:
+            return b''.join(res.streaming_content).decode()
+        return res.content.decode()
+
+    def test_source_joins_snippets_in_order(self):
+        source = self.get_source()
+
+        self.assertEqual(source, 'import os\nprint(os.getcwd())\nimport os')
+
+    def test_source_is_served_from_cache(self):
+        self.get_source()
+
+        # Only the script lookup, the source comes from the cache.
+        with self.assertNumQueries(1):
+            self.get_source()
+
+    def test_snippet_change_invalidates_source(self):
+        self.get_source()
+        key = assembly.get_cache_key(self.script.id, assembly.FORMAT_TEXT)
+
+        self.snippet2.code = 'print(1)'
+        self.snippet2.save()
+
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(self.get_source(), 'import os\nprint(1)\nimport os')
+
+    def test_snippet_delete_invalidates_source(self):
+        self.get_source()
+
+        self.snippet1.delete()
+
+        self.assertEqual(self.get_source(), 'print(os.getcwd())')
+
+    def test_script_change_invalidates_source(self):
+        self.get_source()
+
+        self.script.snippets = f'{self.snippet2.id}'
+        self.script.save()
+
+        self.assertEqual(self.get_source(), 'print(os.getcwd())')
+
+    def test_highlighted_source(self):
+        res = self.client.get(get_script_source_url(self.script.id),
+                              {'highlighted': 'true'})
+
+        self.assertEqual(res['Content-Type'], 'text/html; charset=utf-8')
+        self.assertEqual(res.content.decode().count('class="highlight"'), 3)
+        self.assertIn('/styles/friendly.css', res['Link'])
+        self.assertIn('/styles/monokai.css', res['Link'])
+
+    def test_if_none_match_returns_not_modified(self):
+        url = get_script_source_url(self.script.id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(SNIPPETS={'SCRIPT_SOURCE_STREAM_THRESHOLD': 10})
+    def test_large_source_is_streamed(self):
+        res = self.client.get(get_script_source_url(self.script.id))
+
+        self.assertTrue(res.streaming)
+        self.assertEqual(b''.join(res.streaming_content).decode(),
+                         'import os\nprint(os.getcwd())\nimport os')
+        key = assembly.get_cache_key(self.script.id, assembly.FORMAT_TEXT)
+        self.assertIsNone(cache.get(key))
+
+
+@override_settings(ROOT_URLCONF='tutorial.asgi_urls')
+class AsyncScriptSourceTest(TestCase):
+    """Testing the async script source view served by tutorial.asgi"""
+
+    def setUp(self):
+        self.client = AsyncClient()
+        user = User.objects.create_user(username='testuser')
+        snippet1 = Snippet.objects.create(owner=user, code='import os')
+        snippet2 = Snippet.objects.create(owner=user, code='print(1)',
+                                          style='monokai')
+        self.script = Script.objects.create(
+            owner=user, name='TestScript',
+            snippets=f'{snippet1.id},{snippet2.id}')
+        cache.clear()
+
+    async def test_source(self):
+        url = get_script_source_url(self.script.id)
+        res = await self.client.get(url)
+
+        self.assertEqual(res.content.decode(), 'import os\nprint(1)')
+        self.assertEqual(res['Content-Type'], 'text/plain; charset=utf-8')
+
+        # Django 3.1's AsyncClient takes header names as they're sent.
+        res = await self.client.get(url, **{'If-None-Match': res['ETag']})
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_highlighted_source(self):
+        res = await self.client.get(
+            get_script_source_url(self.script.id) + '?highlighted=true')
+
+        self.assertEqual(res.content.decode().count('class="highlight"'), 2)
+        self.assertIn('/styles/monokai.css', res['Link'])
+
+    @override_settings(SNIPPETS={'SCRIPT_SOURCE_STREAM_THRESHOLD': 10})
+    async def test_large_source_is_assembled(self):
+        res = await self.client.get(get_script_source_url(self.script.id))
+
+        self.assertFalse(res.streaming)
+        self.assertEqual(res.content.decode(), 'import os\nprint(1)')
+
+    async def test_not_found(self):
+        res = await self.client.get(get_script_source_url(0))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
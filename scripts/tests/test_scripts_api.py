@@ -1,6 +1,10 @@
+import json
+
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth.models import User
 from django.urls import reverse
 from snippets.models import Script, Snippet
@@ -67,7 +71,20 @@ class ScriptApiTest(TestCase):
                                     many=True).data
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, expected)
+        self.assertEqual(res.data['results'], expected)
+
+    def test_exporting_scripts(self):
+        snippet = create_sample_snippet(owner=self.user, code='print(1)')
+        scripts = [create_sample_script(self.user, name=f'TestScript{i}',
+                                        snippets=f'{snippet.id}')
+                   for i in range(3)]
+
+        res = self.client.get(reverse('script-export'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         ScriptSerializer(scripts, many=True).data)
 
     def test_getting_script_detail(self):
         snippet1, snippet2 = create_sample_snippet(
@@ -151,6 +168,52 @@ class ScriptApiSnippetsFieldTest(TestCase):
         res = self.client.post(path=SCRIPTS_URL, data=payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_creating_script_keeps_snippets_order(self):
+        snippet1, snippet2 = create_sample_snippet(
+            owner=self.user,
+            code='print(datetime.datetime.now())',
+            n=2)
+
+        snippets = f'{snippet2.id},{snippet1.id},{snippet2.id}'
+        payload = {'name': 'TestScript', 'snippets': snippets}
+        res = self.client.post(path=SCRIPTS_URL, data=payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['snippets'], snippets)
+        script = Script.objects.get(id=res.data['id'])
+        self.assertEqual(script.snippet_ids,
+                         [snippet2.id, snippet1.id, snippet2.id])
+        self.assertEqual(
+            list(Script.objects.filter(entries__snippet=snippet1)),
+            [script])
+
+    def test_invalid_snippets_error_lists_missing_ids(self):
+        snippet = create_sample_snippet(owner=self.user,
+                                        code='print(1)')
+        payload = {
+            'name': 'TestScript',
+            'snippets': f'{snippet.id + 2},{snippet.id},{snippet.id + 1}',
+        }
+
+        res = self.client.post(path=SCRIPTS_URL, data=payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f'{snippet.id + 1}, {snippet.id + 2}',
+                      str(res.data['snippets'][0]))
+
+    def test_validating_snippets_queries_only_submitted_ids(self):
+        snippets = create_sample_snippet(owner=self.user,
+                                         code='print(1)',
+                                         n=3)
+        value = ','.join(str(snippet.id) for snippet in snippets)
+
+        with CaptureQueriesContext(connection) as context:
+            ret = ScriptSerializer().validate_snippets(value)
+
+        self.assertEqual(ret, [snippet.id for snippet in snippets])
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('IN', context.captured_queries[0]['sql'])
+
     def test_patching_script_valid_snippets(self):
         snippet1, snippet2 = create_sample_snippet(
             owner=self.user,
@@ -180,6 +243,65 @@ class ScriptApiSnippetsFieldTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class ScriptDetailQueryCountTest(TestCase):
+    """Testing the number of queries made by the script detail endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             email='testuser@test.com',
+                                             password='testpasswd')
+        self.client.force_authenticate(user=self.user)
+
+    def get_detail_query_count(self, snippets):
+        script = create_sample_script(
+            owner=self.user,
+            snippets=','.join(str(snippet.id) for snippet in snippets))
+        detail_url = get_script_detail_url(script.id)
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(detail_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_detail_query_count_independent_of_snippets(self):
+        snippets = create_sample_snippet(owner=self.user,
+                                         code='print(1)',
+                                         n=30)
+
+        few = self.get_detail_query_count(snippets[:2])
+        many = self.get_detail_query_count(snippets)
+
+        self.assertEqual(few, many)
+
+    def test_list_query_count_independent_of_scripts(self):
+        snippet = create_sample_snippet(owner=self.user, code='print(1)')
+        for i in range(5):
+            create_sample_script(self.user, name=f'TestScript{i}',
+                                 snippets=f'{snippet.id}')
+
+        # One joined query for the scripts and one for their entries.
+        with self.assertNumQueries(2):
+            res = self.client.get(SCRIPTS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 5)
+
+    def test_expanding_keeps_script_order_and_repeated_ids(self):
+        snippet1, snippet2 = create_sample_snippet(owner=self.user,
+                                                   code='print(1)',
+                                                   n=2)
+        script = create_sample_script(
+            owner=self.user,
+            snippets=f'{snippet2.id},{snippet1.id},{snippet2.id}')
+
+        with self.assertNumQueries(1):
+            expanded = ScriptDetailSerializer().expand_snippets(script)
+
+        self.assertEqual(list(expanded), [snippet2.id, snippet1.id])
+        self.assertEqual(expanded[snippet1.id], snippet1.code)
+        self.assertEqual(expanded[snippet2.id], snippet2.code)
+
+
 class TestAuthRestrictedRequest(TestCase):
     def setUp(self):
         self.client = APIClient()
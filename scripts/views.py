@@ -1,16 +1,33 @@
+from django.http import (HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from scripts import assembly
 from scripts.serializers import ScriptSerializer, ScriptDetailSerializer
+from snippets.mixins import (ConditionalRequestMixin, NDJSONExportMixin,
+                             ReplicaReadMixin)
 from snippets.models import Script
 
 from rest_framework import permissions
 from snippets.permissions import IsOwnerOrReadOnly
+from snippets.throttling import ScriptExpansionThrottle
+from snippets.views import get_stylesheet_url
 
 
-class ScriptViewSet(viewsets.ModelViewSet):
-    queryset = Script.objects.all()
+class ScriptViewSet(ReplicaReadMixin, ConditionalRequestMixin,
+                    NDJSONExportMixin, viewsets.ModelViewSet):
+    queryset = Script.objects.select_related('owner').prefetch_related(
+        'entries')
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,
                           IsOwnerOrReadOnly)
-    pagination_class = None
+    throttle_classes = (ScriptExpansionThrottle,)
+
+    def get_queryset(self):
+        if self.action == 'source':
+            # Entries are read in chunks by the assembly instead.
+            return Script.objects.using(self.read_database)
+        return super().get_queryset()
 
     def get_serializer_class(self):
         if self.detail and self.request.method == 'GET':
@@ -23,3 +40,34 @@ class ScriptViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer, *args, **kwargs):
         serializer.save(owner=self.request.user)
+
+    @action(detail=True)
+    def source(self, request, *args, **kwargs):
+        """Source assembled from the script's snippets, as plain text or,
+        with ``?highlighted=true``, as highlighted HTML fragments"""
+        script = self.get_object()
+        if request.query_params.get('highlighted') in ('true', '1'):
+            fmt = assembly.FORMAT_HTML
+            content_type = 'text/html; charset=utf-8'
+        else:
+            fmt = assembly.FORMAT_TEXT
+            content_type = 'text/plain; charset=utf-8'
+
+        etag = quote_etag(f'{script.pk}-{script.revision}-{fmt}')
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            source = assembly.get_source(script, fmt)
+            if source is None:
+                response = StreamingHttpResponse(
+                    assembly.iter_source(script, fmt),
+                    content_type=content_type)
+            else:
+                response = HttpResponse(source, content_type=content_type)
+            if fmt == assembly.FORMAT_HTML:
+                urls = [request.build_absolute_uri(get_stylesheet_url(style))
+                        for style in assembly.get_styles(script)]
+                response['Link'] = ', '.join(f'<{url}>; rel="stylesheet"'
+                                             for url in urls)
+        response['ETag'] = etag
+        return response
@@ -6,3 +6,6 @@ from django.apps import AppConfig
 
 class SnippetsConfig(AppConfig):
     name = 'snippets'
+
+    def ready(self):
+        from snippets import checks, replicas, signals  # noqa: F401
@@ -0,0 +1,210 @@
+"""
+Async snippet views, routed by ``tutorial.asgi_urls``.
+
+DRF 3.11 has no async views. The list and detail views therefore run
+the viewset through ``asynchronous.database``. Before a write, the
+highlight it will store is rendered in the render process pool, so
+``Snippet.save`` finds it in the render cache. Only writes passing the
+viewset's authentication, permission and throttle checks are rendered
+ahead; the throttles aren't charged twice. Writes are admitted by
+``budgets.render_admission`` before, rather than by the viewset. The
+highlight view only needs the database to load the snippet and is async
+throughout.
+"""
+import functools
+import json
+
+from django.http import (Http404, HttpResponse, HttpResponseNotAllowed,
+                         JsonResponse)
+from rest_framework.exceptions import APIException
+
+from snippets import budgets, highlighting
+from snippets.asynchronous import database, render
+from snippets.conf import get_setting
+from snippets.mixins import RENDER_REJECTED, is_render_admission_needed
+from snippets.models import Snippet
+from snippets.registry import LANGUAGE_CHOICES
+from snippets.views import STYLES, SnippetViewSet, get_stylesheet_url
+
+LANGUAGES = {language for language, _ in LANGUAGE_CHOICES}
+INPUT_TYPES = {'code': str, 'language': str, 'style': str, 'linenos': bool,
+               'title': str}
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update',
+                  'patch': 'partial_update', 'delete': 'destroy'}
+
+
+class AsyncSnippetViewSet(SnippetViewSet):
+    """``SnippetViewSet`` skipping the throttles ``check_write`` charged"""
+
+    def check_throttles(self, request):
+        if not getattr(request._request, 'throttles_checked', False):
+            super().check_throttles(request)
+
+
+list_view = AsyncSnippetViewSet.as_view(LIST_ACTIONS)
+detail_view = AsyncSnippetViewSet.as_view(DETAIL_ACTIONS)
+
+
+def check_write(request, actions, **kwargs):
+    """Return whether the viewset lets the write ``request`` through its
+    authentication, permission and throttle checks.
+
+    Rejected writes are answered by the viewset, which runs the checks
+    again; the throttles only charge writes they let through.
+    """
+    # Read the body before DRF consumes the stream, prerender needs it.
+    request.body
+    view = AsyncSnippetViewSet(action_map=actions)
+    view.args, view.kwargs, view.format_kwarg = (), kwargs, None
+    view.request = view.initialize_request(request, **kwargs)
+    try:
+        view.perform_authentication(view.request)
+        view.check_permissions(view.request)
+        if 'pk' in kwargs:
+            view.get_object()
+        view.check_throttles(view.request)
+    except (APIException, Http404):
+        return False
+    request.throttles_checked = True
+    return True
+
+
+def get_stored_inputs(pk):
+    snippet = Snippet.objects.select_related('code_blob').filter(
+        pk=pk).first()
+    return snippet.get_render_inputs() if snippet is not None else None
+
+
+def get_default_inputs():
+    return {field: Snippet._meta.get_field(field).get_default()
+            for field in Snippet.RENDER_FIELDS if field != 'code'}
+
+
+def get_request_inputs(request):
+    """Return the render inputs given in a JSON request body, or None"""
+    if request.content_type != 'application/json':
+        return None
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return {field: data[field] for field in Snippet.RENDER_FIELDS
+            if field in data}
+
+
+async def prerender(request, pk=None):
+    """Render the highlight a write will store into the render cache.
+
+    Requests the serializer will reject, and those whose result can't be
+    anticipated, are left for ``Snippet.save`` to handle.
+    """
+    if get_setting('HIGHLIGHT_MODE') == 'deferred':
+        return
+    changes = get_request_inputs(request)
+    if not changes:
+        return
+    if pk is None:
+        inputs = get_default_inputs()
+    else:
+        inputs = await database(get_stored_inputs)(pk)
+        if inputs is None:
+            return
+    inputs.update(changes)
+    if not (set(inputs) == set(INPUT_TYPES) and
+            all(isinstance(inputs[field], field_type)
+                for field, field_type in INPUT_TYPES.items()) and
+            inputs['language'] in LANGUAGES and inputs['style'] in STYLES):
+        return
+    full = get_setting('HIGHLIGHT_STORAGE') == Snippet.FORMAT_DOCUMENT
+    try:
+        await render(full=full, **inputs)
+    except Exception:
+        # Raised again by Snippet.save.
+        pass
+
+
+def admitted(view):
+    """Run ``view`` holding a slot of ``budgets.render_admission`` if it
+    renders, or answer 429 when there is none"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not is_render_admission_needed(request):
+            return await view(request, *args, **kwargs)
+        if not budgets.render_admission.acquire():
+            response = JsonResponse({'detail': RENDER_REJECTED}, status=429)
+            response['Retry-After'] = str(get_setting('RENDER_RETRY_AFTER'))
+            return response
+        request.render_admitted = True
+        try:
+            return await view(request, *args, **kwargs)
+        finally:
+            budgets.render_admission.release()
+    return wrapper
+
+
+@admitted
+async def snippet_list(request, **kwargs):
+    if request.method == 'POST' and await database(check_write)(
+            request, LIST_ACTIONS, **kwargs):
+        await prerender(request)
+    return await database(list_view)(request, **kwargs)
+
+
+@admitted
+async def snippet_detail(request, pk, **kwargs):
+    if request.method in ('PUT', 'PATCH') and await database(check_write)(
+            request, DETAIL_ACTIONS, pk=pk, **kwargs):
+        await prerender(request, pk)
+    return await database(detail_view)(request, pk=pk, **kwargs)
+
+
+# DRF checks CSRF for session authenticated writes itself.
+snippet_list.csrf_exempt = True
+snippet_detail.csrf_exempt = True
+
+
+def get_snippet(pk):
+    snippet = Snippet.objects.select_related('highlight_blob').filter(
+        pk=pk).first()
+    if snippet is None:
+        raise Http404
+    return snippet
+
+
+async def snippet_highlight(request, pk):
+    """Async ``SnippetViewSet.highlight``, rendering missing fragments in
+    the render process pool"""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    snippet = await database(get_snippet)(pk)
+    if snippet.highlight_status == Snippet.HIGHLIGHT_READY:
+        if request.GET.get('full') in ('true', '1'):
+            response = HttpResponse(snippet.get_highlighted_document())
+        else:
+            response = HttpResponse(await get_fragment(snippet))
+            stylesheet_url = request.build_absolute_uri(
+                get_stylesheet_url(snippet.style))
+            response['Link'] = f'<{stylesheet_url}>; rel="stylesheet"'
+    elif snippet.highlight_status == Snippet.HIGHLIGHT_FAILED:
+        response = HttpResponse('Highlighting failed.', status=503)
+    else:
+        response = HttpResponse('Highlighting is pending.', status=202)
+        response['Retry-After'] = '1'
+    response['X-Highlight-Status'] = snippet.highlight_status
+    return response
+
+
+async def get_fragment(snippet):
+    """Async ``Snippet.get_highlighted_fragment``"""
+    if snippet.highlight_format == Snippet.FORMAT_FRAGMENT:
+        return snippet.highlighted
+    fragment = highlighting.to_fragment(snippet.highlighted, snippet.style,
+                                        snippet.title)
+    if fragment is None:
+        inputs = await database(snippet.get_render_inputs)()
+        fragment = await render(full=False, **inputs)
+    return fragment
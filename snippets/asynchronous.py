@@ -0,0 +1,95 @@
+"""
+Helpers for the async views served by ``tutorial.asgi``.
+
+Django 3.1 has no async ORM. ``database`` runs a function in the
+thread Django keeps for sync code. That is one thread per event loop, so
+database work done there should stay short.
+
+Pygments rendering is CPU bound and goes to the render processes of
+``snippets.budgets`` through ``render``. At most ``ASYNC_RENDER_LIMIT``
+renders per process are queued for them. Requests beyond that wait in
+the event loop, which keeps serving other requests.
+"""
+import asyncio
+import functools
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+
+from snippets import budgets, highlighting, metrics
+from snippets.conf import get_setting
+from snippets.render_cache import get_render_cache
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def database(func):
+    """Return an async version of ``func``, run where the ORM is safe to
+    use, with its queries timed like the ones of sync views"""
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        with metrics.query_timing():
+            return func(*args, **kwargs)
+
+    return sync_to_async(call, thread_sensitive=True)
+
+
+def get_render_semaphore():
+    loop = asyncio.get_event_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(
+            get_setting('ASYNC_RENDER_LIMIT'))
+    return semaphore
+
+
+async def render(full=True, **inputs):
+    """Render through the render cache, running Pygments in the render
+    processes on a miss"""
+    cache = get_render_cache()
+    key = highlighting.render_key(full=full, **inputs)
+    if cache.backend:
+        html = await sync_to_async(cache.get, thread_sensitive=False)(key)
+    else:
+        html = cache.get(key)
+    if html is None:
+        with metrics.timer('render'):
+            async with get_render_semaphore():
+                html = await asyncio.wrap_future(
+                    budgets.submit(dict(inputs, full=full)))
+        if not budgets.is_final(html):
+            # Rendered again on the next miss.
+            return html
+        if cache.backend:
+            await sync_to_async(cache.set, thread_sensitive=False)(key, html)
+        else:
+            cache.set(key, html)
+    return html
+
+
+class BufferStreamingMiddleware:
+    """Read streaming responses in the sync thread.
+
+    Django 3.1 iterates streaming responses in the event loop, where the
+    queries of iterators such as the NDJSON exports aren't allowed. The
+    content is read into a regular response instead, so it's held in
+    memory; use the WSGI entry point for large exports.
+    """
+    sync_capable = False
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    async def __call__(self, request):
+        response = await self.get_response(request)
+        if not response.streaming:
+            return response
+        content = await database(b''.join)(response.streaming_content)
+        buffered = HttpResponse(content, status=response.status_code)
+        for header, value in response.items():
+            buffered[header] = value
+        buffered.cookies = response.cookies
+        return buffered
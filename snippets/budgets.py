@@ -0,0 +1,251 @@
+"""
+Highlight rendering under resource budgets.
+
+Every render goes through ``submit`` or ``render``, which run Pygments in
+the processes of a ``sandbox.RenderSandbox``. The budgets are:
+
+- ``RENDER_MAX_SIZE`` characters of code, checked before rendering;
+- ``HIGHLIGHT_TIME_BUDGET`` seconds per render, after which the render
+  process is killed;
+- ``RENDER_MEMORY_LIMIT`` bytes a render process may allocate.
+
+Code going over a budget is rendered as plain text instead, escaped in
+the same markup, and its lexer is recorded as slow. Code in a slow lexer
+gets the smaller ``RENDER_SLOW_MAX_SIZE`` budget. The plain text is a
+``Fallback``: unlike code over the size budget, renders that went over
+the time or memory budget or crashed depend on the load of the machine,
+so they aren't cached and are rendered again later, see ``is_final``.
+Render times per lexer are kept for ``/stats/render-budgets/`` and
+``/metrics``, and weigh the cost of renders for ``snippets.throttling``.
+
+At most ``RENDER_MAX_IN_FLIGHT`` requests per process render at once,
+see ``render_admission``.
+
+Counters and slow lexers are per process.
+"""
+import logging
+import threading
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from snippets import highlighting
+from snippets.conf import get_setting
+from snippets.metrics import registry
+from snippets.sandbox import REASON_SIZE, BudgetExceeded, RenderSandbox
+
+logger = logging.getLogger(__name__)
+
+
+# Bounds of the relative cost of rendering a character of a lexer.
+MIN_WEIGHT = 0.25
+MAX_WEIGHT = 8.0
+# Reason of ``registry.record_rejected`` for renders over the limit.
+REJECTED_IN_FLIGHT = 'in_flight'
+# Renders of a lexer observed before its weight is measured.
+WEIGHT_MIN_RENDERS = 10
+
+
+class RenderStats:
+    """Render counts, times and sizes per lexer"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.languages = {}
+
+    def get_entry(self, language):
+        return self.languages.setdefault(language, {
+            'renders': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+            'characters': 0, 'exceeded': {}})
+
+    def observe(self, language, seconds, characters=0):
+        with self.lock:
+            entry = self.get_entry(language)
+            entry['renders'] += 1
+            entry['seconds'] += seconds
+            entry['characters'] += characters
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+        registry.record_render(language, seconds)
+
+    def exceeded(self, language, reason):
+        with self.lock:
+            exceeded = self.get_entry(language)['exceeded']
+            exceeded[reason] = exceeded.get(reason, 0) + 1
+        registry.record_render_budget_exceeded(language, reason)
+
+    def is_slow(self, language):
+        with self.lock:
+            entry = self.languages.get(language)
+            return entry is not None and bool(entry['exceeded'])
+
+    def get_weight(self, language):
+        """Return the time a character of ``language`` takes to render,
+        relative to the mean of all lexers.
+
+        Lexers that went over a budget weigh ``MAX_WEIGHT``, those with
+        few renders 1.
+        """
+        with self.lock:
+            entry = self.languages.get(language)
+            if entry is None or entry['renders'] < WEIGHT_MIN_RENDERS:
+                return 1.0
+            if entry['exceeded']:
+                return MAX_WEIGHT
+            seconds = sum(entry['seconds']
+                          for entry in self.languages.values())
+            characters = sum(entry['characters']
+                             for entry in self.languages.values())
+            if not entry['characters'] or not seconds:
+                return 1.0
+            weight = (entry['seconds'] / entry['characters'] /
+                      (seconds / characters))
+        return min(MAX_WEIGHT, max(MIN_WEIGHT, weight))
+
+    def stats(self):
+        with self.lock:
+            languages = {
+                language: dict(entry, exceeded=dict(entry['exceeded']))
+                for language, entry in self.languages.items()}
+        return {
+            'languages': languages,
+            'slow': sorted(language for language, entry in languages.items()
+                           if entry['exceeded']),
+        }
+
+
+render_stats = RenderStats()
+
+
+class Fallback(str):
+    """HTML of code rendered as plain text after going over the budget
+    ``reason``"""
+
+    def __new__(cls, html, reason):
+        fallback = super().__new__(cls, html)
+        fallback.reason = reason
+        return fallback
+
+
+def is_final(html):
+    """Whether ``html`` is what rendering its inputs again would return,
+    and may be cached: a render, or code over the size budget"""
+    return getattr(html, 'reason', REASON_SIZE) == REASON_SIZE
+
+
+def get_size_budget(language):
+    if render_stats.is_slow(language):
+        return get_setting('RENDER_SLOW_MAX_SIZE')
+    return get_setting('RENDER_MAX_SIZE')
+
+
+def render_in(sandbox, inputs, function='render'):
+    """Render ``inputs`` within the budgets with ``function`` of
+    ``highlighting``, from a thread of ``sandbox``.
+
+    Code over a budget is rendered as plain text, returned as a
+    ``Fallback``. It has no line state for ``render_incremental``, None is
+    returned instead.
+    """
+    language = inputs['language']
+    try:
+        if len(inputs['code']) > get_size_budget(language):
+            raise BudgetExceeded(REASON_SIZE)
+        output, seconds = sandbox.render(inputs, function)
+    except BudgetExceeded as exc:
+        logger.warning('Highlighting %s code exceeded the %s budget, '
+                       'rendering it as plain text', language, exc.reason)
+        render_stats.exceeded(language, exc.reason)
+        if function == 'render':
+            return Fallback(highlighting.render_plain(**inputs), exc.reason)
+        inputs = dict(inputs)
+        del inputs['previous']
+        return Fallback(highlighting.render_plain(**inputs), exc.reason), None
+    render_stats.observe(language, seconds, len(inputs['code']))
+    return output
+
+
+class RenderAdmission:
+    """Count of requests rendering in this process, bounded by
+    ``RENDER_MAX_IN_FLIGHT``"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """Return whether a render may start, ``release`` must follow
+        if it may"""
+        limit = get_setting('RENDER_MAX_IN_FLIGHT')
+        with self.lock:
+            if limit is not None and self.in_flight >= limit:
+                self.rejected += 1
+                admitted = False
+            else:
+                self.in_flight += 1
+                admitted = True
+        if not admitted:
+            registry.record_rejected(REJECTED_IN_FLIGHT)
+        return admitted
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self.lock:
+            return {'in_flight': self.in_flight, 'rejected': self.rejected,
+                    'limit': get_setting('RENDER_MAX_IN_FLIGHT')}
+
+
+render_admission = RenderAdmission()
+
+
+def create_sandbox(processes=None, timeout=None):
+    return RenderSandbox(
+        processes=processes or get_setting('HIGHLIGHT_WORKERS'),
+        timeout=timeout or get_setting('HIGHLIGHT_TIME_BUDGET'),
+        memory_limit=get_setting('RENDER_MEMORY_LIMIT'))
+
+
+_sandbox = None
+_sandbox_lock = threading.Lock()
+
+
+def get_sandbox():
+    """Sandbox shared by the request handlers of this process"""
+    global _sandbox
+    with _sandbox_lock:
+        if _sandbox is None:
+            _sandbox = create_sandbox()
+    return _sandbox
+
+
+@receiver(setting_changed)
+def reset_sandbox(*, setting, **kwargs):
+    global _sandbox
+    if setting == 'SNIPPETS':
+        with _sandbox_lock:
+            sandbox, _sandbox = _sandbox, None
+        if sandbox is not None:
+            sandbox.close()
+
+
+def submit(inputs, sandbox=None, function='render'):
+    """Render ``inputs`` (including ``full``) within the budgets, returning
+    a ``Future`` of the HTML"""
+    sandbox = sandbox or get_sandbox()
+    return sandbox.submit(render_in, sandbox, inputs, function)
+
+
+def render(full=True, **inputs):
+    """Return the highlighted HTML, like ``highlighting.render``, rendered
+    within the budgets"""
+    return submit(dict(inputs, full=full)).result()
+
+
+def render_incremental(full=True, previous=None, **inputs):
+    """Return the HTML and line state, like
+    ``highlighting.render_incremental``, rendered within the budgets"""
+    return submit(dict(inputs, full=full, previous=previous),
+                  function='render_incremental').result()
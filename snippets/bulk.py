@@ -0,0 +1,231 @@
+"""
+Bulk creation, update and deletion of snippets.
+
+Items are processed in batches of ``BULK_BATCH_SIZE``. Each batch is
+validated with ``SnippetSerializer``, rendered in parallel through
+``workers.render_many`` and written in its own transaction, so a failing
+batch never holds locks for the whole upload. Every item gets a result
+entry with its index, an HTTP-like status and either the snippet id or
+the validation errors.
+"""
+import itertools
+
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+
+from snippets import budgets, metrics, search
+from snippets.conf import get_setting
+from snippets.models import CodeBlob, HighlightBlob, Snippet
+from snippets.serializers import SnippetSerializer
+from snippets.signals import snippets_created, snippets_updated
+from snippets.workers import render_many
+
+UPDATE_FIELDS = ['title', 'code_blob', 'linenos', 'language', 'style',
+                 'highlight_blob', 'highlight_format', 'highlight_fallback',
+                 'highlight_status', 'highlight_attempts',
+                 'highlight_claimed_at', 'revision', 'updated']
+
+
+def batched(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def error(index, code, errors):
+    return {'index': index, 'status': code, 'errors': errors}
+
+
+def is_id(value):
+    # JSON booleans are ints in Python, and True would find snippet 1.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class BulkProcessor:
+    """Apply bulk operations on behalf of ``user``"""
+
+    def __init__(self, user, batch_size=None, max_items=None):
+        self.user = user
+        self.batch_size = batch_size or get_setting('BULK_BATCH_SIZE')
+        self.max_items = max_items or get_setting('BULK_MAX_ITEMS')
+
+    def iter_batches(self, items):
+        """Yield batches of ``(index, item)``, stopping one item past the
+        limit so it can be reported"""
+        numbered = enumerate(itertools.islice(items, self.max_items + 1))
+        return batched(numbered, self.batch_size)
+
+    def check_item(self, index, item):
+        if index >= self.max_items:
+            msg = f'At most {self.max_items} items are accepted.'
+            return error(index, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                         {'non_field_errors': [msg]})
+        if not isinstance(item, dict):
+            return error(index, status.HTTP_400_BAD_REQUEST,
+                         {'non_field_errors': ['Expected an object.']})
+        return None
+
+    def render(self, snippets):
+        """Render the highlights of ``snippets`` in parallel, returning
+        the ones that failed with their exception"""
+        if get_setting('HIGHLIGHT_MODE') == 'deferred':
+            for snippet in snippets:
+                snippet.highlighted = ''
+                snippet.highlight_status = Snippet.HIGHLIGHT_PENDING
+                snippet.highlight_attempts = 0
+                snippet.highlight_claimed_at = None
+            return {}
+        full = get_setting('HIGHLIGHT_STORAGE') == Snippet.FORMAT_DOCUMENT
+        with metrics.timer('render'):
+            results = render_many([snippet.get_render_inputs()
+                                   for snippet in snippets], full)
+        failed = {}
+        for snippet, html in zip(snippets, results):
+            if isinstance(html, Exception):
+                failed[id(snippet)] = html
+                continue
+            snippet.highlighted = html
+            snippet.highlight_format = (Snippet.FORMAT_DOCUMENT if full
+                                        else Snippet.FORMAT_FRAGMENT)
+            snippet.highlight_fallback = not budgets.is_final(html)
+            snippet.highlight_status = Snippet.HIGHLIGHT_READY
+            snippet.highlight_attempts = 0
+            snippet.highlight_claimed_at = None
+        return failed
+
+    def create(self, items):
+        results = []
+        for batch in self.iter_batches(items):
+            valid = []
+            for index, item in batch:
+                result = self.check_item(index, item)
+                if result is None:
+                    serializer = SnippetSerializer(data=item)
+                    if serializer.is_valid():
+                        valid.append((index, Snippet(
+                            owner=self.user, **serializer.validated_data)))
+                        continue
+                    result = error(index, status.HTTP_400_BAD_REQUEST,
+                                   serializer.errors)
+                results.append(result)
+
+            snippets = [snippet for _, snippet in valid]
+            failed = self.render(snippets)
+            created = [(index, snippet) for index, snippet in valid
+                       if id(snippet) not in failed]
+            self.insert([snippet for _, snippet in created])
+            results.extend(
+                error(index, status.HTTP_400_BAD_REQUEST,
+                      {'non_field_errors': [str(failed[id(snippet)])]})
+                if id(snippet) in failed else
+                {'index': index, 'status': status.HTTP_201_CREATED,
+                 'id': snippet.id}
+                for index, snippet in valid)
+        return sorted(results, key=lambda result: result['index'])
+
+    def insert(self, snippets):
+        with transaction.atomic():
+            Snippet.store_blobs(snippets)
+            if connection.features.can_return_rows_from_bulk_insert:
+                for snippet in snippets:
+                    snippet.revision = 1
+                Snippet.objects.bulk_create(snippets)
+                snippets_created.send(sender=Snippet, snippets=snippets)
+            else:
+                # Without RETURNING the ids of bulk inserted rows are
+                # unknown, insert the already rendered rows one by one.
+                for snippet in snippets:
+                    snippet._loaded_render_state = snippet.get_render_state()
+                    snippet.save(force_insert=True)
+            search.index_snippets(snippets)
+
+    def get_instances(self, batch, results):
+        """Load the snippets referenced by ``batch``, recording errors for
+        items that can't be applied"""
+        ids = [item.get('id') for _, item in batch
+               if isinstance(item, dict)]
+        instances = Snippet.objects.in_bulk(
+            [pk for pk in ids if is_id(pk)])
+        found = []
+        for index, item in batch:
+            result = self.check_item(index, item)
+            if result is None:
+                pk = item.get('id')
+                instance = instances.get(pk) if is_id(pk) else None
+                if not is_id(pk):
+                    result = error(index, status.HTTP_400_BAD_REQUEST,
+                                   {'id': ['A valid integer is required.']})
+                elif instance is None:
+                    result = error(index, status.HTTP_404_NOT_FOUND,
+                                   {'id': ['Snippet not found.']})
+                elif instance.owner_id != self.user.id:
+                    result = error(index, status.HTTP_403_FORBIDDEN,
+                                   {'id': ['Not the owner of the snippet.']})
+                else:
+                    found.append((index, item, instance))
+                    continue
+            results.append(result)
+        return found
+
+    def update(self, items, partial=True):
+        results = []
+        for batch in self.iter_batches(items):
+            valid = []
+            for index, item, instance in self.get_instances(batch, results):
+                serializer = SnippetSerializer(instance, data=item,
+                                               partial=partial)
+                if not serializer.is_valid():
+                    results.append(error(index, status.HTTP_400_BAD_REQUEST,
+                                         serializer.errors))
+                    continue
+                for field, value in serializer.validated_data.items():
+                    setattr(instance, field, value)
+                valid.append((index, instance))
+
+            to_render = [instance for _, instance in valid
+                         if instance.needs_render()]
+            failed = self.render(to_render)
+            updated = []
+            now = timezone.now()
+            for index, instance in valid:
+                if id(instance) in failed:
+                    results.append(error(
+                        index, status.HTTP_400_BAD_REQUEST,
+                        {'non_field_errors': [str(failed[id(instance)])]}))
+                    continue
+                instance.revision += 1
+                instance.updated = now
+                updated.append(instance)
+                results.append({'index': index, 'status': status.HTTP_200_OK,
+                                'id': instance.id})
+            if updated:
+                replaced = [instance.get_replaced_blobs()
+                            for instance in updated]
+                with transaction.atomic():
+                    Snippet.store_blobs(updated)
+                    Snippet.objects.bulk_update(updated, UPDATE_FIELDS)
+                    snippets_updated.send(
+                        sender=Snippet, fields=UPDATE_FIELDS,
+                        ids=[instance.id for instance in updated])
+                CodeBlob.collect(code for code, _ in replaced)
+                HighlightBlob.collect(highlight for _, highlight in replaced)
+        return sorted(results, key=lambda result: result['index'])
+
+    def delete(self, items):
+        results = []
+        for batch in self.iter_batches(items):
+            batch = [(index, item if isinstance(item, dict) else {'id': item})
+                     for index, item in batch]
+            found = self.get_instances(batch, results)
+            with transaction.atomic():
+                Snippet.objects.filter(
+                    id__in=[instance.id for _, _, instance in found]).delete()
+            results.extend({'index': index,
+                            'status': status.HTTP_204_NO_CONTENT,
+                            'id': instance.id}
+                           for index, _, instance in found)
+        return sorted(results, key=lambda result: result['index'])
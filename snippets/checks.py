@@ -0,0 +1,59 @@
+"""
+System checks of the snippets settings.
+
+Caches that invalidate or count across requests must be shared by every
+process serving or changing snippets: the web processes and the
+highlight workers. A local-memory cache is private to its process.
+"""
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from snippets.conf import get_setting
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def is_local(alias):
+    return settings.CACHES.get(alias, {}).get('BACKEND') == LOCMEM_BACKEND
+
+
+@register()
+def check_response_cache(app_configs, **kwargs):
+    if get_setting('RESPONSE_CACHE') is None:
+        return []
+    setting = ('RESPONSE_TOKEN_CACHE' if get_setting('RESPONSE_TOKEN_CACHE')
+               else 'RESPONSE_CACHE')
+    alias = get_setting(setting)
+    if not is_local(alias):
+        return []
+    return [Error(
+        f'{setting} names the local-memory cache {alias!r}.',
+        hint='Invalidations sent by the highlight workers and the other '
+             'web processes never reach it, so stale responses are served. '
+             'Set RESPONSE_TOKEN_CACHE to a cache shared by the processes.',
+        id='snippets.E001')]
+
+
+@register()
+def check_throttle_cache(app_configs, **kwargs):
+    alias = get_setting('THROTTLE_CACHE')
+    if not any(get_setting('THROTTLE_RATES').values()) or not is_local(alias):
+        return []
+    return [Warning(
+        f'THROTTLE_CACHE names the local-memory cache {alias!r}.',
+        hint='Each process has its own token buckets, so the rates apply '
+             'per process.',
+        id='snippets.W001')]
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    alias = get_setting('REPLICA_PIN_CACHE')
+    if not get_setting('READ_REPLICAS') or not is_local(alias):
+        return []
+    return [Error(
+        f'REPLICA_PIN_CACHE names the local-memory cache {alias!r}.',
+        hint='A write pins its user to the primary in its own process only, '
+             'so reads served by the other processes may miss it. Use a '
+             'cache shared by the web processes.',
+        id='snippets.E002')]
@@ -0,0 +1,132 @@
+"""
+Compression of stored text.
+
+Compressed values start with a NUL byte followed by a codec byte, then
+the payload. Text never starts with NUL once stored in a PostgreSQL
+``text`` column, so values without that header are read as UTF-8 text
+written before the column was compressed.
+
+The codecs are zlib, alone or with a preset dictionary. A dictionary
+primes the compressor with strings that are frequent in the data, which
+matters for short values such as highlighted snippets: most of their
+markup is the same few ``<span class="...">`` tags. Dictionaries are
+files in ``dictionaries/`` built with::
+
+    python manage.py build_compression_dictionary
+
+Stored values reference their dictionary by codec id, so a dictionary
+can't change once it's used; add a new one with a new id instead.
+"""
+import collections
+import functools
+import os
+import re
+import zlib
+
+from snippets.conf import get_setting
+
+MAGIC = b'\x00'
+CODEC_PLAIN = 0
+CODEC_ZLIB = 1
+
+# Codec ids of the preset dictionaries, never reused.
+DICTIONARIES = {
+    'highlight-1': 2,
+}
+DICTIONARY_DIR = os.path.join(os.path.dirname(__file__), 'dictionaries')
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+# Shorter values don't gain from compression.
+MIN_COMPRESS_SIZE = 64
+
+# Highlighted tokens with their text, other tags, and text.
+TOKEN_RE = re.compile(r'<span class="[^"]*">[^<]*</span>|<[^>]*>|[^<]+')
+MAX_TOKEN_LENGTH = 256
+
+
+def get_dictionary_path(name):
+    return os.path.join(DICTIONARY_DIR, name + '.txt')
+
+
+@functools.lru_cache(maxsize=None)
+def load_dictionary(name):
+    with open(get_dictionary_path(name), 'rb') as dictionary_file:
+        return dictionary_file.read()
+
+
+@functools.lru_cache(maxsize=None)
+def get_codec_dictionary(codec):
+    for name, dictionary_codec in DICTIONARIES.items():
+        if dictionary_codec == codec:
+            return load_dictionary(name)
+    raise ValueError(f'Unknown compression codec {codec}')
+
+
+def is_compressed(data):
+    return isinstance(data, (bytes, memoryview)) and data[:1] == MAGIC
+
+
+def compress(text, dictionary=None):
+    """Return the stored form of ``text``, compressed with the preset
+    ``dictionary`` if given"""
+    data = text.encode('utf-8')
+    if len(data) >= MIN_COMPRESS_SIZE:
+        level = get_setting('BLOB_COMPRESSION_LEVEL')
+        if dictionary is None:
+            codec = CODEC_ZLIB
+            compressor = zlib.compressobj(level)
+        else:
+            codec = DICTIONARIES[dictionary]
+            compressor = zlib.compressobj(
+                level, zdict=load_dictionary(dictionary))
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) < len(data):
+            return MAGIC + bytes([codec]) + compressed
+    return MAGIC + bytes([CODEC_PLAIN]) + data
+
+
+def decompress(data):
+    """Return the text of a value returned by ``compress``, or of text
+    stored before compression (returned as ``str`` by SQLite)"""
+    if isinstance(data, str):
+        return data
+    data = bytes(data)
+    if data[:1] != MAGIC:
+        return data.decode('utf-8')
+    codec = data[1]
+    payload = data[2:]
+    if codec == CODEC_PLAIN:
+        return payload.decode('utf-8')
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    decompressor = zlib.decompressobj(zdict=get_codec_dictionary(codec))
+    return (decompressor.decompress(payload) +
+            decompressor.flush()).decode('utf-8')
+
+
+def build_dictionary(samples, size=MAX_DICTIONARY_SIZE):
+    """Return a preset dictionary of the strings repeated most in
+    ``samples``, weighted by the bytes they would save.
+
+    Highlighted tokens, tags and the text between them are counted as a
+    whole. zlib finds
+    the end of the dictionary cheapest to reference, so the most valuable
+    strings come last.
+    """
+    counts = collections.Counter()
+    for sample in samples:
+        counts.update(token for token in TOKEN_RE.findall(sample)
+                      if 1 < len(token) <= MAX_TOKEN_LENGTH)
+    ranked = sorted(
+        ((count * len(token.encode('utf-8')), token)
+         for token, count in counts.items() if count > 1),
+        reverse=True)
+    chosen = []
+    total = 0
+    for _, token in ranked:
+        encoded = token.encode('utf-8')
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen))
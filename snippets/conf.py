@@ -0,0 +1,100 @@
+"""
+Settings for the snippets app.
+
+Values are read from the ``SNIPPETS`` dictionary in the Django settings,
+falling back to the defaults below, e.g.:
+
+    SNIPPETS = {
+        'HIGHLIGHT_MODE': 'deferred',
+        'HIGHLIGHT_WORKERS': 4,
+    }
+"""
+from django.conf import settings
+
+DEFAULTS = {
+    # 'sync' renders highlighted HTML inside Snippet.save, 'deferred'
+    # leaves it to the highlight workers.
+    'HIGHLIGHT_MODE': 'sync',
+    'HIGHLIGHT_WORKERS': 2,
+    'HIGHLIGHT_RETRIES': 2,
+    # Renders queued in the render process pool per process by the async
+    # views, the pool has HIGHLIGHT_WORKERS processes.
+    'ASYNC_RENDER_LIMIT': 4,
+    # Seconds a render may take before its process is killed and the code
+    # is rendered as plain text, see snippets/budgets.py.
+    'HIGHLIGHT_TIME_BUDGET': 10.0,
+    # Characters of code rendered with its lexer, longer code is rendered
+    # as plain text. Lexers that went over a budget get the smaller one.
+    'RENDER_MAX_SIZE': 512 * 1024,
+    'RENDER_SLOW_MAX_SIZE': 64 * 1024,
+    # Bytes a render process may allocate, or None.
+    'RENDER_MEMORY_LIMIT': 256 * 1024 * 1024,
+    # Requests per process rendering highlights at once, or None. Writes
+    # over the limit get a 429 response, retried after RENDER_RETRY_AFTER
+    # seconds.
+    'RENDER_MAX_IN_FLIGHT': 16,
+    'RENDER_RETRY_AFTER': 1,
+    # Token bucket sizes per throttle scope and period, refilled over the
+    # period, or None, see snippets/throttling.py. Snippet writes take a
+    # token per RENDER_COST_UNIT characters of code, weighted by the cost
+    # of the lexer, script details one per snippet.
+    'THROTTLE_RATES': {'renders': '600/min',
+                       'script_expansions': '20000/min'},
+    'RENDER_COST_UNIT': 4096,
+    # Django cache alias holding the token buckets. Limits are per process
+    # unless it is shared by the web processes.
+    'THROTTLE_CACHE': 'default',
+    # Seconds after which a claimed snippet is assumed to belong to a dead
+    # worker and is claimed again.
+    'HIGHLIGHT_STALE_AFTER': 300,
+    # 'fragment' stores only the highlighted markup and serves the style's
+    # CSS from /styles/, 'document' stores standalone HTML documents.
+    'HIGHLIGHT_STORAGE': 'fragment',
+    # Size bound of the in-process cache of rendered HTML, in characters.
+    'RENDER_CACHE_MAX_SIZE': 32 * 1024 * 1024,
+    # Django cache alias shared between processes, or None.
+    'RENDER_CACHE_BACKEND': None,
+    # Snippets with this many lines or more are highlighted again from
+    # the lexer state before their edit, see snippets/incremental.py.
+    'INCREMENTAL_MIN_LINES': 500,
+    # Size bound of the in-process cache of lexer states, in characters of
+    # code and HTML.
+    'INCREMENTAL_CACHE_MAX_SIZE': 32 * 1024 * 1024,
+    # Django cache alias holding assembled script sources.
+    'SCRIPT_SOURCE_CACHE': 'default',
+    'SCRIPT_SOURCE_CACHE_TIMEOUT': 24 * 60 * 60,
+    # Scripts with more characters of code than this are streamed instead
+    # of being assembled in memory and cached.
+    'SCRIPT_SOURCE_STREAM_THRESHOLD': 1024 * 1024,
+    # Items validated, rendered and written per transaction by /bulk/.
+    'BULK_BATCH_SIZE': 500,
+    'BULK_MAX_ITEMS': 10000,
+    # Django cache alias of serialized list and detail responses, or None,
+    # and of the scope tokens invalidating them, None for the same cache.
+    # The token cache must be shared by every process, the responses may
+    # be kept per process.
+    'RESPONSE_CACHE': None,
+    'RESPONSE_TOKEN_CACHE': None,
+    'RESPONSE_CACHE_TIMEOUT': 5 * 60,
+    # zlib level of compressed blobs, from 1 (fastest) to 9 (smallest).
+    'BLOB_COMPRESSION_LEVEL': 6,
+    # Database aliases of read replicas, see snippets/replicas.py.
+    'READ_REPLICAS': [],
+    # Seconds a user's reads go to the primary after they wrote, longer
+    # than the replication lag. Pins are kept in the REPLICA_PIN_CACHE,
+    # which must be shared by the web processes.
+    'REPLICA_PIN_SECONDS': 5,
+    'REPLICA_PIN_CACHE': 'default',
+    # Seconds an unavailable replica is skipped.
+    'REPLICA_RETRY_AFTER': 30,
+    # Share of requests whose time is broken down into SQL, rendering and
+    # serialization. Totals are recorded for every request.
+    'METRICS_SAMPLE_RATE': 0.1,
+    'METRICS_SERVER_TIMING': True,
+    # Client addresses allowed to read /metrics.
+    'METRICS_ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'SNIPPETS', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,78 @@
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from snippets import compression
+
+
+class StoredValue(bytes):
+    """Compressed value loaded from the database"""
+
+
+class DecompressingAttribute(DeferredAttribute):
+    """Decompress the stored value the first time it's read.
+
+    Defining ``__set__`` makes this a data descriptor, consulted even when
+    the value is in the instance ``__dict__``.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, StoredValue):
+            value = compression.decompress(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """Text stored compressed, see ``snippets.compression``.
+
+    Loaded instances keep the compressed bytes until the attribute is
+    read, so querysets that don't use the text never decompress it.
+    Assigned text is compressed when saved, assigned bytes are stored
+    as they are.
+    ``values()`` querysets return the stored bytes; pass them to
+    ``compression.decompress``. The column can't be used in lookups on
+    the text.
+    """
+    descriptor_class = DecompressingAttribute
+
+    def __init__(self, *args, dictionary=None, **kwargs):
+        self.dictionary = dictionary
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dictionary is not None:
+            kwargs['dictionary'] = self.dictionary
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        # Django keeps the descriptor of a field this one overrides.
+        setattr(cls, self.attname, self.descriptor_class(self))
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if isinstance(value, str):
+            value = compression.compress(value, self.dictionary)
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        # Rows written as text before the column was compressed come back
+        # as ``str`` on SQLite.
+        if isinstance(value, (bytes, memoryview)):
+            value = StoredValue(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return compression.decompress(value)
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
@@ -0,0 +1,95 @@
+"""
+Rendering of highlighted HTML for snippets.
+
+This module only depends on Pygments and the lexer registry so the render
+functions can be shipped to worker processes.
+"""
+import functools
+import hashlib
+
+import pygments
+
+from snippets.registry import get_lexer
+
+
+def render(code, language, style, linenos, title, full=True):
+    """Return the highlighted HTML for the given inputs.
+
+    With ``full`` the result is a standalone HTML document embedding the
+    style's stylesheet, otherwise only the highlighted ``<div>`` fragment.
+    """
+    from pygments import highlight
+    from pygments.formatters.html import HtmlFormatter
+
+    lexer = get_lexer(language)
+    formatter = HtmlFormatter(**get_formatter_options(style, linenos, title,
+                                                      full))
+    return highlight(code, lexer, formatter)
+
+
+def get_formatter_options(style, linenos, title, full):
+    options = {'title': title} if title else {}
+    return dict(options, style=style, linenos='table' if linenos else False,
+                full=full)
+
+
+def render_incremental(code, language, style, linenos, title, full=True,
+                       previous=None):
+    """Return the HTML of ``render`` and the line state to pass as
+    ``previous`` once the code is edited, so only the edited lines are
+    lexed again; see ``snippets.incremental``"""
+    from snippets import incremental
+
+    return incremental.render(code, language, style, linenos, title,
+                              full=full, previous=previous)
+
+
+def render_plain(code, language, style, linenos, title, full=True):
+    """Return ``code`` escaped as plain text in the markup of ``render``,
+    for code that can't be highlighted"""
+    return render(code, 'text', style, linenos, title, full=full)
+
+
+def render_key(code, language, style, linenos, title, full=True):
+    """Return a content hash identifying the output of ``render``"""
+    digest = hashlib.sha256()
+    for part in (pygments.__version__, language, style, str(bool(linenos)),
+                 str(bool(full)), title, code):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def get_document_parts(style, title):
+    """Return the header and footer ``render`` wraps full documents in"""
+    from pygments.formatters.html import (DOC_FOOTER, DOC_HEADER,
+                                          HtmlFormatter)
+
+    options = {'title': title} if title else {}
+    formatter = HtmlFormatter(style=style, full=True, **options)
+    header = DOC_HEADER % dict(title=formatter.title,
+                               styledefs=formatter.get_style_defs('body'),
+                               encoding=formatter.encoding)
+    return header, DOC_FOOTER
+
+
+def to_document(fragment, style, title):
+    """Wrap a fragment into the document ``render(full=True)`` returns"""
+    header, footer = get_document_parts(style, title)
+    return header + fragment + footer
+
+
+def to_fragment(document, style, title):
+    """Strip the document wrapping, or return None if it doesn't match"""
+    header, footer = get_document_parts(style, title)
+    if document.startswith(header) and document.endswith(footer):
+        return document[len(header):len(document) - len(footer)]
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_stylesheet(style):
+    """Return the CSS rules for fragments rendered with ``style``"""
+    from pygments.formatters.html import HtmlFormatter
+
+    return HtmlFormatter(style=style).get_style_defs('.highlight') + '\n'
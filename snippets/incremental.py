@@ -0,0 +1,715 @@
+"""
+Incremental highlighting of edited code.
+
+``render`` returns the HTML of ``highlighting.render`` along with a
+``LineState``: the HTML of every line, and checkpoints holding the lexer
+state at the line starts where lexing can resume. Given the state of the
+previous version of the code, lexing resumes at the nearest safe
+checkpoint before the first edited line, and stops at the first line
+after the edit where the state matches the previous one again. The HTML
+of the other lines is reused.
+
+Pygments tries the rules of the current state one after the other, and a
+rule's regular expression may read further than what it matches. A
+checkpoint is safe when no rule tried before it read the edited lines:
+
+- rules whose first character doesn't match read no further;
+- rules that can match a bounded number of line ends, or of bounded
+  width, read at most to the end of that many more lines, or that many
+  characters;
+- rules matching a run of characters read one character past it;
+- other rules, such as those matching a whole multi-line string, are
+  recorded and tried again on the edited code, which must give the same
+  match.
+
+Lexing stops only where rules looking behind their position can't see
+the edit either. Only ``RegexLexer`` subclasses lexing with the standard
+loop, without callbacks of their own, can be resumed; see ``supports``.
+Like ``highlighting``, this module only depends on Pygments.
+"""
+import functools
+import re
+from array import array
+from bisect import bisect_left
+from io import StringIO
+from itertools import accumulate
+
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexer import Lexer, RegexLexer
+from pygments.token import Error, Text, _TokenType
+
+from snippets.registry import get_lexer, get_lexer_class
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+# How far a rule may read past the position it is tried at: to the end of
+# a number of lines, a number of characters, one character past a run of
+# characters, or anywhere.
+LINE = 0
+BOUNDED = 1
+RUN = 2
+REPLAY = 3
+
+NEWLINE = ord('\n')
+CONTAINERS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+              sre_constants.SUBPATTERN, sre_constants.BRANCH,
+              sre_constants.ASSERT, sre_constants.ASSERT_NOT,
+              sre_constants.GROUPREF_EXISTS,
+              # Python 3.11+
+              getattr(sre_constants, 'POSSESSIVE_REPEAT', None),
+              getattr(sre_constants, 'ATOMIC_GROUP', None)}
+REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+           getattr(sre_constants, 'POSSESSIVE_REPEAT', None)}
+CHARACTERS = {sre_constants.LITERAL, sre_constants.NOT_LITERAL,
+              sre_constants.IN, sre_constants.ANY}
+CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: r'\d',
+    sre_constants.CATEGORY_NOT_DIGIT: r'\D',
+    sre_constants.CATEGORY_SPACE: r'\s',
+    sre_constants.CATEGORY_NOT_SPACE: r'\S',
+    sre_constants.CATEGORY_WORD: r'\w',
+    sre_constants.CATEGORY_NOT_WORD: r'\W',
+}
+# Flags changing which characters a character class matches.
+CLASS_FLAGS = (sre_constants.SRE_FLAG_IGNORECASE |
+               sre_constants.SRE_FLAG_DOTALL | sre_constants.SRE_FLAG_ASCII)
+
+
+class Unsupported(Exception):
+    """The lexer can't resume from a checkpoint"""
+
+
+def iter_items(items):
+    """Yield the ``(op, av)`` items of a parsed pattern, nested ones
+    included"""
+    for op, av in items:
+        yield op, av
+        if op not in CONTAINERS:
+            continue
+        if op is sre_constants.BRANCH:
+            children = av[1]
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            children = [av[1]]
+        elif op is sre_constants.GROUPREF_EXISTS:
+            children = [av[1], av[2]]
+        elif isinstance(av, tuple):
+            children = [av[-1]]
+        else:
+            children = [av]
+        for child in children:
+            if child is not None:
+                yield from iter_items(child)
+
+
+def set_matches_newline(items):
+    """Whether the ``IN`` set ``items`` matches a line end"""
+    negate = matched = False
+    for op, av in items:
+        if op is sre_constants.NEGATE:
+            negate = True
+        elif op is sre_constants.LITERAL:
+            matched = matched or av == NEWLINE
+        elif op is sre_constants.RANGE:
+            matched = matched or av[0] <= NEWLINE <= av[1]
+        elif op is sre_constants.CATEGORY:
+            name = str(av)
+            matched = matched or (
+                ('SPACE' in name or 'LINEBREAK' in name) != ('NOT' in name))
+        else:
+            return True
+    return matched != negate
+
+
+def matches_newline(items, dotall):
+    for op, av in iter_items(items):
+        if op in CONTAINERS or op is sre_constants.AT:
+            continue
+        if op is sre_constants.LITERAL:
+            if av == NEWLINE:
+                return True
+        elif op is sre_constants.NOT_LITERAL:
+            if av != NEWLINE:
+                return True
+        elif op is sre_constants.ANY:
+            if dotall:
+                return True
+        elif op is sre_constants.IN:
+            if set_matches_newline(av):
+                return True
+        else:
+            return True
+    return False
+
+
+def count_newlines(items, dotall):
+    """Return how many line ends the parsed pattern ``items`` reads at
+    most, lookaheads included, or None if there's no bound"""
+    total = 0
+    for op, av in items:
+        if op is sre_constants.AT:
+            continue
+        if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            # Lookbehinds only read before the position.
+            count = count_newlines(av[1], dotall) if av[0] >= 0 else 0
+        elif op is sre_constants.SUBPATTERN:
+            count = count_newlines(av[-1], dotall)
+        elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+            count = count_newlines(av, dotall)
+        elif op in (sre_constants.BRANCH, sre_constants.GROUPREF_EXISTS):
+            branches = av[1] if op is sre_constants.BRANCH else av[1:]
+            counts = [count_newlines(branch, dotall) if branch else 0
+                      for branch in branches]
+            count = None if None in counts else max(counts)
+        elif op in REPEATS:
+            count = count_newlines(av[2], dotall)
+            if count and av[1] >= sre_constants.MAXREPEAT:
+                return None
+            count = count and count * av[1]
+        elif op in CHARACTERS:
+            count = int(matches_newline([(op, av)], dotall))
+        else:
+            return None
+        if count is None:
+            return None
+        total += count
+    return total
+
+
+def get_lookahead(items):
+    """Return how many characters past a match ``items`` may read"""
+    width = 0
+    for op, av in iter_items(items):
+        if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if av[0] >= 0:
+                width += av[1].getwidth()[1]
+        elif op is sre_constants.AT:
+            # Assertions at the end of a match read one more character.
+            width += 1
+    return width
+
+
+def get_lookbehind(pattern):
+    """Return how many characters before the position ``pattern`` reads"""
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    return max([av[1].getwidth()[1] for op, av in iter_items(parsed)
+                if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT) and
+                av[0] < 0] or [0])
+
+
+def escape_character(code):
+    return '\\U{:08x}'.format(code)
+
+
+def get_character_pattern(op, av):
+    """Return a pattern matching the character the item ``(op, av)``
+    matches, or None"""
+    if op is sre_constants.LITERAL:
+        return escape_character(av)
+    if op is sre_constants.NOT_LITERAL:
+        return '[^{}]'.format(escape_character(av))
+    if op is sre_constants.ANY:
+        return '.'
+    if op is not sre_constants.IN:
+        return None
+    parts = []
+    for item_op, item_av in av:
+        if item_op is sre_constants.NEGATE:
+            parts.append('^')
+        elif item_op is sre_constants.LITERAL:
+            parts.append(escape_character(item_av))
+        elif item_op is sre_constants.RANGE:
+            parts.append('{}-{}'.format(*map(escape_character, item_av)))
+        elif item_av in CATEGORIES:
+            parts.append(CATEGORIES[item_av])
+        else:
+            return None
+    return '[{}]'.format(''.join(parts))
+
+
+def collect_first_patterns(items):
+    """Return patterns matching the characters a match of ``items`` may
+    start with, or None, and whether it may be empty"""
+    patterns = []
+    for op, av in items:
+        if op is sre_constants.AT:
+            continue
+        if op in CHARACTERS:
+            pattern = get_character_pattern(op, av)
+            return (None if pattern is None else patterns + [pattern]), False
+        if op is sre_constants.SUBPATTERN:
+            if av[1] or av[2]:
+                # Flags of their own.
+                return None, False
+            branches = [av[-1]]
+        elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+            branches = [av]
+        elif op in REPEATS:
+            branches = [av[2]]
+        elif op is sre_constants.BRANCH:
+            branches = av[1]
+        else:
+            return None, False
+        empty = op in REPEATS and not av[0]
+        for branch in branches:
+            branch_patterns, branch_empty = collect_first_patterns(branch)
+            if branch_patterns is None:
+                return None, False
+            patterns += branch_patterns
+            empty = empty or branch_empty
+        if not empty:
+            return patterns, False
+    return patterns, True
+
+
+def get_first_patterns(items):
+    """Return patterns matching the characters a match of ``items`` starts
+    with, or None"""
+    patterns, empty = collect_first_patterns(items)
+    return None if empty else patterns
+
+
+def is_run(items):
+    """Whether ``items`` matches a greedy run of characters, reading one
+    character past it, or only the first one if it fails"""
+    while (len(items) == 1 and items[0][0] is sre_constants.SUBPATTERN and
+           not (items[0][1][1] or items[0][1][2])):
+        items = items[0][1][-1]
+    if len(items) != 1 or items[0][0] not in REPEATS:
+        return False
+    op, (low, high, body) = items[0]
+    return (op is not sre_constants.MIN_REPEAT and low <= 1 and
+            high >= sre_constants.MAXREPEAT and len(body) == 1 and
+            body[0][0] in CHARACTERS)
+
+
+def analyse_pattern(pattern):
+    """Return ``(reach, width, first, anchored)`` for a compiled rule
+    pattern. ``width`` is the number of characters or more lines it reads.
+    ``first`` matches the characters a match may start with, and
+    ``anchored`` is whether matches start at line starts (True) or at the
+    start of the text (False)."""
+    flags = pattern.flags
+    parsed = sre_parse.parse(pattern.pattern, flags)
+    items = list(iter_items(parsed))
+    dotall_flag = sre_constants.SRE_FLAG_DOTALL
+    dotall = bool(flags & dotall_flag) or any(
+        op is sre_constants.SUBPATTERN and av[1] & dotall_flag
+        for op, av in items)
+
+    first = anchored = None
+    patterns = get_first_patterns(parsed)
+    if patterns is not None:
+        first = re.compile('|'.join(patterns), flags & CLASS_FLAGS).match
+    if len(parsed):
+        op, av = parsed[0]
+        if op is sre_constants.AT and av is sre_constants.AT_BEGINNING:
+            anchored = bool(flags & sre_constants.SRE_FLAG_MULTILINE)
+        elif (op is sre_constants.AT and
+              av is sre_constants.AT_BEGINNING_STRING):
+            anchored = False
+
+    lines = count_newlines(parsed, dotall)
+    if lines == 0:
+        return LINE, 0, first, anchored
+    width = parsed.getwidth()[1] + get_lookahead(parsed)
+    if width < sre_constants.MAXREPEAT:
+        return BOUNDED, width, first, anchored
+    if lines is not None:
+        return LINE, lines, first, anchored
+    if is_run(parsed):
+        return RUN, 0, first, anchored
+    return REPLAY, 0, first, anchored
+
+
+def check_action(action):
+    """Raise ``Unsupported`` unless ``action`` only depends on its match"""
+    if action is None or type(action) is _TokenType:
+        return
+    if getattr(action, '__module__', None) != 'pygments.lexer':
+        raise Unsupported('callback {!r}'.format(action))
+    name = action.__qualname__
+    if name.startswith('bygroups.'):
+        cells = dict(zip(action.__code__.co_freevars, action.__closure__))
+        for group_action in cells['args'].cell_contents:
+            check_action(group_action)
+    elif not name.startswith('using.'):
+        raise Unsupported('callback {!r}'.format(action))
+
+
+@functools.lru_cache(maxsize=None)
+def get_rules(language):
+    """Return the rules of each state of the lexer of ``language``, as
+    ``(match, action, new_state, reach, width, first, anchored, number)``,
+    the match functions of the rules by number, and how far before their
+    position they read"""
+    lexer_class = get_lexer_class(language)
+    if not (issubclass(lexer_class, RegexLexer) and
+            lexer_class.get_tokens_unprocessed is
+            RegexLexer.get_tokens_unprocessed and
+            lexer_class.get_tokens is Lexer.get_tokens):
+        raise Unsupported(lexer_class.__name__)
+    lexer = get_lexer(language)
+    if lexer.filters:
+        raise Unsupported('filters')
+    rules = {}
+    matches = []
+    lookbehind = 0
+    for state, tokens in lexer._tokens.items():
+        rules[state] = []
+        for match, action, new_state in tokens:
+            check_action(action)
+            rules[state].append((match, action, new_state) +
+                                analyse_pattern(match.__self__) +
+                                (len(matches),))
+            matches.append(match)
+            lookbehind = max(lookbehind, get_lookbehind(match.__self__))
+    return rules, matches, lookbehind
+
+
+def supports(language):
+    """Whether code in ``language`` can be highlighted incrementally"""
+    try:
+        get_rules(language)
+    except Unsupported:
+        return False
+    return True
+
+
+def preprocess(lexer, code):
+    """Return the text ``Lexer.get_tokens`` lexes for ``code``"""
+    if code.startswith('\ufeff'):
+        code = code[1:]
+    text = code.replace('\r\n', '\n').replace('\r', '\n')
+    if lexer.stripall:
+        text = text.strip()
+    elif lexer.stripnl:
+        text = text.strip('\n')
+    if lexer.tabsize > 0:
+        text = text.expandtabs(lexer.tabsize)
+    if lexer.ensurenl and not text.endswith('\n'):
+        text += '\n'
+    return text
+
+
+def split_lines(text):
+    return [line + '\n' for line in text.split('\n')[:-1]]
+
+
+def find_line_end(text, pos):
+    line_end = text.find('\n', pos)
+    return len(text) if line_end < 0 else line_end
+
+
+class LineState:
+    """Lines of lexed code with their HTML, and what lexing them again
+    needs.
+
+    ``checkpoints`` maps line numbers to the lexer's state stack at the
+    line start and to how far the rules tried before it read, as
+    ``(stack, reach)``. ``replays`` are the rules tried that may have
+    read further.
+    """
+
+    def __init__(self, lines, html, checkpoints, replays):
+        self.lines = lines
+        self.html = html
+        self.checkpoints = checkpoints
+        self.replays = replays
+        self.size = sum(map(len, lines)) + sum(map(len, html))
+
+    def __len__(self):
+        # Size in characters, for caches bounded like the render cache.
+        return self.size
+
+
+class Replays:
+    """Positions and numbers of rules tried, with the spans of their match
+    and its groups relative to the position, or None.
+
+    Positions and numbers are kept in arrays, which are quick to pickle.
+    """
+
+    def __init__(self, positions=(), numbers=(), spans=()):
+        self.positions = array('q', positions)
+        self.numbers = array('l', numbers)
+        self.spans = list(spans)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return zip(self.positions, self.numbers, self.spans)
+
+    def append(self, pos, number, spans):
+        self.positions.append(pos)
+        self.numbers.append(number)
+        self.spans.append(spans)
+
+    def extend(self, replays):
+        self.positions.extend(replays.positions)
+        self.numbers.extend(replays.numbers)
+        self.spans.extend(replays.spans)
+
+    def find(self, pos):
+        """Return the index of the first replay at ``pos`` or after"""
+        return bisect_left(self.positions, pos)
+
+    def slice(self, start=0, stop=None, offset=0):
+        """Return the replays from ``start`` to ``stop``, moved by
+        ``offset``"""
+        positions = self.positions[start:stop]
+        if offset:
+            positions = [pos + offset for pos in positions]
+        return Replays(positions, self.numbers[start:stop],
+                       self.spans[start:stop])
+
+
+def get_spans(match, pos):
+    return tuple([(start - pos, end - pos) if start >= 0 else None
+                  for start, end in match.regs])
+
+
+class Lexing:
+    """Lexing of ``text`` resumed at a checkpoint"""
+
+    def __init__(self, lexer, rules, text):
+        self.lexer = lexer
+        self.rules = rules
+        self.text = text
+        self.tokens = []
+        self.checkpoints = {}
+        self.replays = Replays()
+        self.stacks = {}
+        self.spans = {}
+        self.reach = 0
+
+    def run(self, pos, line, stack, reach, stop=None):
+        """Lex from ``pos``, the start of ``line``, until ``stop(line,
+        stack)`` is true at a checkpoint or the text ends. Return the line
+        lexing stopped at."""
+        lexer = self.lexer
+        text = self.text
+        rules = self.rules
+        tokens = self.tokens
+        replays = self.replays
+        checkpoints = self.checkpoints
+        stacks = self.stacks
+        spans = self.spans
+        statestack = list(stack)
+        statetokens = rules[statestack[-1]]
+        checkpoints[line] = (stack, reach)
+        line_end = find_line_end(text, pos)
+        while True:
+            for rule in statetokens:
+                (rexmatch, action, new_state, kind, width, first,
+                 anchored, number) = rule
+                # Rules whose first character or anchor doesn't match
+                # read no further.
+                if first is not None and not first(text, pos):
+                    continue
+                if anchored is not None and pos and not (
+                        anchored and text[pos - 1] == '\n'):
+                    continue
+                m = rexmatch(text, pos)
+                if kind == LINE:
+                    if width:
+                        end = line_end
+                        for _ in range(width):
+                            end = find_line_end(text, end + 1)
+                        reach = max(reach, end + 1)
+                elif kind == BOUNDED:
+                    reach = max(reach, pos + width)
+                elif kind == RUN:
+                    reach = max(reach, (m.end() if m else pos) + 1)
+                elif m:
+                    match_spans = get_spans(m, pos)
+                    replays.append(pos, number,
+                                   spans.setdefault(match_spans, match_spans))
+                else:
+                    replays.append(pos, number, None)
+                if m:
+                    if action is not None:
+                        if type(action) is _TokenType:
+                            tokens.append((action, m.group()))
+                        else:
+                            tokens.extend((ttype, value) for _, ttype, value
+                                          in action(lexer, m))
+                    pos = m.end()
+                    if new_state is not None:
+                        if isinstance(new_state, tuple):
+                            for state in new_state:
+                                if state == '#pop':
+                                    if len(statestack) > 1:
+                                        statestack.pop()
+                                elif state == '#push':
+                                    statestack.append(statestack[-1])
+                                else:
+                                    statestack.append(state)
+                        elif isinstance(new_state, int):
+                            if abs(new_state) >= len(statestack):
+                                del statestack[1:]
+                            else:
+                                del statestack[new_state:]
+                        elif new_state == '#push':
+                            statestack.append(statestack[-1])
+                        else:
+                            assert False, 'wrong state def: %r' % new_state
+                        statetokens = rules[statestack[-1]]
+                    break
+            else:
+                if pos >= len(text):
+                    self.reach = reach
+                    return line
+                if text[pos] == '\n':
+                    statestack = ['root']
+                    statetokens = rules['root']
+                    tokens.append((Text, '\n'))
+                else:
+                    tokens.append((Error, text[pos]))
+                pos += 1
+            if pos > line_end:
+                line += text.count('\n', line_end, pos)
+                line_end = find_line_end(text, pos)
+                if text[pos - 1] == '\n':
+                    stack = tuple(statestack)
+                    # Checkpoints share their stacks, pickled once.
+                    stack = stacks.setdefault(stack, stack)
+                    if stop is not None and stop(line, stack):
+                        self.reach = reach
+                        return line
+                    checkpoints[line] = (stack, reach)
+
+    def format_lines(self):
+        return [line for _, line in
+                get_line_formatter()._format_lines(self.tokens)]
+
+
+@functools.lru_cache(maxsize=None)
+def get_line_formatter():
+    """Formatter of the lines, which don't depend on the style"""
+    return HtmlFormatter()
+
+
+class LinesFormatter(HtmlFormatter):
+    """``HtmlFormatter`` wrapping lines it already formatted"""
+
+    def __init__(self, lines, **options):
+        super().__init__(**options)
+        self.lines = lines
+
+    def _format_lines(self, tokensource):
+        for line in self.lines:
+            yield 1, line
+
+
+def format_document(html, options):
+    output = StringIO()
+    LinesFormatter(html, **options).format(iter(()), output)
+    return output.getvalue()
+
+
+def find_resume_line(previous, lines):
+    """Return the first line that changed since ``previous`` and the
+    number of unchanged lines at the end"""
+    old = previous.lines
+    common = min(len(old), len(lines))
+    first = 0
+    while first < common and old[first] == lines[first]:
+        first += 1
+    last = 0
+    while (last < common - first and
+           old[len(old) - 1 - last] == lines[len(lines) - 1 - last]):
+        last += 1
+    return first, last
+
+
+def are_replays_valid(matches, text, replays):
+    """Whether the rules of ``replays`` still match the same in ``text``"""
+    for pos, number, spans in replays:
+        m = matches[number](text, pos)
+        if m is None:
+            if spans is not None:
+                return False
+        elif (spans is None or m.end() - pos != spans[0][1] or
+              get_spans(m, pos) != spans):
+            return False
+    return True
+
+
+def render_lines(language, code, previous=None):
+    """Return the ``LineState`` of ``code``, lexing only its edited lines
+    if the ``LineState`` of the ``previous`` code is given"""
+    rules, matches, lookbehind = get_rules(language)
+    lexer = get_lexer(language)
+    text = preprocess(lexer, code)
+    lines = split_lines(text)
+    offsets = [0] + list(accumulate(map(len, lines)))
+    lexing = Lexing(lexer, rules, text)
+    if previous is None:
+        lexing.run(0, 0, ('root',), 0)
+        return LineState(lines, lexing.format_lines(), lexing.checkpoints,
+                         lexing.replays)
+
+    first, last = find_resume_line(previous, lines)
+    if first == len(lines) == len(previous.lines):
+        return previous
+    # Resume at the last checkpoint before the edit that nothing before
+    # read past, if the rules to try again still match the same.
+    edit = offsets[first]
+    start = max(line for line, (_, reach) in previous.checkpoints.items()
+                if line <= first and reach <= edit)
+    replays = previous.replays.slice(
+        stop=previous.replays.find(offsets[start]))
+    if not are_replays_valid(matches, text, replays):
+        start = 0
+        replays = Replays()
+
+    shift = len(lines) - len(previous.lines)
+    unchanged = len(lines) - last
+
+    def converges(line, stack):
+        # Rules looking behind must only see unchanged characters, the
+        # line end before the line is the same.
+        if (line < unchanged or
+                offsets[line] - offsets[unchanged] < lookbehind - 1):
+            return False
+        checkpoint = previous.checkpoints.get(line - shift)
+        return checkpoint is not None and checkpoint[0] == stack
+
+    stack, reach = previous.checkpoints[start]
+    end = lexing.run(offsets[start], start, stack, reach, stop=converges)
+    html = previous.html[:start] + lexing.format_lines()
+    checkpoints = {line: checkpoint for line, checkpoint
+                   in previous.checkpoints.items() if line < start}
+    checkpoints.update(lexing.checkpoints)
+    replays.extend(lexing.replays)
+    if end < len(lines):
+        # The rest is lexed as before, moved by the edit.
+        old_end = end - shift
+        # Offset of the unchanged lines after the edit.
+        offset = offsets[-1] - sum(map(len, previous.lines))
+        reach = lexing.reach
+        html += previous.html[old_end:]
+        for line, (stack, old_reach) in previous.checkpoints.items():
+            if line >= old_end:
+                checkpoints[line + shift] = (stack,
+                                             max(reach, old_reach + offset))
+        replays.extend(previous.replays.slice(
+            previous.replays.find(offsets[end] - offset), offset=offset))
+    return LineState(lines, html, checkpoints, replays)
+
+
+def render(code, language, style, linenos, title, full=True,
+           previous=None):
+    """Return the HTML ``highlighting.render`` returns for the inputs and
+    the ``LineState`` of ``code``, reusing the lines of ``previous``"""
+    from snippets import highlighting
+
+    state = render_lines(language, code, previous)
+    options = highlighting.get_formatter_options(style, linenos, title,
+                                                 full)
+    return format_document(state.html, options), state
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from snippets import compression
+from snippets.models import HighlightBlob
+
+
+class Command(BaseCommand):
+    help = ('Build a preset compression dictionary from a sample of the '
+            'stored highlights. Register new dictionaries in '
+            'snippets.compression.DICTIONARIES under a new codec id.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Dictionary name, e.g. highlight-2.')
+        parser.add_argument('--samples', type=int, default=5000,
+                            help='Number of highlights to sample.')
+        parser.add_argument('--size', type=int,
+                            default=compression.MAX_DICTIONARY_SIZE,
+                            help='Dictionary size in bytes.')
+
+    def handle(self, *args, **options):
+        blobs = HighlightBlob.objects.order_by('?')[:options['samples']]
+        samples = [blob.content for blob in blobs.iterator()]
+        dictionary = compression.build_dictionary(samples, options['size'])
+        path = compression.get_dictionary_path(options['name'])
+        with open(path, 'wb') as dictionary_file:
+            dictionary_file.write(dictionary)
+        self.stdout.write('Wrote {} bytes from {} highlights to {}.'.format(
+            len(dictionary), len(samples), path))
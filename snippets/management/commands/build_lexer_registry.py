@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from snippets.registry import REGISTRY_PATH, write_registry
+
+
+class Command(BaseCommand):
+    help = ('Regenerate the precomputed registry of Pygments lexers and '
+            'styles for the installed Pygments version.')
+
+    def handle(self, *args, **options):
+        registry = write_registry()
+        self.stdout.write(
+            'Wrote {} languages and {} styles for Pygments {} to {}.'.format(
+                len(registry['languages']), len(registry['styles']),
+                registry['pygments_version'], REGISTRY_PATH))
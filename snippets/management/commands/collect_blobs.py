@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from snippets.models import CodeBlob, HighlightBlob
+
+
+class Command(BaseCommand):
+    help = ('Delete code and highlight blobs no snippet references. Blobs '
+            'are collected when snippets change or are deleted, this sweeps '
+            'the ones left behind, e.g. by queryset updates.')
+
+    def handle(self, *args, **options):
+        for blob_class in (CodeBlob, HighlightBlob):
+            count = blob_class.collect()
+            self.stdout.write('Deleted {} unreferenced {} rows.'.format(
+                count, blob_class._meta.verbose_name))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from snippets.workers import HighlightWorker
+
+
+class Command(BaseCommand):
+    help = 'Render highlighted HTML for snippets saved in deferred mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            help='Number of render processes.')
+        parser.add_argument('--retries', type=int,
+                            help='Attempts allowed after the first failure.')
+        parser.add_argument('--time-budget', type=float,
+                            help='Seconds allowed to render one snippet.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        worker = HighlightWorker(concurrency=options['concurrency'],
+                                 retries=options['retries'],
+                                 time_budget=options['time_budget'])
+        with worker:
+            if options['once']:
+                total = 0
+                while True:
+                    count = worker.run_once()
+                    if not count:
+                        break
+                    total += count
+                self.stdout.write(f'Processed {total} snippets.')
+            else:
+                self.stdout.write(
+                    f'Highlight workers started '
+                    f'(concurrency={worker.concurrency}).')
+                try:
+                    worker.run(poll_interval=options['poll_interval'])
+                except KeyboardInterrupt:
+                    pass
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from snippets import search
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the inverted search index. PostgreSQL keeps its '
+            'full-text indexes up to date and needs no rebuild.')
+
+    def handle(self, *args, **options):
+        if search.uses_postgres():
+            self.stdout.write('PostgreSQL indexes are maintained by the '
+                              'database, nothing to rebuild.')
+            return
+        count = search.rebuild_index()
+        self.stdout.write(f'Indexed {count} snippets.')
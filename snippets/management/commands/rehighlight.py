@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import dateparse
+
+from snippets.rehighlight import Checkpoint, Rehighlighter
+
+
+def parse_date(value):
+    try:
+        date = dateparse.parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise CommandError(f'Invalid date "{value}", expected YYYY-MM-DD.')
+    return date
+
+
+class Command(BaseCommand):
+    help = ('Re-render the stored highlights of existing snippets, e.g. '
+            'after upgrading Pygments.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--language', help='Only snippets in this '
+                                               'language.')
+        parser.add_argument('--style', help='Only snippets using this '
+                                            'style.')
+        parser.add_argument('--owner', help='Only snippets of this user.')
+        parser.add_argument('--since', help='Only snippets created on or '
+                                            'after this date (YYYY-MM-DD).')
+        parser.add_argument('--until', help='Only snippets created before '
+                                            'this date (YYYY-MM-DD).')
+        parser.add_argument('--fallbacks', action='store_true',
+                            help='Only snippets stored as plain text after '
+                                 'a render went over its time or memory '
+                                 'budget or crashed.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Snippets rendered and written at a time.')
+        parser.add_argument('--processes', type=int,
+                            help='Number of render processes, defaults to '
+                                 'the number of CPUs.')
+        parser.add_argument('--start-after', type=int, default=0,
+                            help='Skip snippets up to this id.')
+        parser.add_argument('--checkpoint',
+                            help='File recording the last processed id, '
+                                 'resumed from when it exists.')
+
+    def get_filters(self, options):
+        filters = {}
+        if options['language']:
+            filters['language'] = options['language']
+        if options['style']:
+            filters['style'] = options['style']
+        if options['owner']:
+            filters['owner__username'] = options['owner']
+        if options['fallbacks']:
+            filters['highlight_fallback'] = True
+        if options['since']:
+            filters['created__date__gte'] = str(
+                parse_date(options['since']))
+        if options['until']:
+            filters['created__date__lt'] = str(
+                parse_date(options['until']))
+        return filters
+
+    def handle(self, *args, **options):
+        filters = self.get_filters(options)
+        after_id = options['start_after']
+        checkpoint = None
+        if options['checkpoint']:
+            checkpoint = Checkpoint(options['checkpoint'], filters)
+            try:
+                after_id = max(after_id, checkpoint.load())
+            except ValueError as exc:
+                raise CommandError(exc)
+            if after_id:
+                self.stdout.write(f'Resuming after snippet {after_id}.')
+
+        updated = skipped = failed = 0
+        seconds = 0.0
+        rehighlighter = Rehighlighter(filters=filters,
+                                      chunk_size=options['chunk_size'],
+                                      processes=options['processes'])
+        with rehighlighter:
+            for chunk in rehighlighter.run(after_id, checkpoint):
+                updated += chunk.updated
+                skipped += chunk.skipped
+                failed += len(chunk.failed)
+                seconds += chunk.seconds
+                for snippet_id, error in chunk.failed.items():
+                    self.stderr.write(
+                        f'Snippet {snippet_id} failed: {error}')
+                self.stdout.write(
+                    f'Up to snippet {chunk.last_id}: {chunk.count} rows in '
+                    f'{chunk.seconds:.2f}s '
+                    f'({chunk.count / chunk.seconds:.0f} rows/s)')
+
+        total = updated + skipped + failed
+        rate = total / seconds if seconds else 0
+        self.stdout.write(
+            f'Re-rendered {updated} snippets, skipped {skipped} changed '
+            f'meanwhile, {failed} failed ({rate:.0f} rows/s).')
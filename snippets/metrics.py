@@ -0,0 +1,307 @@
+"""
+Per-request performance metrics.
+
+``MetricsMiddleware`` times every request and records its status and
+response size. For a sample of requests (``METRICS_SAMPLE_RATE``) it
+also breaks the time down into phases: SQL queries, highlight rendering
+and serialization, measured by the ``timer`` hooks placed in the code.
+Both come out as a ``Server-Timing`` header and as Prometheus metrics
+served by the ``metrics`` view.
+
+Metrics are kept in memory per process; with several worker processes
+each one exposes its own counters. Under ASGI only the queries run
+through ``snippets.asynchronous.database`` are timed.
+"""
+import asyncio
+import bisect
+import contextlib
+import random
+import threading
+import time
+
+from asgiref.local import Local
+from django.db import connections
+
+from snippets.conf import get_setting
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                    10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+PHASES = ('db', 'render', 'serialize')
+
+# Follows the request into the threads of sync_to_async.
+_local = Local()
+
+
+class RequestMetrics:
+    """Phase timings of the current request"""
+
+    def __init__(self):
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.active = set()
+
+
+def current():
+    """Return the metrics of the current request if it's sampled"""
+    return getattr(_local, 'request', None)
+
+
+@contextlib.contextmanager
+def timer(phase):
+    """Add the time spent in the block to ``phase`` of the current request.
+
+    Nested timers of the same phase are only counted once.
+    """
+    metrics = current()
+    if metrics is None or phase in metrics.active:
+        yield
+        return
+    metrics.active.add(phase)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.durations[phase] += time.perf_counter() - start
+        metrics.active.discard(phase)
+
+
+class TimedSerializerMixin:
+    """Count ``to_representation`` as serialization time"""
+
+    def to_representation(self, instance):
+        with timer('serialize'):
+            return super().to_representation(instance)
+
+
+def query_timer(execute, sql, params, many, context):
+    metrics = current()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.durations['db'] += time.perf_counter() - start
+        metrics.queries += 1
+
+
+@contextlib.contextmanager
+def query_timing():
+    """Time the queries run by this thread in the block if the current
+    request is sampled"""
+    with contextlib.ExitStack() as stack:
+        if current() is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(query_timer))
+        yield
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        for label_values, value in sorted(self.values.items()):
+            labels = format_labels(self.labels, label_values)
+            yield f'{self.name}{labels} {value}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # Per label values: count per bucket, with +Inf last, and the sum.
+        self.values = {}
+
+    def observe(self, label_values, value):
+        counts, total = self.values.get(
+            label_values, ([0] * (len(self.buckets) + 1), 0))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.values[label_values] = (counts, total + value)
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        for label_values, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = format_labels(self.labels + ('le',),
+                                       label_values + (bound,))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+def format_labels(names, values):
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+        for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+class Registry:
+    """Request metrics of this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter(
+            'snippets_requests_total', 'Requests handled.',
+            ('view', 'method', 'status'))
+        self.duration = Histogram(
+            'snippets_request_duration_seconds', 'Request duration.',
+            ('view',), DURATION_BUCKETS)
+        self.response_size = Histogram(
+            'snippets_response_size_bytes', 'Response body size.',
+            ('view',), SIZE_BUCKETS)
+        self.sampled = Counter(
+            'snippets_sampled_requests_total',
+            'Requests with a phase breakdown.', ('view',))
+        self.phase_seconds = Counter(
+            'snippets_request_phase_seconds_total',
+            'Time spent per phase in sampled requests.', ('view', 'phase'))
+        self.queries = Counter(
+            'snippets_db_queries_total',
+            'SQL queries run by sampled requests.', ('view',))
+        self.render_duration = Histogram(
+            'snippets_render_duration_seconds',
+            'Highlight render time per lexer.', ('language',),
+            DURATION_BUCKETS)
+        self.render_budget_exceeded = Counter(
+            'snippets_render_budget_exceeded_total',
+            'Renders over a budget, rendered as plain text.',
+            ('language', 'reason'))
+        self.rejected = Counter(
+            'snippets_rejected_requests_total',
+            'Requests rejected with 429, by throttle scope or the render '
+            'admission limit.', ('reason',))
+
+    def record(self, view, method, status, duration, size, breakdown=None):
+        with self.lock:
+            self.requests.inc((view, method, str(status)))
+            self.duration.observe((view,), duration)
+            if size is not None:
+                self.response_size.observe((view,), size)
+            if breakdown is not None:
+                self.sampled.inc((view,))
+                self.queries.inc((view,), breakdown.queries)
+                for phase, seconds in breakdown.durations.items():
+                    self.phase_seconds.inc((view, phase), seconds)
+
+    def record_render(self, language, seconds):
+        with self.lock:
+            self.render_duration.observe((language,), seconds)
+
+    def record_render_budget_exceeded(self, language, reason):
+        with self.lock:
+            self.render_budget_exceeded.inc((language, reason))
+
+    def record_rejected(self, reason):
+        with self.lock:
+            self.rejected.inc((reason,))
+
+    def export(self):
+        """Return the metrics in the Prometheus text format"""
+        with self.lock:
+            lines = [line
+                     for metric in (self.requests, self.duration,
+                                    self.response_size, self.sampled,
+                                    self.phase_seconds, self.queries,
+                                    self.render_duration,
+                                    self.render_budget_exceeded,
+                                    self.rejected)
+                     for line in metric.collect()]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+def get_response_size(response):
+    if response.streaming:
+        size = response.get('Content-Length')
+        return int(size) if size else None
+    return len(response.content)
+
+
+def server_timing(total, breakdown=None):
+    entries = []
+    if breakdown is not None:
+        for phase in PHASES:
+            entry = f'{phase};dur={breakdown.durations[phase] * 1000:.2f}'
+            if phase == 'db':
+                entry += f';desc="{breakdown.queries} queries"'
+            entries.append(entry)
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class MetricsMiddleware:
+    """Record request metrics and report them in ``Server-Timing``"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets Django call this middleware as a coroutine function.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        breakdown = self.start()
+        start = time.perf_counter()
+        try:
+            with query_timing():
+                response = self.get_response(request)
+        finally:
+            self.stop(breakdown)
+        return self.finish(request, response, time.perf_counter() - start,
+                           breakdown)
+
+    async def __acall__(self, request):
+        breakdown = self.start()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(breakdown)
+        return self.finish(request, response, time.perf_counter() - start,
+                           breakdown)
+
+    def start(self):
+        """Return the breakdown of a sampled request, or None"""
+        if random.random() >= get_setting('METRICS_SAMPLE_RATE'):
+            return None
+        breakdown = _local.request = RequestMetrics()
+        return breakdown
+
+    def stop(self, breakdown):
+        if breakdown is not None:
+            del _local.request
+
+    def finish(self, request, response, total, breakdown):
+        registry.record(get_view_name(request), request.method,
+                        response.status_code, total,
+                        get_response_size(response), breakdown)
+        if get_setting('METRICS_SERVER_TIMING'):
+            response['Server-Timing'] = server_timing(total, breakdown)
+        return response
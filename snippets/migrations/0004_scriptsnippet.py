@@ -0,0 +1,67 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def csv_to_entries(apps, schema_editor):
+    Script = apps.get_model('snippets', 'Script')
+    Snippet = apps.get_model('snippets', 'Snippet')
+    ScriptSnippet = apps.get_model('snippets', 'ScriptSnippet')
+    existing_ids = set(Snippet.objects.values_list('id', flat=True))
+    entries = []
+    for script in Script.objects.iterator():
+        id_list = [int(s_id.strip())
+                   for s_id in script.snippets.split(',')
+                   if s_id.strip().isdigit()]
+        id_list = [s_id for s_id in id_list if s_id in existing_ids]
+        entries.extend(
+            ScriptSnippet(script_id=script.id, snippet_id=s_id,
+                          position=position)
+            for position, s_id in enumerate(id_list))
+    ScriptSnippet.objects.bulk_create(entries, batch_size=500)
+
+
+def entries_to_csv(apps, schema_editor):
+    Script = apps.get_model('snippets', 'Script')
+    ScriptSnippet = apps.get_model('snippets', 'ScriptSnippet')
+    id_lists = {}
+    for script_id, snippet_id in (ScriptSnippet.objects
+                                  .order_by('script_id', 'position')
+                                  .values_list('script_id', 'snippet_id')):
+        id_lists.setdefault(script_id, []).append(str(snippet_id))
+    for script_id, id_list in id_lists.items():
+        Script.objects.filter(id=script_id).update(snippets=','.join(id_list))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0003_auto_20210815_0604'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScriptSnippet',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('script', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='snippets.script')),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='script_entries', to='snippets.snippet')),
+            ],
+            options={
+                'ordering': ['script', 'position'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scriptsnippet',
+            constraint=models.UniqueConstraint(fields=('script', 'position'), name='unique_script_position'),
+        ),
+        migrations.AddIndex(
+            model_name='scriptsnippet',
+            index=models.Index(fields=['snippet', 'script'], name='scriptsnippet_snippet_idx'),
+        ),
+        migrations.RunPython(csv_to_entries, entries_to_csv),
+        migrations.RemoveField(
+            model_name='script',
+            name='snippets',
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0004_scriptsnippet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='highlight_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='highlight_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='highlight_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('rendering', 'Rendering'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='ready', max_length=16),
+        ),
+    ]
@@ -0,0 +1,67 @@
+import logging
+
+from django.db import migrations, models
+
+logger = logging.getLogger('snippets.migrations')
+
+
+def get_document_parts(style, title):
+    """The header and footer full documents were wrapped in, as rendered
+    by Pygments when this migration was written"""
+    from pygments.formatters.html import (DOC_FOOTER, DOC_HEADER,
+                                          HtmlFormatter)
+
+    options = {'title': title} if title else {}
+    formatter = HtmlFormatter(style=style, full=True, **options)
+    header = DOC_HEADER % dict(title=formatter.title,
+                               styledefs=formatter.get_style_defs('body'),
+                               encoding=formatter.encoding)
+    return header, DOC_FOOTER
+
+
+def compact_highlights(apps, schema_editor):
+    """Strip the document wrapping from stored highlights"""
+    Snippet = apps.get_model('snippets', 'Snippet')
+    converted = saved = 0
+    snippets = Snippet.objects.filter(highlight_format='document').only(
+        'id', 'highlighted', 'style', 'title')
+    for snippet in snippets.iterator():
+        header, footer = get_document_parts(snippet.style, snippet.title)
+        document = snippet.highlighted
+        if not (document.startswith(header) and document.endswith(footer)):
+            continue
+        saved += len(header) + len(footer)
+        converted += 1
+        Snippet.objects.filter(id=snippet.id).update(
+            highlighted=document[len(header):len(document) - len(footer)],
+            highlight_format='fragment')
+    if converted:
+        logger.info('Compacted %d snippets, saving %d characters.',
+                    converted, saved)
+
+
+def expand_highlights(apps, schema_editor):
+    Snippet = apps.get_model('snippets', 'Snippet')
+    snippets = Snippet.objects.filter(highlight_format='fragment').only(
+        'id', 'highlighted', 'style', 'title')
+    for snippet in snippets.iterator():
+        header, footer = get_document_parts(snippet.style, snippet.title)
+        Snippet.objects.filter(id=snippet.id).update(
+            highlighted=header + snippet.highlighted + footer,
+            highlight_format='document')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0005_snippet_highlight_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='highlight_format',
+            field=models.CharField(choices=[('document', 'Document'), ('fragment', 'Fragment')], default='document', max_length=16),
+        ),
+        migrations.RunPython(compact_highlights, expand_highlights),
+    ]
@@ -0,0 +1,97 @@
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+INDEX_CHUNK_SIZE = 500
+TITLE_WEIGHT = 3
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+WORD_RE = re.compile(r'\w+')
+
+POSTGRES_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX snippet_search_vector_idx ON snippets_snippet USING GIN "
+    "(to_tsvector('simple', coalesce(snippets_snippet.title, '') || ' ' || "
+    "snippets_snippet.code))",
+    "CREATE INDEX snippet_code_trgm_idx ON snippets_snippet USING GIN "
+    "(code gin_trgm_ops)",
+    "CREATE INDEX snippet_title_trgm_idx ON snippets_snippet USING GIN "
+    "(title gin_trgm_ops)",
+]
+
+
+def tokenize(text):
+    """The terms of ``text``, as ``snippets.search`` split them when this
+    migration was written"""
+    for word in WORD_RE.findall(text.lower()):
+        parts = [word]
+        if '_' in word:
+            parts.extend(word.split('_'))
+        for part in parts:
+            if MIN_TERM_LENGTH <= len(part) <= MAX_TERM_LENGTH:
+                yield part
+
+
+def get_token_weights(snippet):
+    weights = {}
+    for term in tokenize(snippet.title):
+        weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+    for term in tokenize(snippet.code):
+        weights[term] = weights.get(term, 0) + 1
+    return weights
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text indexes on PostgreSQL, fill the inverted
+    index elsewhere"""
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_INDEXES:
+            schema_editor.execute(statement)
+        return
+
+    Snippet = apps.get_model('snippets', 'Snippet')
+    SearchToken = apps.get_model('snippets', 'SearchToken')
+    last_id = 0
+    while True:
+        chunk = list(Snippet.objects.filter(id__gt=last_id).order_by('id')
+                     .only('id', 'title', 'code')[:INDEX_CHUNK_SIZE])
+        if not chunk:
+            return
+        SearchToken.objects.bulk_create(
+            (SearchToken(snippet_id=snippet.id, term=term, weight=weight)
+             for snippet in chunk
+             for term, weight in get_token_weights(snippet).items()),
+            batch_size=INDEX_CHUNK_SIZE)
+        last_id = chunk[-1].id
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name in ('snippet_search_vector_idx', 'snippet_code_trgm_idx',
+                     'snippet_title_trgm_idx'):
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0007_revision_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='snippets.snippet')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchtoken',
+            constraint=models.UniqueConstraint(fields=('term', 'snippet'), name='unique_search_token'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,100 @@
+import hashlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+CHUNK_SIZE = 500
+
+
+def make_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def iter_chunks(queryset):
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id).order_by('id')
+                     [:CHUNK_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def move_to_blobs(apps, schema_editor):
+    """Point every snippet to the blobs holding its code and highlight"""
+    Snippet = apps.get_model('snippets', 'Snippet')
+    CodeBlob = apps.get_model('snippets', 'CodeBlob')
+    HighlightBlob = apps.get_model('snippets', 'HighlightBlob')
+    snippets = Snippet.objects.only('id', 'code', 'highlighted')
+    for chunk in iter_chunks(snippets):
+        code_blobs = {}
+        highlight_blobs = {}
+        for snippet in chunk:
+            snippet.code_blob_id = make_hash(snippet.code)
+            code_blobs[snippet.code_blob_id] = CodeBlob(
+                hash=snippet.code_blob_id, content=snippet.code)
+            if snippet.highlighted:
+                snippet.highlight_blob_id = make_hash(snippet.highlighted)
+                highlight_blobs[snippet.highlight_blob_id] = HighlightBlob(
+                    hash=snippet.highlight_blob_id,
+                    content=snippet.highlighted)
+        CodeBlob.objects.bulk_create(code_blobs.values(),
+                                     ignore_conflicts=True)
+        HighlightBlob.objects.bulk_create(highlight_blobs.values(),
+                                          ignore_conflicts=True)
+        Snippet.objects.bulk_update(chunk, ['code_blob', 'highlight_blob'])
+
+
+def move_from_blobs(apps, schema_editor):
+    Snippet = apps.get_model('snippets', 'Snippet')
+    snippets = Snippet.objects.select_related(
+        'code_blob', 'highlight_blob').only(
+        'id', 'code_blob__content', 'highlight_blob__content')
+    for chunk in iter_chunks(snippets):
+        for snippet in chunk:
+            snippet.code = snippet.code_blob.content
+            snippet.highlighted = (snippet.highlight_blob.content
+                                   if snippet.highlight_blob_id else '')
+        Snippet.objects.bulk_update(chunk, ['code', 'highlighted'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0008_searchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeBlob',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HighlightBlob',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='code_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='snippets', to='snippets.codeblob'),
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='highlight_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='snippets', to='snippets.highlightblob'),
+        ),
+        migrations.RunPython(move_to_blobs, move_from_blobs),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The full-text indexes of migration 0008 are dropped along with the code
+# column; the code is now searched in the blob table.
+POSTGRES_INDEXES = [
+    "CREATE INDEX codeblob_search_vector_idx ON snippets_codeblob USING GIN "
+    "(to_tsvector('simple', snippets_codeblob.content))",
+    "CREATE INDEX snippet_title_vector_idx ON snippets_snippet USING GIN "
+    "(to_tsvector('simple', snippets_snippet.title))",
+    "CREATE INDEX codeblob_content_trgm_idx ON snippets_codeblob USING GIN "
+    "(content gin_trgm_ops)",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_INDEXES:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name in ('codeblob_search_vector_idx', 'snippet_title_vector_idx',
+                     'codeblob_content_trgm_idx'):
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0009_blobs'),
+    ]
+
+    operations = [
+        # Defaults let the columns be added back when migrating backwards;
+        # 0009 then copies the blobs into them.
+        migrations.AlterField(
+            model_name='snippet',
+            name='code',
+            field=models.TextField(default=''),
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='highlighted',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='snippet',
+            name='code',
+        ),
+        migrations.RemoveField(
+            model_name='snippet',
+            name='highlighted',
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='code_blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='snippets', to='snippets.codeblob'),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['code_blob', 'language', 'linenos'], name='snippet_code_render_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations, models
+
+import snippets.fields
+
+
+def alter_content(apps, schema_editor, field):
+    HighlightBlob = apps.get_model('snippets', 'HighlightBlob')
+    old_field = HighlightBlob._meta.get_field('content')
+    field.set_attributes_from_name('content')
+    field.model = HighlightBlob
+    schema_editor.alter_field(HighlightBlob, old_field, field)
+
+
+def to_binary(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # A plain cast would interpret backslashes in the text as escapes.
+        schema_editor.execute(
+            'ALTER TABLE snippets_highlightblob ALTER COLUMN content '
+            "TYPE bytea USING convert_to(content, 'UTF8')")
+    else:
+        alter_content(apps, schema_editor, snippets.fields.CompressedTextField(
+            dictionary='highlight-1'))
+
+
+def to_text(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE snippets_highlightblob ALTER COLUMN content '
+            "TYPE text USING convert_from(content, 'UTF8')")
+    else:
+        alter_content(apps, schema_editor, models.TextField())
+        schema_editor.execute('UPDATE snippets_highlightblob '
+                              'SET content = CAST(content AS TEXT)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0010_remove_snippet_code'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(to_binary, to_text),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='highlightblob',
+                    name='content',
+                    field=snippets.fields.CompressedTextField(dictionary='highlight-1'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,81 @@
+import os
+import zlib
+
+from django.db import migrations
+
+CHUNK_SIZE = 500
+
+# The stored format of snippets.compression when this migration was
+# written. Codec ids and dictionary files are append-only, so stored
+# values keep reading back whatever the app's compression becomes.
+MAGIC = b'\x00'
+CODEC_PLAIN = 0
+CODEC_HIGHLIGHT_1 = 2
+DICTIONARY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'dictionaries', 'highlight-1.txt')
+LEVEL = 6
+MIN_COMPRESS_SIZE = 64
+
+
+def compress(text, dictionary):
+    data = text.encode('utf-8')
+    if len(data) >= MIN_COMPRESS_SIZE:
+        compressor = zlib.compressobj(LEVEL, zdict=dictionary)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) < len(data):
+            return MAGIC + bytes([CODEC_HIGHLIGHT_1]) + compressed
+    return MAGIC + bytes([CODEC_PLAIN]) + data
+
+
+def iter_chunks(queryset):
+    last_hash = ''
+    while True:
+        chunk = list(queryset.filter(hash__gt=last_hash).order_by('hash')
+                     [:CHUNK_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last_hash = chunk[-1].hash
+
+
+def compress_highlights(apps, schema_editor):
+    """Compress the highlights stored as text"""
+    HighlightBlob = apps.get_model('snippets', 'HighlightBlob')
+    with open(DICTIONARY_PATH, 'rb') as dictionary_file:
+        dictionary = dictionary_file.read()
+    for chunk in iter_chunks(HighlightBlob.objects.all()):
+        pending = []
+        for blob in chunk:
+            stored = blob.__dict__['content']
+            if isinstance(stored, str):
+                # Text written before the column was binary, on SQLite.
+                text = stored
+            elif bytes(stored[:1]) == MAGIC:
+                continue
+            else:
+                text = bytes(stored).decode('utf-8')
+            # Assigned bytes are stored as they are.
+            blob.content = compress(text, dictionary)
+            pending.append(blob)
+        HighlightBlob.objects.bulk_update(pending, ['content'])
+
+
+def decompress_highlights(apps, schema_editor):
+    HighlightBlob = apps.get_model('snippets', 'HighlightBlob')
+    for chunk in iter_chunks(HighlightBlob.objects.all()):
+        for blob in chunk:
+            # Bytes are stored as they are.
+            blob.content = blob.content.encode('utf-8')
+        HighlightBlob.objects.bulk_update(chunk, ['content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0011_compress_highlightblob'),
+    ]
+
+    operations = [
+        migrations.RunPython(compress_highlights, decompress_highlights),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0012_compress_highlights'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='highlight_fallback',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0013_snippet_highlight_fallback'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='snippet',
+            name='snippet_code_render_idx',
+        ),
+    ]
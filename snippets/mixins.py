@@ -0,0 +1,247 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag)
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from snippets import budgets, replicas
+from snippets.conf import get_setting
+from snippets.response_cache import (CachedResponse, get_cache, list_scope,
+                                     object_scope, response_cache)
+
+
+class ReplicaReadMixin:
+    """
+    Read from a replica on safe methods, see ``snippets.replicas``.
+
+    The database is picked once the request is authenticated and stored
+    in ``read_database``, which ``get_queryset`` uses. Successful writes
+    pin the user to the primary for a while.
+    """
+    read_database = DEFAULT_DB_ALIAS
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self.read_database = replicas.get_read_database(request)
+
+    def get_queryset(self):
+        return super().get_queryset().using(self.read_database)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (request.method not in SAFE_METHODS and
+                status.is_success(response.status_code)):
+            replicas.pin(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+RENDER_METHODS = ('POST', 'PUT', 'PATCH')
+RENDER_REJECTED = 'Too many highlights are being rendered.'
+
+
+def is_render_admission_needed(request):
+    """Return whether ``request`` (a Django request) renders a highlight
+    and hasn't been admitted yet"""
+    return (request.method in RENDER_METHODS and
+            get_setting('HIGHLIGHT_MODE') != 'deferred' and
+            not getattr(request, 'render_admitted', False))
+
+
+class RenderAdmissionMixin:
+    """
+    Admit writes, which render highlights unless they are deferred, within
+    ``budgets.render_admission``.
+
+    Writes over the ``RENDER_MAX_IN_FLIGHT`` limit are answered with 429
+    and a ``Retry-After`` of ``RENDER_RETRY_AFTER`` seconds, after the
+    throttles let them in.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if is_render_admission_needed(request._request):
+            if not budgets.render_admission.acquire():
+                raise Throttled(wait=get_setting('RENDER_RETRY_AFTER'),
+                                detail=RENDER_REJECTED)
+            request._request.render_admitted = True
+            self.admitted = True
+
+    def dispatch(self, request, *args, **kwargs):
+        self.admitted = False
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self.admitted:
+                budgets.render_admission.release()
+
+
+class NDJSONExportMixin:
+    """
+    Adds an ``export`` list action streaming the whole collection as
+    newline delimited JSON.
+
+    Rows are read in primary key ordered chunks of ``export_chunk_size``,
+    each one a bounded keyset query, so memory use does not grow with the
+    table. Chunked queries are used instead of ``QuerySet.iterator()``
+    because the latter skips ``prefetch_related``.
+    """
+    export_chunk_size = 500
+
+    def iter_export_chunks(self, queryset):
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(
+                pk__gt=last_pk)
+            chunk = list(chunk[:self.export_chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_pk = chunk[-1].pk
+
+    def iter_export_lines(self, queryset):
+        encoder = JSONEncoder()
+        for chunk in self.iter_export_chunks(queryset):
+            serializer = self.get_serializer(chunk, many=True)
+            yield ''.join(encoder.encode(item) + '\n'
+                          for item in serializer.data)
+
+    @action(detail=False)
+    def export(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).order_by('pk')
+        return StreamingHttpResponse(self.iter_export_lines(queryset),
+                                     content_type='application/x-ndjson')
+
+
+class ConditionalRequestMixin:
+    """
+    Strong ETag and Last-Modified validation for detail views, based on the
+    model's ``revision`` and ``updated`` columns.
+
+    ``If-None-Match`` and ``If-Modified-Since`` are answered with a 304
+    from a single primary key lookup, before the object is serialized.
+    ``If-Match`` on writes gives optimistic concurrency: the request fails
+    with 412 unless the client saw the current revision.
+    """
+
+    def get_etag(self, pk, revision):
+        return quote_etag(f'{pk}-{revision}')
+
+    def get_version(self, queryset):
+        """Return ``(etag, last_modified)`` of the requested object"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        version = queryset.filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).values_list('pk', 'revision', 'updated').first()
+        if version is None:
+            raise Http404
+        pk, revision, updated = version
+        return self.get_etag(pk, revision), updated
+
+    def set_version_headers(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return (if_modified_since is not None and
+                int(last_modified.timestamp()) <= if_modified_since)
+
+    def check_if_match(self, request, etag):
+        if_match = request.META.get('HTTP_IF_MATCH')
+        if if_match is None:
+            return True
+        etags = parse_etags(if_match)
+        return '*' in etags or etag in etags
+
+    def retrieve(self, request, *args, **kwargs):
+        if ('HTTP_IF_NONE_MATCH' in request.META or
+                'HTTP_IF_MODIFIED_SINCE' in request.META):
+            etag, last_modified = self.get_version(self.get_queryset())
+            if self.is_not_modified(request, etag, last_modified):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                return self.set_version_headers(response, etag,
+                                                last_modified)
+        response = super().retrieve(request, *args, **kwargs)
+        return self.set_instance_version_headers(response)
+
+    def set_instance_version_headers(self, response):
+        serializer = getattr(response.data, 'serializer', None)
+        instance = getattr(serializer, 'instance', None)
+        if instance is not None and status.is_success(response.status_code):
+            self.set_version_headers(
+                response, self.get_etag(instance.pk, instance.revision),
+                instance.updated)
+        return response
+
+    def conditional_write(self, write, request, *args, **kwargs):
+        with transaction.atomic():
+            queryset = self.get_queryset().select_for_update()
+            etag, _ = self.get_version(queryset)
+            if not self.check_if_match(request, etag):
+                return Response({'detail': 'Precondition failed.'},
+                                status=status.HTTP_412_PRECONDITION_FAILED,
+                                headers={'ETag': etag})
+            response = write(request, *args, **kwargs)
+        return self.set_instance_version_headers(response)
+
+    def update(self, request, *args, **kwargs):
+        return self.conditional_write(super().update, request,
+                                      *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        return self.conditional_write(super().destroy, request,
+                                      *args, **kwargs)
+
+
+class CachedResponseMixin:
+    """
+    Serve ``list`` and ``retrieve`` through ``snippets.response_cache``.
+
+    Entries are scoped by ``cache_name``: detail responses to the object,
+    list responses to the collection, keyed by the full URL since the
+    pagination links are absolute. Conditional requests bypass the cache.
+    """
+    cache_name = None
+    cached_headers = ('ETag', 'Last-Modified')
+
+    def get_cached_response(self, scope, variant, view, request, *args,
+                            **kwargs):
+        def compute():
+            if get_cache() is not None:
+                # Entries outlive the replication lag, compute them from
+                # the primary.
+                self.read_database = DEFAULT_DB_ALIAS
+            response = view(request, *args, **kwargs)
+            return CachedResponse(
+                response.status_code, response.data,
+                {header: response[header] for header in self.cached_headers
+                 if response.has_header(header)})
+
+        cached = response_cache.get_or_compute(scope, variant, compute)
+        return Response(cached.data, status=cached.status,
+                        headers=cached.headers)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            list_scope(self.cache_name), request.build_absolute_uri(),
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if ('HTTP_IF_NONE_MATCH' in request.META or
+                'HTTP_IF_MODIFIED_SINCE' in request.META):
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return self.get_cached_response(
+            object_scope(self.cache_name, self.kwargs[lookup_url_kwarg]), '',
+            super().retrieve, request, *args, **kwargs)
@@ -1,37 +1,270 @@
-from django.db import models
-from pygments.lexers import get_all_lexers
-from pygments.styles import get_all_styles
-from pygments.lexers import get_lexer_by_name
-from pygments.formatters.html import HtmlFormatter
-from pygments import highlight
+import hashlib
 
-LEXERS = [item for item in get_all_lexers() if item[1]]
-LANGUAGE_CHOICES = sorted([(item[1][0], item[0]) for item in LEXERS])
-STYLE_CHOICES = sorted([(item, item) for item in get_all_styles()])
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from snippets import budgets, highlighting, metrics, render_cache
+from snippets.conf import get_setting
+from snippets.fields import CompressedTextField
+from snippets.registry import LANGUAGE_CHOICES, STYLE_CHOICES
+
+
+class Blob(models.Model):
+    """Text stored once and shared by every snippet with the same content,
+    addressed by its SHA-256 hash"""
+    hash = models.CharField(max_length=64, primary_key=True)
+    content = models.TextField()
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def make_hash(content):
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def from_content(cls, content):
+        """Return an unsaved blob for ``content``, see ``store``"""
+        return cls(hash=cls.make_hash(content), content=content)
+
+    @classmethod
+    def store(cls, blobs):
+        """Insert the ``blobs`` that don't exist yet.
+
+        Must be called in the transaction writing the rows that reference
+        them: the blobs are locked until it ends, so that ``collect``
+        can't delete them in between.
+        """
+        unique = {blob.hash: blob for blob in blobs}
+        while unique:
+            cls.objects.bulk_create(unique.values(), ignore_conflicts=True)
+            locked = set(cls.objects.select_for_update().filter(
+                hash__in=list(unique)).values_list('hash', flat=True))
+            # Deleted by a collection since the insert, inserted again.
+            unique = {blob_hash: blob for blob_hash, blob in unique.items()
+                      if blob_hash not in locked}
+        for blob in blobs:
+            blob._state.adding = False
+
+    @classmethod
+    def collect(cls, hashes=None):
+        """Delete unreferenced blobs, among ``hashes`` if given, and return
+        how many were deleted"""
+        blobs = cls.objects.filter(snippets__isnull=True)
+        if hashes is not None:
+            blobs = blobs.filter(hash__in=[blob_hash for blob_hash in hashes
+                                           if blob_hash])
+        try:
+            with transaction.atomic():
+                return blobs.delete()[0]
+        except (IntegrityError, models.ProtectedError):
+            # Referenced again meanwhile, left for the next collection.
+            return 0
+
+
+class CodeBlob(Blob):
+    pass
+
+
+class HighlightBlob(Blob):
+    # Highlighted markup is very repetitive and only read by instances.
+    content = CompressedTextField(dictionary='highlight-1')
 
 
 class Snippet(models.Model):
+    HIGHLIGHT_PENDING = 'pending'
+    HIGHLIGHT_RENDERING = 'rendering'
+    HIGHLIGHT_READY = 'ready'
+    HIGHLIGHT_FAILED = 'failed'
+    HIGHLIGHT_STATUS_CHOICES = [
+        (HIGHLIGHT_PENDING, 'Pending'),
+        (HIGHLIGHT_RENDERING, 'Rendering'),
+        (HIGHLIGHT_READY, 'Ready'),
+        (HIGHLIGHT_FAILED, 'Failed'),
+    ]
+    RENDER_FIELDS = ('code', 'language', 'style', 'linenos', 'title')
+    # Columns the render inputs are read from, the code by its hash.
+    RENDER_COLUMNS = ('code_blob_id', 'language', 'style', 'linenos', 'title')
+    FORMAT_DOCUMENT = 'document'
+    FORMAT_FRAGMENT = 'fragment'
+    FORMAT_CHOICES = [
+        (FORMAT_DOCUMENT, 'Document'),
+        (FORMAT_FRAGMENT, 'Fragment'),
+    ]
+
     owner = models.ForeignKey('auth.User', related_name='snippets', on_delete=models.CASCADE)
-    highlighted = models.TextField()
+    code_blob = models.ForeignKey(CodeBlob, related_name='snippets',
+                                  on_delete=models.PROTECT)
+    highlight_blob = models.ForeignKey(HighlightBlob, related_name='snippets',
+                                       on_delete=models.PROTECT,
+                                       null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
     title = models.CharField(max_length=100, blank=True, default='')
-    code = models.TextField()
     linenos = models.BooleanField(default=False)
     language = models.CharField(choices=LANGUAGE_CHOICES, default='python', max_length=100)
     style = models.CharField(choices=STYLE_CHOICES, default='friendly', max_length=100)
+    highlight_status = models.CharField(choices=HIGHLIGHT_STATUS_CHOICES,
+                                        default=HIGHLIGHT_READY,
+                                        max_length=16, db_index=True)
+    highlight_attempts = models.PositiveSmallIntegerField(default=0)
+    highlight_claimed_at = models.DateTimeField(null=True, blank=True)
+    highlight_format = models.CharField(choices=FORMAT_CHOICES,
+                                        default=FORMAT_DOCUMENT,
+                                        max_length=16)
+    # Plain text stored after the render went over its time or memory
+    # budget or crashed, rendered again by the next save or rehighlight.
+    highlight_fallback = models.BooleanField(default=False)
+    revision = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['created']
 
+    _loaded_render_state = None
+    _loaded_blobs = (None, None)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Snippet, cls).from_db(db, field_names, values)
+        deferred = instance.get_deferred_fields()
+        if not deferred.intersection(cls.RENDER_COLUMNS):
+            instance._loaded_render_state = instance.get_render_state()
+        if not deferred.intersection(('code_blob_id', 'highlight_blob_id')):
+            instance._loaded_blobs = (instance.code_blob_id,
+                                      instance.highlight_blob_id)
+        return instance
+
+    @property
+    def code(self):
+        return self.code_blob.content if self.code_blob_id else ''
+
+    @code.setter
+    def code(self, value):
+        self.code_blob = CodeBlob.from_content(value)
+
+    @property
+    def highlighted(self):
+        return self.highlight_blob.content if self.highlight_blob_id else ''
+
+    @highlighted.setter
+    def highlighted(self, value):
+        self.highlight_blob = (HighlightBlob.from_content(value) if value
+                               else None)
+
+    def needs_render(self):
+        """Whether the stored highlight is missing or out of date"""
+        if self._loaded_render_state != self.get_render_state():
+            return True
+        if (self.highlight_status == self.HIGHLIGHT_READY and
+                not self.highlight_fallback):
+            return False
+        # Rows already queued are left to the workers in deferred mode.
+        return not (get_setting('HIGHLIGHT_MODE') == 'deferred' and
+                    self.highlight_status in (self.HIGHLIGHT_PENDING,
+                                              self.HIGHLIGHT_RENDERING))
+
     def save(self, *args, **kwargs):
-        """Create highlighted HTML representation"""
-        lexer = get_lexer_by_name(self.language)
-        linenos = 'table' if self.linenos else False
-        options = {'title': self.title} if self.title else {}
-        formatter = HtmlFormatter(style=self.style, linenos=linenos,
-                                  full=True, **options)
-        self.highlighted = highlight(self.code, lexer, formatter)
-        super(Snippet, self).save(*args, **kwargs)
+        """Create highlighted HTML representation, or queue it for the
+        highlight workers when rendering is deferred.
+
+        Nothing is rendered when none of the render inputs changed since
+        the instance was loaded. New code and highlights are stored as
+        blobs first; blobs no longer referenced are collected by the
+        ``post_save`` handler.
+        """
+        if not self.needs_render():
+            pass
+        elif get_setting('HIGHLIGHT_MODE') == 'deferred':
+            self.highlighted = ''
+            self.highlight_status = self.HIGHLIGHT_PENDING
+            self.highlight_attempts = 0
+            self.highlight_claimed_at = None
+        else:
+            self.render_highlight()
+        loaded = self._loaded_render_state
+        # Read by the search index signal handler.
+        self._search_changed = (loaded is None or
+                                loaded['title'] != self.title or
+                                loaded['code_blob_id'] != self.code_blob_id)
+        self._replaced_blobs = self.get_replaced_blobs()
+        self.revision += 1
+        with transaction.atomic(savepoint=False):
+            self.store_blobs([self])
+            super(Snippet, self).save(*args, **kwargs)
+        self._loaded_render_state = self.get_render_state()
+        self._loaded_blobs = (self.code_blob_id, self.highlight_blob_id)
+
+    @staticmethod
+    def store_blobs(snippets):
+        """Store the new code and highlight blobs of ``snippets``.
+
+        Blobs that weren't assigned to the instances aren't loaded; they
+        are already stored.
+        """
+        for blob_class, name in ((CodeBlob, 'code_blob'),
+                                 (HighlightBlob, 'highlight_blob')):
+            field = Snippet._meta.get_field(name)
+            blob_class.store([
+                getattr(snippet, name) for snippet in snippets
+                if field.is_cached(snippet) and
+                getattr(snippet, name) is not None and
+                getattr(snippet, name)._state.adding])
+
+    def get_replaced_blobs(self):
+        """Return the hashes of the code and highlight blobs loaded with the
+        instance that it no longer references"""
+        code_hash, highlight_hash = self._loaded_blobs
+        return (code_hash if code_hash != self.code_blob_id else None,
+                highlight_hash if highlight_hash != self.highlight_blob_id
+                else None)
+
+    def get_render_inputs(self):
+        return {field: getattr(self, field) for field in self.RENDER_FIELDS}
+
+    def get_render_state(self):
+        return {column: getattr(self, column)
+                for column in self.RENDER_COLUMNS}
+
+    def render_highlight(self):
+        full = get_setting('HIGHLIGHT_STORAGE') == self.FORMAT_DOCUMENT
+        inputs = self.get_render_inputs()
+        cache = render_cache.get_render_cache()
+        key = highlighting.render_key(full=full, **inputs)
+        html = cache.get(key)
+        if html is None:
+            loaded = self._loaded_render_state
+            with metrics.timer('render'):
+                html = render_cache.render_edit(
+                    code_hash=self.code_blob_id,
+                    previous_hash=loaded and loaded['code_blob_id'],
+                    full=full, **inputs)
+            if budgets.is_final(html):
+                cache.set(key, html)
+        self.highlighted = html
+        self.highlight_fallback = not budgets.is_final(html)
+        self.highlight_format = (self.FORMAT_DOCUMENT if full
+                                 else self.FORMAT_FRAGMENT)
+        self.highlight_status = self.HIGHLIGHT_READY
+        self.highlight_attempts = 0
+        self.highlight_claimed_at = None
+
+    def get_highlighted_fragment(self):
+        """Highlighted ``<div>`` fragment, to be styled with the style's
+        stylesheet"""
+        if self.highlight_format == self.FORMAT_FRAGMENT:
+            return self.highlighted
+        fragment = highlighting.to_fragment(self.highlighted, self.style,
+                                            self.title)
+        if fragment is None:
+            fragment = render_cache.render(full=False,
+                                           **self.get_render_inputs())
+        return fragment
+
+    def get_highlighted_document(self):
+        """Standalone highlighted HTML document"""
+        if self.highlight_format == self.FORMAT_DOCUMENT:
+            return self.highlighted
+        return highlighting.to_document(self.highlighted, self.style,
+                                        self.title)
 
 
 class Script(models.Model):
@@ -39,4 +272,94 @@ class Script(models.Model):
     owner = models.ForeignKey('auth.User',
                               related_name='scripts',
                               on_delete=models.CASCADE)
-    snippets = models.CharField(max_length=1023, default='')
+    # Also bumped when a referenced snippet changes.
+    revision = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    _pending_snippet_ids = None
+
+    @property
+    def snippet_ids(self):
+        """Ordered list of snippet ids, repeats included"""
+        if self._pending_snippet_ids is not None:
+            return list(self._pending_snippet_ids)
+        if self.pk is None:
+            return []
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'entries' in prefetched:
+            return [entry.snippet_id for entry in prefetched['entries']]
+        return list(self.entries.values_list('snippet_id', flat=True))
+
+    @snippet_ids.setter
+    def snippet_ids(self, value):
+        self._pending_snippet_ids = [int(s_id) for s_id in value]
+
+    @property
+    def snippets(self):
+        """Comma separated snippet ids, kept for wire compatibility"""
+        return ','.join(str(s_id) for s_id in self.snippet_ids)
+
+    @snippets.setter
+    def snippets(self, value):
+        if isinstance(value, str):
+            value = [s_id.strip() for s_id in value.split(',')
+                     if s_id.strip()]
+        self.snippet_ids = value
+
+    def save(self, *args, **kwargs):
+        """Save the script and write pending snippet entries"""
+        self.revision += 1
+        with transaction.atomic():
+            super(Script, self).save(*args, **kwargs)
+            if self._pending_snippet_ids is not None:
+                self.entries.all().delete()
+                ScriptSnippet.objects.bulk_create([
+                    ScriptSnippet(script=self, snippet_id=s_id,
+                                  position=position)
+                    for position, s_id in enumerate(self._pending_snippet_ids)
+                ])
+                self._pending_snippet_ids = None
+                getattr(self, '_prefetched_objects_cache', {}).pop('entries',
+                                                                   None)
+
+    @classmethod
+    def bump_revisions(cls, snippet_ids):
+        """Bump the revision of scripts referencing any of ``snippet_ids``"""
+        return cls.objects.filter(
+            id__in=ScriptSnippet.objects.filter(
+                snippet_id__in=snippet_ids).values('script_id'),
+        ).update(revision=models.F('revision') + 1, updated=timezone.now())
+
+
+class ScriptSnippet(models.Model):
+    """Position of a snippet inside a script"""
+    script = models.ForeignKey(Script, related_name='entries',
+                               on_delete=models.CASCADE)
+    snippet = models.ForeignKey(Snippet, related_name='script_entries',
+                                on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['script', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['script', 'position'],
+                                    name='unique_script_position'),
+        ]
+        indexes = [
+            models.Index(fields=['snippet', 'script'],
+                         name='scriptsnippet_snippet_idx'),
+        ]
+
+
+class SearchToken(models.Model):
+    """Entry of the inverted index used for search without PostgreSQL"""
+    snippet = models.ForeignKey(Snippet, related_name='search_tokens',
+                                on_delete=models.CASCADE)
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'snippet'],
+                                    name='unique_search_token'),
+        ]
@@ -0,0 +1,61 @@
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from snippets.renderers import MSGPACK_MEDIA_TYPE, msgpack, orjson
+
+
+class ORJSONParser(JSONParser):
+    """``JSONParser`` decoding UTF-8 bodies with orjson, when it is
+    installed"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if (orjson is None or not self.strict or
+                codecs.lookup(encoding).name != 'utf-8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(BaseParser):
+    """Parses MessagePack, requires msgpack"""
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read())
+        except ValueError as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline delimited JSON into an iterator of objects.
+
+    Lines are decoded as they are read from the request stream, so a large
+    upload is never held in memory as a whole.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self.iter_objects(stream, encoding)
+
+    def iter_objects(self, stream, encoding):
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line.decode(encoding))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {number} - '
+                                 f'{exc}')
@@ -1,4 +1,7 @@
 from rest_framework import permissions
+from rest_framework.exceptions import NotFound
+
+from snippets.conf import get_setting
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -14,3 +17,19 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
 
         # Write permissions are only allowed to the owner of the snippet.
         return obj.owner == request.user
+
+
+def is_metrics_client(request):
+    return request.META.get('REMOTE_ADDR') in get_setting(
+        'METRICS_ALLOWED_IPS')
+
+
+class IsMetricsClient(permissions.BasePermission):
+    """
+    Only serve clients listed in ``METRICS_ALLOWED_IPS``, like /metrics.
+    """
+
+    def has_permission(self, request, view):
+        if not is_metrics_client(request):
+            raise NotFound
+        return True
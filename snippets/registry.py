@@ -0,0 +1,94 @@
+"""
+Precomputed registry of the Pygments lexers and styles snippets can use.
+
+Building the choices from ``get_all_lexers()`` and ``get_all_styles()``
+scans the setuptools plugin entry points and imports plugin lexers, which
+used to happen in every process that imported the models. The registry is
+generated once into ``lexer_registry.json`` with::
+
+    python manage.py build_lexer_registry
+
+and only covers the lexers and styles bundled with Pygments. If the
+installed Pygments version differs from the one the file was built for,
+the registry is rebuilt in memory from the bundled mapping instead.
+
+Lexer classes are imported the first time they are used.
+"""
+import functools
+import importlib
+import json
+import os
+import warnings
+
+import pygments
+
+REGISTRY_PATH = os.path.join(os.path.dirname(__file__), 'lexer_registry.json')
+
+
+def build_registry():
+    """Build the registry from the lexers and styles bundled with Pygments"""
+    from pygments.lexers._mapping import LEXERS
+    from pygments.styles import STYLE_MAP
+
+    languages = sorted(
+        [aliases[0], name, module_name, class_name]
+        for class_name, (module_name, name, aliases, _, _) in LEXERS.items()
+        if aliases)
+    return {
+        'pygments_version': pygments.__version__,
+        'languages': languages,
+        'styles': sorted(STYLE_MAP),
+    }
+
+
+def write_registry(path=REGISTRY_PATH):
+    """Write the registry to ``path``, one language per line"""
+    registry = build_registry()
+    languages = ',\n  '.join(json.dumps(entry)
+                             for entry in registry['languages'])
+    with open(path, 'w') as registry_file:
+        registry_file.write(
+            '{{\n "pygments_version": {},\n "languages": [\n  {}\n ],\n'
+            ' "styles": {}\n}}\n'.format(
+                json.dumps(registry['pygments_version']), languages,
+                json.dumps(registry['styles'])))
+    return registry
+
+
+def load_registry(path=REGISTRY_PATH):
+    try:
+        with open(path) as registry_file:
+            registry = json.load(registry_file)
+    except FileNotFoundError:
+        registry = None
+    if (registry is None or
+            registry['pygments_version'] != pygments.__version__):
+        warnings.warn(
+            'The lexer registry does not match Pygments {}, run '
+            '"manage.py build_lexer_registry".'.format(pygments.__version__))
+        registry = build_registry()
+    return registry
+
+
+REGISTRY = load_registry()
+LANGUAGE_CHOICES = [(alias, name)
+                    for alias, name, _, _ in REGISTRY['languages']]
+STYLE_CHOICES = [(style, style) for style in REGISTRY['styles']]
+LEXER_CLASSES = {alias: (module_name, class_name)
+                 for alias, _, module_name, class_name
+                 in REGISTRY['languages']}
+
+
+@functools.lru_cache(maxsize=None)
+def get_lexer_class(alias):
+    """Import and return the lexer class registered for ``alias``"""
+    try:
+        module_name, class_name = LEXER_CLASSES[alias]
+    except KeyError:
+        from pygments.lexers import find_lexer_class_by_name
+        return find_lexer_class_by_name(alias)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def get_lexer(alias, **options):
+    return get_lexer_class(alias)(**options)
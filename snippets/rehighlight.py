@@ -0,0 +1,194 @@
+"""
+Re-rendering of stored highlights, e.g. after upgrading Pygments.
+
+The snippet table is walked in primary key order, one chunk at a time.
+Rendering happens outside of any transaction, spread over the processes
+of a render sandbox, and each chunk is written back with a single
+``bulk_update`` in a short transaction. Rows whose revision changed
+while their chunk was rendering were saved (and rendered) again in the
+meantime and are left alone.
+
+Progress can be checkpointed to a file holding the last processed id so
+an interrupted run resumes where it stopped.
+"""
+import json
+import os
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from snippets import budgets
+from snippets.conf import get_setting
+from snippets.models import HighlightBlob, Snippet
+from snippets.signals import snippets_updated
+
+UPDATE_FIELDS = ['highlight_blob', 'highlight_format', 'highlight_fallback',
+                 'highlight_status', 'highlight_attempts', 'revision',
+                 'updated']
+# Rows queued for the highlight workers are theirs to render.
+STATUSES = [Snippet.HIGHLIGHT_READY, Snippet.HIGHLIGHT_FAILED]
+
+
+def get_result(future):
+    """Return ``(html, error)`` of a render submitted to ``budgets``"""
+    exc = future.exception()
+    if exc is not None:
+        return None, repr(exc)
+    return future.result(), None
+
+
+class Checkpoint:
+    """Last processed id of a run, stored as JSON along with its filters"""
+
+    def __init__(self, path, filters):
+        self.path = path
+        self.filters = filters
+
+    def load(self):
+        """Return the id to resume after, or 0"""
+        try:
+            with open(self.path) as checkpoint_file:
+                data = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return 0
+        if data['filters'] != self.filters:
+            raise ValueError(
+                f'Checkpoint {self.path} was written with other filters.')
+        return data['last_id']
+
+    def save(self, last_id):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump({'filters': self.filters, 'last_id': last_id},
+                      checkpoint_file)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ChunkResult:
+    def __init__(self, last_id, updated, skipped, failed, seconds):
+        self.last_id = last_id
+        self.updated = updated
+        self.skipped = skipped
+        self.failed = failed
+        self.seconds = seconds
+
+    @property
+    def count(self):
+        return self.updated + self.skipped + len(self.failed)
+
+
+class Rehighlighter:
+    """Re-render the highlights of the snippets matching ``filters``.
+
+    ``filters`` are keyword arguments for ``Snippet.objects.filter`` and
+    must be JSON serializable to be checkpointed.
+    """
+
+    def __init__(self, filters=None, chunk_size=500, processes=None):
+        self.filters = filters or {}
+        self.chunk_size = chunk_size
+        self.processes = processes or os.cpu_count() or 1
+        self.highlight_format = get_setting('HIGHLIGHT_STORAGE')
+        self.sandbox = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.sandbox is not None:
+            self.sandbox.close()
+            self.sandbox = None
+
+    def get_queryset(self):
+        return (Snippet.objects
+                .filter(highlight_status__in=STATUSES, **self.filters)
+                .order_by('id'))
+
+    def render(self, inputs_list):
+        if self.sandbox is None:
+            self.sandbox = budgets.create_sandbox(processes=self.processes)
+        futures = [budgets.submit(inputs, self.sandbox)
+                   for inputs in inputs_list]
+        return [get_result(future) for future in futures]
+
+    def run_chunk(self, after_id):
+        """Re-render the chunk following ``after_id``, or return None
+        when there is nothing left"""
+        start = time.perf_counter()
+        snippets = list(
+            self.get_queryset().filter(id__gt=after_id)
+            .select_related('code_blob')
+            .only('id', 'revision', 'highlight_blob', 'code_blob',
+                  'code_blob__content', 'language', 'style', 'linenos',
+                  'title')[:self.chunk_size])
+        if not snippets:
+            return None
+
+        full = self.highlight_format == Snippet.FORMAT_DOCUMENT
+        results = self.render([dict(snippet.get_render_inputs(), full=full)
+                               for snippet in snippets])
+        rendered = {}
+        failed = {}
+        for snippet, (html, exc) in zip(snippets, results):
+            if exc is None:
+                rendered[snippet.id] = (snippet, html)
+            else:
+                failed[snippet.id] = exc
+
+        with transaction.atomic():
+            current = dict(
+                Snippet.objects.select_for_update()
+                .filter(id__in=rendered, highlight_status__in=STATUSES)
+                .values_list('id', 'revision'))
+            now = timezone.now()
+            updated = []
+            for snippet, html in rendered.values():
+                if current.get(snippet.id) != snippet.revision:
+                    continue
+                snippet.highlighted = html
+                snippet.highlight_format = self.highlight_format
+                snippet.highlight_fallback = not budgets.is_final(html)
+                snippet.highlight_status = Snippet.HIGHLIGHT_READY
+                snippet.highlight_attempts = 0
+                snippet.revision += 1
+                snippet.updated = now
+                updated.append(snippet)
+            if updated:
+                replaced = [snippet.get_replaced_blobs()[1]
+                            for snippet in updated]
+                Snippet.store_blobs(updated)
+                Snippet.objects.bulk_update(updated, UPDATE_FIELDS)
+                HighlightBlob.collect(replaced)
+                snippets_updated.send(
+                    sender=Snippet, fields=UPDATE_FIELDS,
+                    ids=[snippet.id for snippet in updated])
+
+        return ChunkResult(
+            last_id=snippets[-1].id,
+            updated=len(updated),
+            skipped=len(rendered) - len(updated),
+            failed=failed,
+            seconds=time.perf_counter() - start)
+
+    def run(self, after_id=0, checkpoint=None):
+        """Process every chunk, yielding a ``ChunkResult`` for each"""
+        while True:
+            result = self.run_chunk(after_id)
+            if result is None:
+                break
+            after_id = result.last_id
+            if checkpoint is not None:
+                checkpoint.save(after_id)
+            yield result
+        if checkpoint is not None:
+            checkpoint.clear()
@@ -0,0 +1,175 @@
+"""
+Content-addressed cache for highlighted HTML.
+
+Entries are keyed by ``highlighting.render_key`` so snippets sharing the
+same render inputs share one rendered document. Each process keeps a
+size-bounded LRU; when ``RENDER_CACHE_BACKEND`` names a Django cache alias
+that cache is consulted on local misses, so processes can share renders.
+
+Line states of ``snippets.incremental`` are kept in another LRU by
+``render_edit``, keyed by language and code hash, so the code a snippet
+is edited from is found on its next save.
+
+Counters and line states are per process.
+"""
+import threading
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from snippets import budgets, highlighting, incremental
+from snippets.conf import get_setting
+
+KEY_PREFIX = 'highlight:'
+
+
+class RenderCache:
+    """Size-bounded LRU of rendered HTML, optionally backed by a Django
+    cache"""
+
+    def __init__(self, max_size, backend=None):
+        self.max_size = max_size
+        self.backend = backend
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_backend(self):
+        return caches[self.backend] if self.backend else None
+
+    def get(self, key):
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        backend = self.get_backend()
+        html = backend.get(KEY_PREFIX + key) if backend else None
+        with self.lock:
+            if html is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self.store(key, html)
+        return html
+
+    def set(self, key, html):
+        self.store(key, html)
+        backend = self.get_backend()
+        if backend:
+            backend.set(KEY_PREFIX + key, html)
+
+    def store(self, key, html):
+        size = len(html)
+        if size > self.max_size:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = html
+            self.size += size
+            while self.size > self.max_size:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size,
+            }
+
+
+_render_cache = None
+_line_states = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    global _render_cache
+    if _render_cache is None:
+        with _render_cache_lock:
+            if _render_cache is None:
+                _render_cache = RenderCache(
+                    max_size=get_setting('RENDER_CACHE_MAX_SIZE'),
+                    backend=get_setting('RENDER_CACHE_BACKEND'))
+    return _render_cache
+
+
+def get_line_states():
+    """LRU of the line states of recently rendered code, bounded in
+    characters of code and HTML"""
+    global _line_states
+    if _line_states is None:
+        with _render_cache_lock:
+            if _line_states is None:
+                _line_states = RenderCache(
+                    max_size=get_setting('INCREMENTAL_CACHE_MAX_SIZE'))
+    return _line_states
+
+
+@receiver(setting_changed)
+def reset_render_cache(*, setting, **kwargs):
+    global _render_cache, _line_states
+    if setting == 'SNIPPETS':
+        _render_cache = _line_states = None
+
+
+def render(full=True, **inputs):
+    """Render through the cache, skipping Pygments on a hit"""
+    cache = get_render_cache()
+    key = highlighting.render_key(full=full, **inputs)
+    html = cache.get(key)
+    if html is None:
+        html = budgets.render(full=full, **inputs)
+        if budgets.is_final(html):
+            cache.set(key, html)
+    return html
+
+
+def get_line_state_key(language, code_hash):
+    return '{}:{}'.format(language, code_hash)
+
+
+def render_edit(code_hash, previous_hash=None, full=True, **inputs):
+    """Render within the budgets, skipping the cache of rendered HTML.
+
+    Code of ``INCREMENTAL_MIN_LINES`` lines or more, in a language
+    ``incremental`` supports, keeps its line state under its hash
+    ``code_hash``. Code edited from the code hashed ``previous_hash`` is
+    rendered incrementally from the line state of the latter, if found.
+    """
+    language = inputs['language']
+    if (inputs['code'].count('\n') < get_setting('INCREMENTAL_MIN_LINES') or
+            not incremental.supports(language)):
+        return budgets.render(full=full, **inputs)
+    line_states = get_line_states()
+    previous = None
+    if previous_hash is not None:
+        previous = line_states.get(get_line_state_key(language,
+                                                      previous_hash))
+    html, state = budgets.render_incremental(full=full, previous=previous,
+                                             **inputs)
+    if state is not None:
+        line_states.set(get_line_state_key(language, code_hash), state)
+    return html
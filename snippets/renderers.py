@@ -0,0 +1,67 @@
+"""
+Fast renderers of API responses, picked by content negotiation.
+
+``ORJSONRenderer`` replaces DRF's ``JSONRenderer`` with the same output,
+encoded by orjson when it is installed. Indented output, asked for with
+``Accept: application/json; indent=4``, is left to the standard library.
+``MessagePackRenderer`` answers ``Accept: application/msgpack`` and is
+only enabled when msgpack is installed. Values orjson and msgpack don't
+encode themselves, dates included, are converted by DRF's encoder.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from snippets.metrics import timer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+_encode_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` encoding with orjson"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timer('serialize'):
+            if (orjson is None or data is None or self.ensure_ascii or
+                    not self.compact or self.get_indent(
+                        accepted_media_type, renderer_context or {})):
+                return super().render(data, accepted_media_type,
+                                      renderer_context)
+            try:
+                ret = orjson.dumps(data, default=_encode_default,
+                                   option=orjson.OPT_NON_STR_KEYS |
+                                   orjson.OPT_PASSTHROUGH_DATETIME)
+            except TypeError:
+                # Integers over 64 bits, among others.
+                return super().render(data, accepted_media_type,
+                                      renderer_context)
+            # Like JSONRenderer, keep the output a strict JavaScript subset.
+            if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+                ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+                    b'\xe2\x80\xa9', b'\\u2029')
+            return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Renders MessagePack, requires msgpack"""
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timer('serialize'):
+            return msgpack.packb(data, default=_encode_default)
@@ -0,0 +1,126 @@
+"""
+Read replicas and persistent database connections.
+
+``READ_REPLICAS`` names database aliases holding copies of ``default``.
+Views using ``mixins.ReplicaReadMixin`` read from one of them on safe
+methods, picked per request, and write to ``default``. After a user's
+write, their own reads go to ``default`` for ``REPLICA_PIN_SECONDS`` so
+they see it despite the replication lag. Pins are kept in the Django
+cache named by ``REPLICA_PIN_CACHE``, which must be shared by the web
+processes: a local-memory cache is refused by a system check.
+
+A replica that can't be connected to is skipped for
+``REPLICA_RETRY_AFTER`` seconds, its reads go to another replica or to
+``default``. Replica state is per process.
+
+Databases with ``CONN_HEALTH_CHECKS`` in their settings have their
+persistent connections (``CONN_MAX_AGE``) checked when a request starts,
+and closed if they no longer work, so the request opens a new one
+instead of failing.
+"""
+import logging
+import random
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.dispatch import receiver
+
+from snippets.conf import get_setting
+
+logger = logging.getLogger(__name__)
+
+PIN_KEY_PREFIX = 'replica-pin:'
+
+_down = {}
+_down_lock = threading.Lock()
+
+
+class ReplicaRouter:
+    """Write to ``default``, even objects read from a replica, and allow
+    relations between objects of ``default`` and its replicas.
+
+    Reads are routed by the views, so they aren't routed here: objects go
+    on reading from the database they came from.
+    """
+
+    def get_databases(self):
+        return {DEFAULT_DB_ALIAS, *get_setting('READ_REPLICAS')}
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = self.get_databases()
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def is_available(alias):
+    with _down_lock:
+        retry_at = _down.get(alias)
+        if retry_at is None:
+            return True
+        if time.monotonic() < retry_at:
+            return False
+        del _down[alias]
+    return True
+
+
+def mark_down(alias):
+    with _down_lock:
+        _down[alias] = time.monotonic() + get_setting('REPLICA_RETRY_AFTER')
+
+
+def get_replica():
+    """Return the alias of a working replica, or ``default``"""
+    aliases = get_setting('READ_REPLICAS')
+    for alias in random.sample(aliases, len(aliases)):
+        if not is_available(alias):
+            continue
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning('Read replica %s is unavailable, retrying in '
+                           '%ss', alias, get_setting('REPLICA_RETRY_AFTER'))
+            mark_down(alias)
+            continue
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+def get_pin_cache():
+    return caches[get_setting('REPLICA_PIN_CACHE')]
+
+
+def pin(user):
+    """Send ``user``'s reads to ``default`` for a while"""
+    if get_setting('READ_REPLICAS') and user.is_authenticated:
+        get_pin_cache().set(PIN_KEY_PREFIX + str(user.pk), 1,
+                            timeout=get_setting('REPLICA_PIN_SECONDS'))
+
+
+def is_pinned(user):
+    return user.is_authenticated and get_pin_cache().get(
+        PIN_KEY_PREFIX + str(user.pk)) is not None
+
+
+def get_read_database(request):
+    """Database the reads of ``request`` go to"""
+    if not get_setting('READ_REPLICAS') or is_pinned(request.user):
+        return DEFAULT_DB_ALIAS
+    return get_replica()
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Close persistent connections that stopped working"""
+    for connection in connections.all():
+        if (connection.settings_dict.get('CONN_HEALTH_CHECKS') and
+                connection.connection is not None and
+                not connection.in_atomic_block and
+                not connection.is_usable()):
+            connection.close()
@@ -0,0 +1,160 @@
+"""
+Cache of serialized API responses.
+
+Read-only list and detail responses are stored in the Django cache named
+by ``RESPONSE_CACHE``, as the data before rendering, so every renderer
+shares an entry. Each entry belongs to a scope: one object (``snippet:1``)
+or one collection (``snippet-list``). A scope has a random token that is
+part of its entry keys; invalidating the scope replaces the token, which
+orphans the entries at once. Requests read the token before the
+database, so a response computed while its scope is invalidated is
+stored under the old token and never served. Orphaned entries age out of
+the cache's LRU.
+
+Tokens are kept in ``RESPONSE_TOKEN_CACHE`` when it is set, so entries
+can be kept in a local-memory LRU of each process while invalidations
+reach all of them through a shared token cache.
+
+When an entry is missing, the first request takes a short lock in the
+entry's cache and computes it while concurrent requests for the same
+entry wait for the result instead of all querying the database.
+
+Signal handlers in ``snippets.signals`` invalidate the scopes; writes
+that bypass ``Model.save`` must send ``snippets_updated``. Counters are
+per process.
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from snippets.conf import get_setting
+
+KEY_PREFIX = 'response:'
+# Seconds a computing request holds the lock, and waiting requests poll.
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.01
+
+
+def get_cache():
+    alias = get_setting('RESPONSE_CACHE')
+    return caches[alias] if alias else None
+
+
+def get_token_cache():
+    alias = (get_setting('RESPONSE_TOKEN_CACHE') or
+             get_setting('RESPONSE_CACHE'))
+    return caches[alias] if alias else None
+
+
+def object_scope(name, pk):
+    return f'{name}:{pk}'
+
+
+def list_scope(name):
+    return f'{name}-list'
+
+
+class CachedResponse:
+    def __init__(self, status, data, headers):
+        self.status = status
+        self.data = data
+        self.headers = headers
+
+
+class ResponseCache:
+    """Counters and locking around the response cache backend"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.invalidations = 0
+
+    def count(self, counter, amount=1):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def get_token(self, scope):
+        cache = get_token_cache()
+        key = KEY_PREFIX + 'token:' + scope
+        token = cache.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            if not cache.add(key, token, timeout=None):
+                # Invalidated again meanwhile, a fresh token matches no
+                # entry.
+                token = cache.get(key) or uuid.uuid4().hex
+        return token
+
+    def get_key(self, scope, token, variant):
+        digest = hashlib.md5(variant.encode('utf-8')).hexdigest()
+        return f'{KEY_PREFIX}{scope}:{token}:{digest}'
+
+    def get_or_compute(self, scope, variant, compute):
+        """Return the ``CachedResponse`` for ``variant`` of ``scope``,
+        calling ``compute`` on a miss"""
+        cache = get_cache()
+        if cache is None:
+            return compute()
+        key = self.get_key(scope, self.get_token(scope), variant)
+        cached = cache.get(key)
+        if cached is not None:
+            self.count('hits')
+            return cached
+
+        lock_key = key + ':lock'
+        if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            cached = self.wait(cache, key, lock_key)
+            if cached is not None:
+                self.count('waits')
+                return cached
+        self.count('misses')
+        try:
+            result = compute()
+            cache.set(key, result,
+                      timeout=get_setting('RESPONSE_CACHE_TIMEOUT'))
+        finally:
+            cache.delete(lock_key)
+        return result
+
+    def wait(self, cache, key, lock_key):
+        """Wait for the request holding ``lock_key`` to store ``key``"""
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            cached = cache.get(key)
+            if cached is not None or cache.get(lock_key) is None:
+                return cached
+        return None
+
+    def invalidate(self, scopes):
+        scopes = set(scopes)
+        if get_cache() is None or not scopes:
+            return
+        cache = get_token_cache()
+        keys = [KEY_PREFIX + 'token:' + scope for scope in scopes]
+        cache.delete_many(keys)
+        if connection.in_atomic_block:
+            # Responses computed before the commit still saw the old rows.
+            transaction.on_commit(lambda: cache.delete_many(keys))
+        self.count('invalidations', len(scopes))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.waits + self.misses
+            return {
+                'hits': self.hits,
+                'waits': self.waits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': ((self.hits + self.waits) / lookups
+                              if lookups else None),
+            }
+
+
+response_cache = ResponseCache()
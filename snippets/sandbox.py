@@ -0,0 +1,188 @@
+"""
+Processes rendering highlights under a time and memory budget.
+
+Pygments lexers are regular expression state machines, and some of them
+backtrack badly on hostile or just unusual input. A render can't be
+interrupted inside the process running it, so renders run in child
+processes that can be killed.
+
+Like ``highlighting``, this module doesn't depend on Django so the child
+processes don't need it.
+"""
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pipe, Process
+
+from snippets import highlighting
+
+REASON_SIZE = 'size'
+REASON_TIME = 'time'
+REASON_MEMORY = 'memory'
+REASON_CRASH = 'crash'
+
+
+class BudgetExceeded(Exception):
+    """A render went over one of its budgets"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def get_address_space():
+    """Return the size of this process's address space in bytes, or None
+    where it can't be read"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def limit_memory(limit):
+    """Let this process allocate at most ``limit`` more bytes"""
+    try:
+        import resource
+    except ImportError:
+        return
+    size = get_address_space()
+    if size is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    soft = size + limit
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def serve(connection, memory_limit):
+    """Render the inputs received on ``connection``, with the function of
+    ``highlighting`` named along, until it's closed"""
+    # Interrupts are handled by the parent, which kills this process.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_limit:
+        limit_memory(memory_limit)
+    while True:
+        try:
+            function, inputs = connection.recv()
+        except EOFError:
+            return
+        start = time.perf_counter()
+        try:
+            output = getattr(highlighting, function)(**inputs)
+        except MemoryError:
+            result = (REASON_MEMORY, None)
+        except Exception as exc:
+            result = ('error', exc)
+        else:
+            result = ('ok', output)
+        try:
+            connection.send(result + (time.perf_counter() - start,))
+        except MemoryError:
+            return
+        except Exception as exc:
+            # The exception couldn't be pickled.
+            connection.send(('error', RuntimeError(repr(exc)), 0.0))
+
+
+class RenderProcess:
+    def __init__(self, memory_limit):
+        self.connection, child_connection = Pipe()
+        self.process = Process(target=serve,
+                               args=(child_connection, memory_limit),
+                               daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def render(self, inputs, timeout, function='render'):
+        """Return ``(output, seconds)``, or raise the render's exception or
+        ``BudgetExceeded``; the process can't be used after the latter"""
+        try:
+            self.connection.send((function, inputs))
+            if not self.connection.poll(timeout):
+                raise BudgetExceeded(REASON_TIME)
+            status, result, seconds = self.connection.recv()
+        except (EOFError, OSError):
+            raise BudgetExceeded(REASON_CRASH)
+        if status == 'ok':
+            return result, seconds
+        if status == 'error':
+            raise result
+        raise BudgetExceeded(status)
+
+    def kill(self):
+        self.connection.close()
+        if self.process.is_alive():
+            # SIGTERM has no handler in the child, it stops even a render
+            # stuck in a regular expression.
+            self.process.terminate()
+        self.process.join()
+
+
+class RenderSandbox:
+    """Render in ``processes`` child processes.
+
+    Renders taking more than ``timeout`` seconds get their process killed.
+    Processes may allocate ``memory_limit`` bytes over their size when
+    started. Both raise ``BudgetExceeded`` and the process is replaced.
+
+    Each process belongs to one of the sandbox's threads: pass the
+    function calling ``render`` to ``submit``.
+    """
+
+    def __init__(self, processes, timeout=None, memory_limit=None):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.executor = ThreadPoolExecutor(max_workers=processes)
+        self.local = threading.local()
+        self.processes = set()
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, func, *args, **kwargs):
+        """Call ``func`` in one of the sandbox's threads, returning a
+        ``Future``"""
+        return self.executor.submit(func, *args, **kwargs)
+
+    def get_process(self):
+        process = getattr(self.local, 'process', None)
+        if process is None or not process.process.is_alive():
+            if process is not None:
+                self.discard(process)
+            process = self.local.process = RenderProcess(self.memory_limit)
+            with self.lock:
+                self.processes.add(process)
+        return process
+
+    def discard(self, process):
+        process.kill()
+        with self.lock:
+            self.processes.discard(process)
+        self.local.process = None
+
+    def render(self, inputs, function='render'):
+        """Render ``inputs`` with ``function`` of ``highlighting`` in this
+        thread's process, returning ``(output, seconds)``"""
+        process = self.get_process()
+        try:
+            return process.render(inputs, self.timeout, function)
+        except BudgetExceeded:
+            self.discard(process)
+            raise
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            processes = list(self.processes)
+            self.processes.clear()
+        for process in processes:
+            process.kill()
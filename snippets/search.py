@@ -0,0 +1,278 @@
+"""
+Search over snippet titles and code.
+
+Two backends answer the same queries:
+
+* On PostgreSQL, word search is the union of the snippets whose title
+  ``tsvector`` matches and those whose code ``tsvector`` matches, each
+  served by its ``to_tsvector`` GIN index. Substring search is the
+  union of a bare ``ILIKE`` on the title and one on the code, each
+  served by a ``pg_trgm`` GIN index; Django's ``icontains`` compiles to
+  ``UPPER(...) LIKE UPPER(...)``, which those indexes can't serve. The
+  database keeps the indexes up to date by itself.
+* On other databases, word search uses an inverted index kept in the
+  ``SearchToken`` side table: one row per snippet and term, weighted by
+  the number of occurrences (title occurrences count triple). Snippets
+  are re-indexed when ``Snippet.save`` changes their title or code.
+  Substring search falls back to scanning with ``LIKE``.
+
+Word searches require every term to match and are ranked by relevance;
+each result comes with HTML fragments of the code around the matches.
+"""
+import html
+import math
+import re
+
+from django.db import connection
+from django.db.models import (BooleanField, Case, CharField, Count,
+                              ExpressionWrapper, F, FloatField, Func, Sum,
+                              TextField, Value, When)
+from django.db.models.expressions import RawSQL
+from django.db.models.lookups import IContains
+
+from snippets.models import SearchToken, Snippet
+
+MODE_WORDS = 'words'
+MODE_SUBSTRING = 'substring'
+MODES = (MODE_WORDS, MODE_SUBSTRING)
+
+TITLE_WEIGHT = 3
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+INDEX_CHUNK_SIZE = 500
+
+FRAGMENT_CONTEXT = 40
+MAX_FRAGMENT_LENGTH = 160
+MAX_FRAGMENTS = 3
+
+WORD_RE = re.compile(r'\w+')
+
+PG_CODE_VECTOR = "to_tsvector('simple', snippets_codeblob.content)"
+PG_TITLE_VECTOR = "to_tsvector('simple', snippets_snippet.title)"
+
+
+def tokenize(text):
+    """Yield the lowercased terms of ``text``, splitting identifiers on
+    underscores as well"""
+    for word in WORD_RE.findall(text.lower()):
+        parts = [word]
+        if '_' in word:
+            parts.extend(word.split('_'))
+        for part in parts:
+            if MIN_TERM_LENGTH <= len(part) <= MAX_TERM_LENGTH:
+                yield part
+
+
+def get_terms(query):
+    return sorted(set(tokenize(query)))
+
+
+@CharField.register_lookup
+@TextField.register_lookup
+class ILikeContains(IContains):
+    """``icontains`` compiled to a bare ``ILIKE`` on PostgreSQL"""
+    lookup_name = 'ilike_contains'
+
+    def get_rhs_op(self, connection, rhs):
+        if connection.vendor == 'postgresql':
+            return f'ILIKE {rhs}'
+        return connection.operators['icontains'] % rhs
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def get_token_weights(snippet):
+    weights = {}
+    for term in tokenize(snippet.title):
+        weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+    for term in tokenize(snippet.code):
+        weights[term] = weights.get(term, 0) + 1
+    return weights
+
+
+def index_snippets(snippets):
+    """Replace the index entries of ``snippets``"""
+    if uses_postgres():
+        return
+    SearchToken.objects.filter(
+        snippet__in=[snippet.id for snippet in snippets]).delete()
+    SearchToken.objects.bulk_create(
+        (SearchToken(snippet_id=snippet.id, term=term, weight=weight)
+         for snippet in snippets
+         for term, weight in get_token_weights(snippet).items()),
+        batch_size=INDEX_CHUNK_SIZE)
+
+
+def index_snippet_ids(snippet_ids):
+    if uses_postgres():
+        return
+    snippet_ids = list(snippet_ids)
+    for start in range(0, len(snippet_ids), INDEX_CHUNK_SIZE):
+        index_snippets(Snippet.objects.filter(
+            id__in=snippet_ids[start:start + INDEX_CHUNK_SIZE])
+            .select_related('code_blob')
+            .only('id', 'title', 'code_blob', 'code_blob__content'))
+
+
+def rebuild_index():
+    """Index every snippet, in primary key chunks; return the count"""
+    if uses_postgres():
+        return 0
+    SearchToken.objects.all().delete()
+    last_id = 0
+    total = 0
+    while True:
+        chunk = list(Snippet.objects.filter(id__gt=last_id).order_by('id')
+                     .select_related('code_blob')
+                     .only('id', 'title', 'code_blob', 'code_blob__content')
+                     [:INDEX_CHUNK_SIZE])
+        if not chunk:
+            return total
+        index_snippets(chunk)
+        total += len(chunk)
+        last_id = chunk[-1].id
+
+
+def filter_snippets(queryset, language=None, owner=None, prefix=''):
+    if language:
+        queryset = queryset.filter(**{prefix + 'language': language})
+    if owner:
+        queryset = queryset.filter(**{prefix + 'owner__username': owner})
+    return queryset
+
+
+def rank_with_index(terms, language, owner, limit):
+    """Return ``(snippet_id, rank)`` pairs from the inverted index"""
+    frequencies = dict(
+        SearchToken.objects.filter(term__in=terms).values_list('term')
+        .annotate(Count('id')).order_by())
+    if len(frequencies) < len(terms):
+        return []
+    total = Snippet.objects.count()
+    rank = Sum(Case(
+        *[When(term=term, then=ExpressionWrapper(
+            F('weight') * Value(math.log(1 + total / frequency),
+                                output_field=FloatField()),
+            output_field=FloatField()))
+          for term, frequency in frequencies.items()],
+        output_field=FloatField()))
+    tokens = filter_snippets(SearchToken.objects.filter(term__in=terms),
+                             language, owner, prefix='snippet__')
+    return list(
+        tokens.values('snippet_id')
+        .annotate(matched=Count('id'), rank=rank)
+        .filter(matched=len(terms))
+        .order_by('-rank', 'snippet_id')
+        .values_list('snippet_id', 'rank')[:limit])
+
+
+def match_words(query, language, owner):
+    """Return the snippets whose title or code match the words of
+    ``query``, annotated with their full-text ``rank``, on PostgreSQL"""
+    tsquery = "plainto_tsquery('simple', %s)"
+    snippets = filter_snippets(Snippet.objects, language, owner)
+    # A union rather than an OR across the join, so that each side is
+    # served by its own index.
+    title_matches = snippets.filter(RawSQL(
+        f'{PG_TITLE_VECTOR} @@ {tsquery}', [query],
+        output_field=BooleanField()))
+    code_matches = snippets.filter(RawSQL(
+        f'{PG_CODE_VECTOR} @@ {tsquery}', [query],
+        output_field=BooleanField()), code_blob__content__isnull=False)
+    matches = title_matches.order_by().union(code_matches.order_by())
+    # The filter on the content joins the code blob table.
+    return Snippet.objects.filter(
+        id__in=matches.values('id'), code_blob__content__isnull=False,
+    ).annotate(
+        rank=RawSQL(f'ts_rank({PG_CODE_VECTOR}, {tsquery}) + '
+                    f'{TITLE_WEIGHT} * ts_rank({PG_TITLE_VECTOR}, {tsquery})',
+                    [query, query], output_field=FloatField()),
+    ).order_by('-rank', 'id')
+
+
+def rank_with_postgres(query, language, owner, limit):
+    """Return ``(snippet_id, rank)`` pairs from the full-text index"""
+    return list(match_words(query, language, owner)
+                .values_list('id', 'rank')[:limit])
+
+
+def match_substring(query, language, owner):
+    """Return the snippets containing ``query``, annotated with their
+    ``rank``: their trigram similarity on PostgreSQL"""
+    snippets = filter_snippets(Snippet.objects, language, owner)
+    # A union rather than an OR across the join, so that each side is
+    # served by its own index.
+    matches = snippets.filter(title__ilike_contains=query).order_by().union(
+        snippets.filter(code_blob__content__ilike_contains=query).order_by())
+    snippets = Snippet.objects.filter(id__in=matches.values('id'))
+    if uses_postgres():
+        return snippets.annotate(rank=Func(
+            Value(query), F('code_blob__content'), function='word_similarity',
+            output_field=FloatField())).order_by('-rank', 'id')
+    return snippets.annotate(rank=Value(1.0, FloatField())).order_by('id')
+
+
+def rank_substring(query, language, owner, limit):
+    """Return ``(snippet_id, rank)`` pairs of snippets containing
+    ``query``"""
+    return list(match_substring(query, language, owner)
+                .values_list('id', 'rank')[:limit])
+
+
+def get_fragments(text, patterns):
+    """Return escaped excerpts of ``text`` around the first matches of
+    ``patterns``, with the matches wrapped in ``<mark>``"""
+    if not patterns:
+        return []
+    pattern = re.compile('|'.join(patterns), re.IGNORECASE)
+    windows = []
+    for match in pattern.finditer(text):
+        start = max(0, match.start() - FRAGMENT_CONTEXT)
+        end = min(len(text), match.end() + FRAGMENT_CONTEXT)
+        if windows and match.start() < windows[-1][1]:
+            # Nearby matches share a fragment, up to its maximum length.
+            windows[-1][1] = min(end, windows[-1][0] + MAX_FRAGMENT_LENGTH)
+        elif len(windows) == MAX_FRAGMENTS:
+            break
+        else:
+            windows.append([start, end])
+
+    fragments = []
+    for start, end in windows:
+        excerpt = text[start:end]
+        parts = []
+        position = 0
+        for match in pattern.finditer(excerpt):
+            parts.append(html.escape(excerpt[position:match.start()]))
+            parts.append(f'<mark>{html.escape(match.group())}</mark>')
+            position = match.end()
+        parts.append(html.escape(excerpt[position:]))
+        fragments.append(''.join(parts))
+    return fragments
+
+
+def search(query, mode=MODE_WORDS, language=None, owner=None, limit=20):
+    """Return ``(snippet, rank, fragments)`` for the best matches"""
+    if mode == MODE_SUBSTRING:
+        if not query:
+            return []
+        ranked = rank_substring(query, language, owner, limit)
+        patterns = [re.escape(query)]
+    else:
+        terms = get_terms(query)
+        if not terms:
+            return []
+        if uses_postgres():
+            ranked = rank_with_postgres(query, language, owner, limit)
+        else:
+            ranked = rank_with_index(terms, language, owner, limit)
+        patterns = [r'(?<![^\W_]){}(?![^\W_])'.format(re.escape(term))
+                    for term in terms]
+
+    snippets = Snippet.objects.select_related('owner', 'code_blob').in_bulk(
+        [snippet_id for snippet_id, _ in ranked])
+    return [(snippets[snippet_id], rank,
+             get_fragments(snippets[snippet_id].code, patterns))
+            for snippet_id, rank in ranked if snippet_id in snippets]
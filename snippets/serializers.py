@@ -1,9 +1,76 @@
-from rest_framework import serializers
+from operator import attrgetter
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from rest_framework import fields, serializers
+from snippets.metrics import TimedSerializerMixin, timer
 from snippets.models import Snippet, LANGUAGE_CHOICES, STYLE_CHOICES
 from django.contrib.auth.models import User
 
+# Fields whose value is read from an attribute and converted by their
+# ``to_representation`` alone.
+FAST_FIELDS = (fields.ReadOnlyField, fields.CharField, fields.IntegerField,
+               fields.BooleanField, fields.ChoiceField, fields.DateTimeField)
+
+
+class FastListSerializer(serializers.ListSerializer):
+    """
+    List serializer building the output of its child without the per
+    object field machinery of ``Serializer.to_representation``.
+
+    Children with only ``FAST_FIELDS``, and no ``to_representation`` of
+    their own, are serialized by attribute getters and converters built
+    once per list. Objects whose attributes are missing or callable are
+    serialized by the child instead, with its usual errors. Set as
+    ``list_serializer_class`` in the child's ``Meta``.
+    """
+
+    def get_plan(self):
+        """Return ``(name, getter, converter)`` for each readable field of
+        the child, or None if it needs the regular path"""
+        child = self.child
+        if type(child).to_representation not in (
+                serializers.Serializer.to_representation,
+                TimedSerializerMixin.to_representation):
+            return None
+        plan = []
+        for field in child._readable_fields:
+            if (not isinstance(field, FAST_FIELDS) or
+                    isinstance(field, serializers.BaseSerializer) or
+                    field.source == '*'):
+                return None
+            converter = (None if type(field) is fields.ReadOnlyField
+                         else field.to_representation)
+            plan.append((field.field_name,
+                         attrgetter('.'.join(field.source_attrs)), converter))
+        return plan
+
+    def to_representation(self, data):
+        plan = self.get_plan()
+        if plan is None:
+            return super().to_representation(data)
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        represent = self.child.to_representation
+        ret = []
+        with timer('serialize'):
+            for item in iterable:
+                row = {}
+                try:
+                    for name, getter, converter in plan:
+                        value = getter(item)
+                        if callable(value):
+                            raise AttributeError(name)
+                        if value is None or converter is None:
+                            row[name] = value
+                        else:
+                            row[name] = converter(value)
+                except (AttributeError, KeyError, ObjectDoesNotExist):
+                    row = represent(item)
+                ret.append(row)
+        return ret
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     snippets = serializers.PrimaryKeyRelatedField(many=True,
                                                   queryset=Snippet.objects.all())
 
@@ -12,7 +79,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'snippets']
 
 
-class SnippetSerializer(serializers.Serializer):
+class SnippetSerializer(TimedSerializerMixin, serializers.Serializer):
     owner = serializers.ReadOnlyField(source='owner.username')
     id = serializers.IntegerField(read_only=True)
     title = serializers.CharField(required=False, allow_blank=True, max_length=100)
@@ -20,6 +87,10 @@ class SnippetSerializer(serializers.Serializer):
     linenos = serializers.BooleanField(required=False)
     language = serializers.ChoiceField(choices=LANGUAGE_CHOICES, default='python')
     style = serializers.ChoiceField(choices=STYLE_CHOICES, default='friendly')
+    highlight_status = serializers.ReadOnlyField()
+
+    class Meta:
+        list_serializer_class = FastListSerializer
 
     def create(self, validated_data):
         """
@@ -38,3 +109,8 @@ class SnippetSerializer(serializers.Serializer):
         instance.style = validated_data.get('style', instance.style)
         instance.save()
         return instance
+
+
+class SnippetSummarySerializer(SnippetSerializer):
+    """Snippet representation without the code, used by list views"""
+    code = None
@@ -0,0 +1,97 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from django.contrib.auth.models import User
+
+from snippets import search
+from snippets.models import CodeBlob, HighlightBlob, Script, Snippet
+from snippets.response_cache import list_scope, object_scope, response_cache
+
+# Sent after snippets were changed without Snippet.save, e.g. through
+# bulk_update, with the ``ids`` of the changed snippets and the updated
+# ``fields``.
+snippets_updated = Signal()
+# Sent after ``snippets`` were inserted without Snippet.save.
+snippets_created = Signal()
+
+
+def get_snippet_scopes(snippet_ids):
+    return [object_scope('snippet', snippet_id) for snippet_id in snippet_ids
+            ] + [list_scope('snippet')]
+
+
+def get_user_scopes(user_ids):
+    return [object_scope('user', user_id) for user_id in user_ids
+            ] + [list_scope('user')]
+
+
+@receiver(post_save, sender=Snippet)
+def snippet_saved(sender, instance, created, **kwargs):
+    if not created:
+        Script.bump_revisions([instance.id])
+    scopes = get_snippet_scopes([instance.id])
+    if created:
+        # User representations list their snippets.
+        scopes += get_user_scopes([instance.owner_id])
+    response_cache.invalidate(scopes)
+    if getattr(instance, '_search_changed', True):
+        search.index_snippets([instance])
+    code_hash, highlight_hash = getattr(instance, '_replaced_blobs',
+                                        (None, None))
+    if code_hash:
+        CodeBlob.collect([code_hash])
+    if highlight_hash:
+        HighlightBlob.collect([highlight_hash])
+
+
+@receiver(snippets_updated)
+def snippets_bulk_updated(sender, ids, fields, **kwargs):
+    Script.bump_revisions(ids)
+    response_cache.invalidate(get_snippet_scopes(ids))
+    if {'title', 'code_blob'}.intersection(fields):
+        search.index_snippet_ids(ids)
+
+
+@receiver(snippets_created)
+def snippets_bulk_created(sender, snippets, **kwargs):
+    response_cache.invalidate(
+        get_snippet_scopes([]) +
+        get_user_scopes({snippet.owner_id for snippet in snippets}))
+
+
+@receiver(pre_delete, sender=Snippet)
+def snippet_deleting(sender, instance, **kwargs):
+    # Entries are removed by the cascade, remember the scripts before.
+    instance._script_ids = list(
+        instance.script_entries.values_list('script_id', flat=True))
+
+
+@receiver(post_delete, sender=Snippet)
+def snippet_deleted(sender, instance, **kwargs):
+    response_cache.invalidate(get_snippet_scopes([instance.id]) +
+                              get_user_scopes([instance.owner_id]))
+    CodeBlob.collect([instance.code_blob_id])
+    if instance.highlight_blob_id:
+        HighlightBlob.collect([instance.highlight_blob_id])
+    script_ids = getattr(instance, '_script_ids', None)
+    if script_ids:
+        Script.objects.filter(id__in=script_ids).update(
+            revision=F('revision') + 1, updated=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    scopes = get_user_scopes([instance.id])
+    if not created and (update_fields is None or
+                        'username' in update_fields):
+        # Snippet representations include the owner's username.
+        scopes += get_snippet_scopes(
+            instance.snippets.values_list('id', flat=True))
+    response_cache.invalidate(scopes)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    response_cache.invalidate(get_user_scopes([instance.id]))
@@ -0,0 +1,185 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from snippets import highlighting
+from snippets.models import Snippet
+from snippets.render_cache import get_render_cache
+
+ASGI_MIDDLEWARE = [
+    'snippets.metrics.MetricsMiddleware',
+    'snippets.asynchronous.BufferStreamingMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+]
+
+
+@override_settings(ROOT_URLCONF='tutorial.asgi_urls',
+                   MIDDLEWARE=ASGI_MIDDLEWARE)
+class AsyncSnippetViewsTest(TestCase):
+    """Testing the async snippet views served by tutorial.asgi"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.snippet = Snippet.objects.create(owner=self.user,
+                                              code='print(1)')
+        self.client = AsyncClient()
+        self.client.force_login(self.user)
+        get_render_cache().clear()
+
+    async def test_highlight(self):
+        res = await self.client.get(
+            reverse('snippet-highlight', args=[self.snippet.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content.decode(), self.snippet.highlighted)
+        self.assertEqual(res['X-Highlight-Status'], Snippet.HIGHLIGHT_READY)
+        self.assertIn('/styles/friendly.css', res['Link'])
+
+    async def test_highlight_full_document(self):
+        # Django 3.1's AsyncClient ignores query parameters given as data.
+        res = await self.client.get(
+            reverse('snippet-highlight', args=[self.snippet.id]) +
+            '?full=true')
+
+        self.assertEqual(res.content.decode(),
+                         self.snippet.get_highlighted_document())
+
+    @override_settings(SNIPPETS={'HIGHLIGHT_STORAGE': 'document'})
+    async def test_highlight_renders_missing_fragment(self):
+        def create_snippet():
+            snippet = Snippet.objects.create(owner=self.user, code='x = 1',
+                                             title='Before')
+            # The stored document's title no longer matches.
+            Snippet.objects.filter(id=snippet.id).update(title='After')
+            return snippet
+
+        snippet = await sync_to_async(create_snippet)()
+        res = await self.client.get(
+            reverse('snippet-highlight', args=[snippet.id]))
+
+        self.assertEqual(res.content.decode(), highlighting.render(
+            full=False, **dict(snippet.get_render_inputs(), title='After')))
+
+    async def test_highlight_pending(self):
+        snippets = Snippet.objects.filter(id=self.snippet.id)
+        await sync_to_async(snippets.update)(
+            highlight_status=Snippet.HIGHLIGHT_PENDING)
+
+        res = await self.client.get(
+            reverse('snippet-highlight', args=[self.snippet.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res['Retry-After'], '1')
+
+    async def test_highlight_not_found(self):
+        res = await self.client.get(reverse('snippet-highlight', args=[0]))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_create_renders_before_saving(self):
+        cache = get_render_cache()
+        before = cache.stats()
+
+        res = await self.client.post(
+            reverse('snippet-list'),
+            data=json.dumps({'code': 'print(2)', 'language': 'python'}),
+            content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        after = cache.stats()
+        # Rendered by the async view, found in the cache by Snippet.save.
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(res.json()['owner'], 'testuser')
+
+    async def test_update_renders_before_saving(self):
+        before = get_render_cache().stats()
+
+        res = await self.client.patch(
+            reverse('snippet-detail', args=[self.snippet.id]),
+            data=json.dumps({'code': 'print(3)'}),
+            content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['code'], 'print(3)')
+        self.assertEqual(get_render_cache().stats()['hits'] - before['hits'],
+                         1)
+
+    async def test_invalid_create(self):
+        res = await self.client.post(
+            reverse('snippet-list'),
+            data=json.dumps({'code': 'print(2)', 'language': 'unknown'}),
+            content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_list_and_detail(self):
+        res = await self.client.get(reverse('snippet-list'))
+        self.assertEqual(res.json()['results'][0]['id'], self.snippet.id)
+
+        res = await self.client.get(
+            reverse('snippet-detail', args=[self.snippet.id]))
+        self.assertEqual(res.json()['code'], 'print(1)')
+        self.assertIn('ETag', res)
+
+    async def test_export_is_buffered(self):
+        res = await self.client.get(reverse('snippet-export'))
+
+        self.assertFalse(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = res.content.decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['id'], self.snippet.id)
+
+    @override_settings(SNIPPETS={'METRICS_SAMPLE_RATE': 1.0})
+    async def test_metrics(self):
+        res = await self.client.get(
+            reverse('snippet-highlight', args=[self.snippet.id]))
+
+        self.assertRegex(res['Server-Timing'],
+                         r'db;dur=[\d.]+;desc="1 queries"')
+
+    async def test_rejected_writes_are_not_rendered(self):
+        other = await sync_to_async(User.objects.create_user)(
+            username='other', password='testpasswd')
+        before = get_render_cache().stats()
+        body = json.dumps({'code': 'print(4)'})
+
+        res = await AsyncClient().post(reverse('snippet-list'), data=body,
+                                       content_type='application/json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        await sync_to_async(self.client.force_login)(other)
+        res = await self.client.patch(
+            reverse('snippet-detail', args=[self.snippet.id]), data=body,
+            content_type='application/json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.assertEqual(get_render_cache().stats(), before)
+
+    @override_settings(SNIPPETS={'THROTTLE_RATES': {'renders': '2/min'},
+                                 'THROTTLE_CACHE': 'default'})
+    async def test_throttled_writes_are_not_rendered(self):
+        caches['default'].clear()
+        for code in ('print(5)', 'print(6)'):
+            res = await self.client.post(
+                reverse('snippet-list'), data=json.dumps({'code': code}),
+                content_type='application/json')
+            # Charged once, by the check before rendering.
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        before = get_render_cache().stats()
+
+        res = await self.client.post(
+            reverse('snippet-list'), data=json.dumps({'code': 'print(7)'}),
+            content_type='application/json')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(get_render_cache().stats(), before)
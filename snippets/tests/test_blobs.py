@@ -0,0 +1,137 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets.models import CodeBlob, HighlightBlob, Snippet
+from snippets.render_cache import get_render_cache
+
+
+class BlobStorageTest(TestCase):
+    """Testing content-addressed storage of code and highlights"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        get_render_cache().clear()
+
+    def create_snippet(self, **kwargs):
+        kwargs.setdefault('code', 'print(1)\n')
+        return Snippet.objects.create(owner=self.user, **kwargs)
+
+    def test_identical_code_stored_once(self):
+        first = self.create_snippet(title='first')
+        second = self.create_snippet(title='second')
+
+        self.assertEqual(first.code_blob_id, second.code_blob_id)
+        self.assertEqual(first.highlight_blob_id, second.highlight_blob_id)
+        self.assertEqual(CodeBlob.objects.count(), 1)
+        self.assertEqual(HighlightBlob.objects.count(), 1)
+        self.assertEqual(Snippet.objects.get(id=second.id).code, 'print(1)\n')
+
+    def test_identical_code_rendered_once(self):
+        first = self.create_snippet()
+
+        snippet = Snippet(owner=self.user, code='print(1)\n')
+        with mock.patch('snippets.budgets.render') as render:
+            snippet.save()
+
+        render.assert_not_called()
+        self.assertEqual(snippet.highlight_blob_id, first.highlight_blob_id)
+
+    def test_highlights_of_other_snippets_not_reused(self):
+        # Rendered by another Pygments version, say, and not rendered
+        # again yet.
+        first = self.create_snippet()
+        stale = HighlightBlob.from_content('stale')
+        HighlightBlob.store([stale])
+        Snippet.objects.filter(id=first.id).update(highlight_blob=stale)
+        get_render_cache().clear()
+
+        snippet = self.create_snippet()
+
+        self.assertIn('print', snippet.highlighted)
+
+    def test_different_linenos_rendered_separately(self):
+        first = self.create_snippet()
+        second = self.create_snippet(linenos=True)
+
+        self.assertEqual(first.code_blob_id, second.code_blob_id)
+        self.assertNotEqual(first.highlight_blob_id,
+                            second.highlight_blob_id)
+
+    def test_changed_code_collects_old_blobs(self):
+        snippet = self.create_snippet()
+
+        snippet.code = 'print(2)\n'
+        snippet.save()
+
+        self.assertEqual(list(CodeBlob.objects.values_list(
+            'content', flat=True)), ['print(2)\n'])
+        self.assertEqual(HighlightBlob.objects.count(), 1)
+
+    def test_shared_blobs_kept_until_last_snippet_deleted(self):
+        first = self.create_snippet()
+        second = self.create_snippet()
+
+        first.delete()
+        self.assertEqual(CodeBlob.objects.count(), 1)
+        self.assertEqual(HighlightBlob.objects.count(), 1)
+
+        second.delete()
+        self.assertEqual(CodeBlob.objects.count(), 0)
+        self.assertEqual(HighlightBlob.objects.count(), 0)
+
+    def test_store_inserts_blobs_collected_meanwhile(self):
+        blob = CodeBlob.from_content('print(1)\n')
+        bulk_create = CodeBlob.objects.bulk_create
+        calls = []
+
+        def collected_first(*args, **kwargs):
+            # The first insert conflicts with a blob collected right after.
+            calls.append(args)
+            if len(calls) > 1:
+                return bulk_create(*args, **kwargs)
+            return []
+
+        with mock.patch.object(CodeBlob.objects, 'bulk_create',
+                               collected_first):
+            CodeBlob.store([blob])
+
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(CodeBlob.objects.filter(hash=blob.hash).exists())
+        self.assertFalse(blob._state.adding)
+
+    def test_collect_blobs_command(self):
+        snippet = self.create_snippet()
+        CodeBlob.store([CodeBlob.from_content('orphan')])
+        # Queryset updates don't collect the replaced blob.
+        blob = HighlightBlob.from_content('other')
+        HighlightBlob.store([blob])
+        replaced = snippet.highlight_blob_id
+        Snippet.objects.filter(id=snippet.id).update(highlight_blob=blob)
+
+        out = StringIO()
+        call_command('collect_blobs', stdout=out)
+
+        self.assertIn('Deleted 1 unreferenced code blob rows', out.getvalue())
+        self.assertEqual(CodeBlob.objects.count(), 1)
+        self.assertFalse(HighlightBlob.objects.filter(hash=replaced).exists())
+        self.assertTrue(HighlightBlob.objects.filter(hash=blob.hash).exists())
+
+    def test_api_representation_unchanged(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        snippet = self.create_snippet(title='Title')
+
+        res = client.get(reverse('snippet-detail', args=[snippet.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['code'], 'print(1)\n')
+        self.assertNotIn('code_blob', res.data)
+        self.assertNotIn('highlight_blob', res.data)
@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from snippets import budgets, highlighting
+from snippets.metrics import registry
+from snippets.sandbox import RenderSandbox
+
+INPUTS = {'code': 'print(1)\n', 'language': 'python', 'style': 'friendly',
+          'linenos': False, 'title': '', 'full': False}
+
+
+def slow_render(code, language, *args, _render=highlighting.render,
+                **kwargs):
+    if language != 'text':
+        import time
+        time.sleep(5)
+    return _render(code, language, *args, **kwargs)
+
+
+def failing_render(*args, **kwargs):
+    raise ValueError('broken lexer')
+
+
+class RenderBudgetsTest(TestCase):
+    """Testing highlight rendering under resource budgets"""
+
+    def setUp(self):
+        self.stats = budgets.RenderStats()
+        patcher = mock.patch('snippets.budgets.render_stats', self.stats)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render_within_budgets(self):
+        html = budgets.render(**INPUTS)
+
+        self.assertEqual(html, highlighting.render(**INPUTS))
+        self.assertTrue(budgets.is_final(html))
+        entry = self.stats.stats()['languages']['python']
+        self.assertEqual(entry['renders'], 1)
+        self.assertEqual(entry['exceeded'], {})
+
+    @override_settings(SNIPPETS={'RENDER_MAX_SIZE': 16,
+                                 'RENDER_SLOW_MAX_SIZE': 4})
+    def test_size_budget_renders_plain_text(self):
+        inputs = dict(INPUTS, code='x = 1\n' * 10)
+        with self.assertLogs('snippets.budgets', level='WARNING'):
+            html = budgets.render(**inputs)
+
+        self.assertEqual(html, highlighting.render_plain(**inputs))
+        self.assertEqual(html.reason, 'size')
+        self.assertTrue(budgets.is_final(html))
+        self.assertEqual(self.stats.stats()['slow'], ['python'])
+        self.assertEqual(budgets.get_size_budget('python'), 4)
+        self.assertEqual(budgets.get_size_budget('ruby'), 16)
+
+    def test_time_budget_kills_the_render(self):
+        # Processes started after patching run the slow render.
+        with mock.patch('snippets.highlighting.render', slow_render):
+            with RenderSandbox(processes=1, timeout=0.5) as sandbox, \
+                    self.assertLogs('snippets.budgets', level='WARNING'):
+                html = budgets.submit(INPUTS, sandbox).result()
+                self.assertEqual(sandbox.processes, set())
+        self.assertEqual(html, highlighting.render_plain(**INPUTS))
+        self.assertEqual(html.reason, 'time')
+        self.assertFalse(budgets.is_final(html))
+        self.assertEqual(
+            self.stats.stats()['languages']['python']['exceeded'],
+            {'time': 1})
+
+    def test_process_is_replaced_after_exceeding(self):
+        with RenderSandbox(processes=1, timeout=0.5) as sandbox:
+            with mock.patch('snippets.highlighting.render', slow_render), \
+                    self.assertLogs('snippets.budgets', level='WARNING'):
+                budgets.submit(INPUTS, sandbox).result()
+            # The replacement process starts with the regular render.
+            html = budgets.submit(INPUTS, sandbox).result()
+        self.assertEqual(html, highlighting.render(**INPUTS))
+
+    def test_render_errors_propagate(self):
+        with mock.patch('snippets.highlighting.render', failing_render):
+            with RenderSandbox(processes=1, timeout=5) as sandbox:
+                future = budgets.submit(INPUTS, sandbox)
+                with self.assertRaisesRegex(ValueError, 'broken lexer'):
+                    future.result()
+        self.assertEqual(self.stats.stats()['languages'], {})
+
+    def test_stats_endpoint(self):
+        budgets.render(**INPUTS)
+
+        res = self.client.get(reverse('render-budget-stats'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['languages']['python']['renders'], 1)
+        self.assertEqual(res.json()['slow'], [])
+
+    def test_stats_endpoint_is_local_only(self):
+        res = self.client.get(reverse('render-budget-stats'),
+                              REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_metrics_export(self):
+        budgets.render(**INPUTS)
+
+        exported = registry.export()
+
+        self.assertIn('snippets_render_duration_seconds_count'
+                      '{language="python"}', exported)
+        self.assertIn('snippets_render_budget_exceeded_total', exported)
@@ -0,0 +1,192 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets.models import Script, Snippet
+
+BULK_URL = reverse('snippet-bulk')
+
+
+class BulkSnippetsTest(TestCase):
+    """Testing bulk creation, update and deletion of snippets"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.client.force_authenticate(user=self.user)
+
+    def test_requires_authentication(self):
+        res = APIClient().post(BULK_URL, [{'code': 'x = 1'}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_create_from_json(self):
+        items = [{'code': f'x = {i}', 'language': 'python'}
+                 for i in range(5)]
+
+        res = self.client.post(BULK_URL, items, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        results = res.data['results']
+        self.assertEqual([r['status'] for r in results], [201] * 5)
+        snippets = Snippet.objects.filter(owner=self.user).order_by('id')
+        self.assertEqual([s.id for s in snippets], [r['id'] for r in results])
+        for snippet in snippets:
+            self.assertEqual(snippet.highlight_status,
+                             Snippet.HIGHLIGHT_READY)
+            self.assertIn('<span', snippet.highlighted)
+            self.assertEqual(snippet.revision, 1)
+
+    def test_create_from_ndjson(self):
+        body = '\n'.join(json.dumps({'code': f'y = {i}'}) for i in range(3))
+
+        res = self.client.post(BULK_URL, body,
+                               content_type='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(Snippet.objects.count(), 3)
+
+    def test_invalid_ndjson_line(self):
+        res = self.client.post(BULK_URL, '{"code": "a"}\n{oops',
+                               content_type='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reports_errors_per_item(self):
+        items = [{'code': 'ok'}, {'language': 'python'}, 'nope',
+                 {'code': 'ok', 'language': 'no-such-language'}]
+
+        res = self.client.post(BULK_URL, items, format='json')
+
+        results = res.data['results']
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3])
+        self.assertEqual([r['status'] for r in results],
+                         [201, 400, 400, 400])
+        self.assertIn('code', results[1]['errors'])
+        self.assertIn('language', results[3]['errors'])
+        self.assertEqual(Snippet.objects.count(), 1)
+
+    def test_rejects_object_body(self):
+        res = self.client.post(BULK_URL, {'code': 'x'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rejects_scalar_body(self):
+        for body in ('5', 'null', 'true', '"code"'):
+            res = self.client.post(BULK_URL, body,
+                                   content_type='application/json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(res.json(),
+                             {'detail': 'Expected a list of items.'})
+
+    @override_settings(SNIPPETS={'BULK_MAX_ITEMS': 2})
+    def test_writes_require_content_length(self):
+        res = self.client.post(BULK_URL, [{'code': 'x = 1'}], format='json',
+                               CONTENT_LENGTH='')
+
+        self.assertEqual(res.status_code, status.HTTP_411_LENGTH_REQUIRED)
+        self.assertFalse(Snippet.objects.exists())
+
+    def test_item_limit(self):
+        items = [{'code': str(i)} for i in range(4)]
+
+        res = self.client.post(BULK_URL, items, format='json')
+
+        results = res.data['results']
+        self.assertEqual([r['status'] for r in results], [201, 201, 413])
+        self.assertEqual(Snippet.objects.count(), 2)
+
+    @override_settings(SNIPPETS={'HIGHLIGHT_MODE': 'deferred'})
+    def test_create_deferred(self):
+        self.client.post(BULK_URL, [{'code': 'x = 1'}], format='json')
+
+        snippet = Snippet.objects.get()
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_PENDING)
+        self.assertEqual(snippet.highlighted, '')
+
+    def test_update(self):
+        snippet = Snippet.objects.create(owner=self.user, code='a = 1')
+        other = Snippet.objects.create(owner=self.user, code='b = 2')
+        script = Script.objects.create(owner=self.user,
+                                       snippets=f'{snippet.id}')
+        revision = script.revision
+
+        res = self.client.patch(BULK_URL, [
+            {'id': snippet.id, 'code': 'a = 10'},
+            {'id': other.id, 'title': 'renamed'},
+        ], format='json')
+
+        self.assertEqual([r['status'] for r in res.data['results']],
+                         [200, 200])
+        snippet.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(snippet.code, 'a = 10')
+        self.assertIn('10', snippet.highlighted)
+        self.assertEqual(snippet.revision, 2)
+        self.assertEqual(other.title, 'renamed')
+        script.refresh_from_db()
+        self.assertGreater(script.revision, revision)
+
+    def test_put_requires_all_fields(self):
+        snippet = Snippet.objects.create(owner=self.user, code='a = 1')
+
+        res = self.client.put(BULK_URL, [{'id': snippet.id, 'title': 't'}],
+                              format='json')
+
+        self.assertEqual(res.data['results'][0]['status'], 400)
+        self.assertIn('code', res.data['results'][0]['errors'])
+
+    def test_update_checks_ownership(self):
+        other_user = User.objects.create_user(username='other',
+                                              password='testpasswd')
+        theirs = Snippet.objects.create(owner=other_user, code='a = 1')
+
+        res = self.client.patch(BULK_URL, [
+            {'id': theirs.id, 'code': 'hacked'},
+            {'id': 0, 'code': 'missing'},
+        ], format='json')
+
+        self.assertEqual([r['status'] for r in res.data['results']],
+                         [403, 404])
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.code, 'a = 1')
+
+    def test_rejects_invalid_ids(self):
+        # True == 1 must not find this one.
+        snippet = Snippet.objects.create(id=1, owner=self.user, code='a = 1')
+
+        res = self.client.patch(BULK_URL, [
+            {'id': True, 'title': 'renamed'},
+            {'id': '1', 'title': 'renamed'},
+            {'title': 'renamed'},
+        ], format='json')
+        self.assertEqual([r['status'] for r in res.data['results']],
+                         [400, 400, 400])
+        self.assertIn('id', res.data['results'][0]['errors'])
+
+        res = self.client.delete(BULK_URL, [True, [1], {'id': False}],
+                                 format='json')
+        self.assertEqual([r['status'] for r in res.data['results']],
+                         [400, 400, 400])
+
+        snippet.refresh_from_db()
+        self.assertEqual(snippet.title, '')
+
+    def test_delete(self):
+        mine = Snippet.objects.create(owner=self.user, code='a = 1')
+        other_user = User.objects.create_user(username='other',
+                                              password='testpasswd')
+        theirs = Snippet.objects.create(owner=other_user, code='b = 2')
+
+        res = self.client.delete(BULK_URL, [mine.id, {'id': theirs.id}],
+                                 format='json')
+
+        self.assertEqual([r['status'] for r in res.data['results']],
+                         [204, 403])
+        self.assertEqual(list(Snippet.objects.all()), [theirs])
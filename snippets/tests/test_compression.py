@@ -0,0 +1,94 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from snippets import compression, highlighting
+from snippets.models import HighlightBlob, Snippet
+
+CODE = 'def add(a, b):\n    return a + b\n' * 4
+
+
+class CompressionTest(TestCase):
+    """Testing the codecs of compressed text"""
+
+    def render(self, code=CODE):
+        return highlighting.render(code, 'python', 'friendly', False, '',
+                                   full=False)
+
+    def test_round_trip(self):
+        html = self.render()
+        for dictionary in (None, 'highlight-1'):
+            data = compression.compress(html, dictionary)
+            self.assertTrue(compression.is_compressed(data))
+            self.assertLess(len(data), len(html))
+            self.assertEqual(compression.decompress(data), html)
+
+    def test_short_text_stored_plain(self):
+        data = compression.compress('é')
+
+        self.assertEqual(data, b'\x00\x00\xc3\xa9')
+        self.assertEqual(compression.decompress(data), 'é')
+
+    def test_uncompressed_text_read_as_is(self):
+        self.assertEqual(compression.decompress(b'<pre>x</pre>'),
+                         '<pre>x</pre>')
+        self.assertEqual(compression.decompress('<pre>x</pre>'),
+                         '<pre>x</pre>')
+
+    def test_dictionary_improves_highlights(self):
+        html = self.render('x = 1\n')
+
+        self.assertLess(len(compression.compress(html, 'highlight-1')),
+                        len(compression.compress(html)))
+
+    def test_build_dictionary_ends_with_most_valuable(self):
+        samples = ['<b>a</b><i>rare</i>', '<b>a</b>']
+
+        dictionary = compression.build_dictionary(samples)
+
+        self.assertEqual(dictionary, b'<b></b>')
+
+
+class CompressedHighlightTest(TestCase):
+    """Testing compressed storage of highlights"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.snippet = Snippet.objects.create(owner=self.user, code=CODE)
+        self.html = self.snippet.highlighted
+
+    def test_stored_compressed(self):
+        stored = HighlightBlob.objects.values_list('content', flat=True).get()
+
+        self.assertTrue(compression.is_compressed(stored))
+        self.assertLess(len(stored), len(self.html))
+        self.assertEqual(Snippet.objects.get().highlighted, self.html)
+
+    def test_decompressed_when_read(self):
+        with mock.patch('snippets.compression.decompress',
+                        wraps=compression.decompress) as decompress:
+            snippet = Snippet.objects.select_related('highlight_blob').get()
+            decompress.assert_not_called()
+
+            self.assertEqual(snippet.highlighted, self.html)
+            self.assertEqual(snippet.highlighted, self.html)
+            decompress.assert_called_once()
+
+    def test_list_view_does_not_decompress(self):
+        client = APIClient()
+
+        with mock.patch('snippets.compression.decompress') as decompress:
+            res = client.get(reverse('snippet-list'))
+
+        self.assertEqual(len(res.data['results']), 1)
+        decompress.assert_not_called()
+
+    def test_uncompressed_rows_readable(self):
+        # Bytes are stored as they are, like rows written before.
+        HighlightBlob.objects.update(content=self.html.encode('utf-8'))
+
+        self.assertEqual(Snippet.objects.get().highlighted, self.html)
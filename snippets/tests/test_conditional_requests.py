@@ -0,0 +1,106 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets.models import Script, Snippet
+
+
+def get_snippet_detail_url(pk):
+    """Return snippet detail url"""
+    return reverse('snippet-detail', args=[pk])
+
+
+def get_script_detail_url(pk):
+    """Return script detail url"""
+    return reverse('script-detail', args=[pk])
+
+
+class ConditionalRequestTest(TestCase):
+    """Testing ETag and Last-Modified handling of detail views"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.client.force_authenticate(user=self.user)
+        self.snippet = Snippet.objects.create(owner=self.user,
+                                              code='print(1)')
+
+    def test_detail_sets_validators(self):
+        res = self.client.get(get_snippet_detail_url(self.snippet.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['ETag'],
+                         f'"{self.snippet.id}-{self.snippet.revision}"')
+        self.assertIn('Last-Modified', res)
+
+    def test_if_none_match_returns_not_modified(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_if_modified_since_returns_not_modified(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        last_modified = self.client.get(url)['Last-Modified']
+
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_update_changes_etag(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.patch(url, {'code': 'print(2)'},
+                                HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_stale_if_match_is_rejected(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        etag = self.client.get(url)['ETag']
+        self.client.patch(url, {'code': 'print(2)'})
+
+        res = self.client.patch(url, {'code': 'print(3)'},
+                                HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.snippet.refresh_from_db()
+        self.assertEqual(self.snippet.code, 'print(2)')
+
+    def test_stale_if_match_blocks_delete(self):
+        url = get_snippet_detail_url(self.snippet.id)
+
+        res = self.client.delete(url, HTTP_IF_MATCH='"stale"')
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertTrue(Snippet.objects.filter(id=self.snippet.id).exists())
+
+    def test_script_etag_follows_referenced_snippets(self):
+        script = Script.objects.create(owner=self.user, name='TestScript',
+                                       snippets=f'{self.snippet.id}')
+        url = get_script_detail_url(script.id)
+        etag = self.client.get(url)['ETag']
+
+        self.snippet.code = 'print(2)'
+        self.snippet.save()
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['snippets_expanded'],
+                         {self.snippet.id: 'print(2)'})
+
+        etag = res['ETag']
+        self.snippet.delete()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
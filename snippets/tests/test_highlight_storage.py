@@ -0,0 +1,131 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets import highlighting
+from snippets.models import Snippet
+from snippets.render_cache import get_render_cache
+
+
+def get_highlight_url(pk):
+    """Return snippet highlight url"""
+    return reverse('snippet-highlight', args=[pk])
+
+
+class HighlightStorageTest(TestCase):
+    """Testing compact storage of highlighted snippets"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        get_render_cache().clear()
+
+    def create_snippet(self, **kwargs):
+        kwargs.setdefault('code', 'print(1)\n')
+        kwargs.setdefault('title', 'Title')
+        kwargs.setdefault('linenos', True)
+        return Snippet.objects.create(owner=self.user, **kwargs)
+
+    def render_document(self, snippet):
+        return highlighting.render(full=True, **snippet.get_render_inputs())
+
+    def test_fragment_stored_by_default(self):
+        snippet = self.create_snippet()
+
+        self.assertEqual(snippet.highlight_format, Snippet.FORMAT_FRAGMENT)
+        self.assertTrue(snippet.highlighted.startswith('<table'))
+        self.assertNotIn('<style', snippet.highlighted)
+
+    def test_document_joined_at_read_time(self):
+        snippet = self.create_snippet(style='monokai')
+
+        self.assertEqual(snippet.get_highlighted_document(),
+                         self.render_document(snippet))
+
+    @override_settings(SNIPPETS={'HIGHLIGHT_STORAGE': 'document'})
+    def test_document_storage_mode(self):
+        snippet = self.create_snippet()
+
+        self.assertEqual(snippet.highlight_format, Snippet.FORMAT_DOCUMENT)
+        self.assertEqual(snippet.highlighted, self.render_document(snippet))
+        self.assertEqual(snippet.get_highlighted_fragment(),
+                         highlighting.render(full=False,
+                                             **snippet.get_render_inputs()))
+
+    def test_highlight_endpoint_links_stylesheet(self):
+        snippet = self.create_snippet(style='monokai')
+
+        res = self.client.get(get_highlight_url(snippet.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content.decode(), snippet.highlighted)
+        self.assertIn('/styles/monokai.css?v=', res['Link'])
+
+    def test_highlight_endpoint_full_document(self):
+        snippet = self.create_snippet()
+
+        res = self.client.get(get_highlight_url(snippet.id), {'full': 'true'})
+
+        self.assertEqual(res.content.decode(), self.render_document(snippet))
+
+    def test_stylesheet_endpoint(self):
+        res = self.client.get(reverse('stylesheet', args=['monokai']))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/css')
+        self.assertIn('max-age=31536000', res['Cache-Control'])
+        self.assertIn('.highlight', res.content.decode())
+
+        res = self.client.get(reverse('stylesheet', args=['monokai']),
+                              HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unknown_stylesheet(self):
+        res = self.client.get(reverse('stylesheet', args=['no-such-style']))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class HighlightMigrationTest(TransactionTestCase):
+    """Testing the migration to fragment storage"""
+
+    migrate_from = [('snippets', '0005_snippet_highlight_status')]
+    migrate_to = [('snippets', '0006_snippet_highlight_format')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_migration_compacts_documents(self):
+        old_apps = self.migrate(self.migrate_from)
+        inputs = Snippet(code='print(1)\n', title='Title',
+                         linenos=True).get_render_inputs()
+        document = highlighting.render(full=True, **inputs)
+        owner = old_apps.get_model('auth', 'User').objects.create(
+            username='testuser')
+        old_apps.get_model('snippets', 'Snippet').objects.create(
+            owner_id=owner.id, highlighted=document, **inputs)
+
+        with self.assertLogs('snippets.migrations', level='INFO') as logs:
+            new_apps = self.migrate(self.migrate_to)
+
+        saved = len(document) - len(highlighting.to_fragment(
+            document, inputs['style'], inputs['title']))
+        self.assertEqual(logs.output, [
+            'INFO:snippets.migrations:Compacted 1 snippets, saving {} '
+            'characters.'.format(saved)])
+        snippet = new_apps.get_model('snippets', 'Snippet').objects.get()
+        self.assertEqual(snippet.highlight_format, Snippet.FORMAT_FRAGMENT)
+        self.assertEqual(highlighting.to_document(
+            snippet.highlighted, snippet.style, snippet.title), document)
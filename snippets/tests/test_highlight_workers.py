@@ -0,0 +1,122 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets import highlighting
+from snippets.models import Snippet
+from snippets.render_cache import get_render_cache
+from snippets.workers import HighlightWorker
+
+
+DEFERRED = {'HIGHLIGHT_MODE': 'deferred'}
+
+
+def get_highlight_url(pk):
+    """Return snippet highlight url"""
+    return reverse('snippet-highlight', args=[pk])
+
+
+def slow_render(code, language, *args, _render=highlighting.render,
+                **kwargs):
+    # Plain text fallbacks render normally.
+    if language != 'text':
+        import time
+        time.sleep(5)
+    return _render(code, language, *args, **kwargs)
+
+
+@override_settings(SNIPPETS=DEFERRED)
+class DeferredHighlightTest(TestCase):
+    """Testing deferred highlight rendering"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.client.force_authenticate(user=self.user)
+        get_render_cache().clear()
+
+    def create_snippet(self, **kwargs):
+        kwargs.setdefault('code', 'print(1)')
+        return Snippet.objects.create(owner=self.user, **kwargs)
+
+    def test_saving_queues_snippet(self):
+        snippet = self.create_snippet()
+
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_PENDING)
+        self.assertEqual(snippet.highlighted, '')
+
+    def test_api_reports_pending_status(self):
+        res = self.client.post(reverse('snippet-list'), {'code': 'print(1)'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['highlight_status'],
+                         Snippet.HIGHLIGHT_PENDING)
+
+        res = self.client.get(get_highlight_url(res.data['id']))
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res['Retry-After'], '1')
+
+    def test_worker_renders_pending_snippets(self):
+        snippet = self.create_snippet()
+
+        with HighlightWorker(concurrency=1) as worker:
+            self.assertEqual(worker.run_once(), 1)
+            self.assertEqual(worker.run_once(), 0)
+
+        snippet.refresh_from_db()
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_READY)
+        self.assertIn('print', snippet.highlighted)
+        res = self.client.get(get_highlight_url(snippet.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_worker_retries_then_fails(self):
+        snippet = self.create_snippet()
+        Snippet.objects.filter(id=snippet.id).update(language='no-such-lexer')
+
+        with HighlightWorker(concurrency=1, retries=1) as worker, \
+                self.assertLogs('snippets.workers', level='ERROR'):
+            worker.run_once()
+            snippet.refresh_from_db()
+            self.assertEqual(snippet.highlight_status,
+                             Snippet.HIGHLIGHT_PENDING)
+            worker.run_once()
+
+        snippet.refresh_from_db()
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_FAILED)
+        self.assertEqual(snippet.highlight_attempts, 2)
+
+    def test_worker_enforces_time_budget(self):
+        snippet = self.create_snippet()
+
+        with mock.patch('snippets.highlighting.render', slow_render):
+            with HighlightWorker(concurrency=1, retries=0,
+                                 time_budget=0.5) as worker, \
+                    self.assertLogs('snippets.budgets', level='WARNING'):
+                worker.run_once()
+
+        snippet.refresh_from_db()
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_READY)
+        self.assertEqual(snippet.highlighted, highlighting.render_plain(
+            full=False, **snippet.get_render_inputs()))
+        # Marked to be rendered again, and not cached meanwhile.
+        self.assertTrue(snippet.highlight_fallback)
+        self.assertIsNone(get_render_cache().get(highlighting.render_key(
+            full=False, **snippet.get_render_inputs())))
+
+    def test_edit_during_rendering_is_not_overwritten(self):
+        snippet = self.create_snippet()
+        worker = HighlightWorker(concurrency=1)
+        (snippet_id, claimed_at), = worker.claim(1)
+
+        snippet.code = 'print(2)'
+        snippet.save()
+        worker.finish(snippet, claimed_at, '<stale>')
+
+        snippet.refresh_from_db()
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_PENDING)
+        self.assertEqual(snippet.highlighted, '')
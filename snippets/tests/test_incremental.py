@@ -0,0 +1,116 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from hypothesis import given, settings, strategies as st
+
+from snippets import budgets, highlighting, incremental
+from snippets.models import Snippet
+from snippets.render_cache import get_line_states
+
+SAMPLES = {
+    'python': 'def f(x):\n    """Doc\n    string"""\n    return x  # ok\n',
+    'javascript': 'var s = `a\n${b}`;\n/* multi\nline */\nf("x");\n',
+    'html': '<div class="a">\n<!-- note\n-->\n<script>\nvar x;\n</script>\n',
+    'sql': "SELECT 'a\nb' FROM t; -- c\n/* x\n*/ WHERE a = 1;\n",
+    'bash': 'cat <<EOF\nhello $x\nEOF\necho "a\nb" # c\n',
+    'css': 'a { color: red; }\n/* a\nb */\nb { margin: 0 }\n',
+    'go': 'func f() {\n\treturn `raw\nstring`\n}\n// done\n',
+    'rust': 'fn f() {\n    let s = r#"raw\n"#;\n    /* a */ }\n',
+}
+# Fragments opening and closing the constructs spanning lines.
+FRAGMENTS = ['"""', "'", '"', '`', '/*', '*/', '<!--', '-->', '#', '//',
+             '\n', '{', '}', '<', '>', 'EOF', '\\', '$', ' ', 'x', '\t',
+             '\r\n']
+INPUTS = {'style': 'friendly', 'linenos': False, 'title': '', 'full': False}
+
+
+@st.composite
+def edits(draw):
+    """Return a language and versions of its sample, each edited from the
+    previous one"""
+    language = draw(st.sampled_from(sorted(SAMPLES)))
+    code = SAMPLES[language] * draw(st.integers(1, 4))
+    versions = [code]
+    for _ in range(draw(st.integers(1, 5))):
+        start = draw(st.integers(0, len(code)))
+        end = draw(st.integers(start, min(len(code), start + 20)))
+        text = ''.join(draw(st.lists(st.sampled_from(FRAGMENTS),
+                                     max_size=4)))
+        code = code[:start] + text + code[end:]
+        versions.append(code)
+    return language, versions
+
+
+class IncrementalRenderTest(SimpleTestCase):
+    """Testing that incremental renders match full renders"""
+
+    @settings(max_examples=150, deadline=None)
+    @given(edits())
+    def test_matches_full_render(self, edit):
+        language, versions = edit
+        state = None
+        for code in versions:
+            html, state = incremental.render(code, language,
+                                             previous=state, **INPUTS)
+            self.assertEqual(html, highlighting.render(code, language,
+                                                       **INPUTS))
+
+    def test_reuses_unchanged_lines(self):
+        lines = ['x{} = {}\n'.format(i, i) for i in range(100)]
+        _, previous = incremental.render(''.join(lines), 'python', **INPUTS)
+        lines[50] = 'x50 = "edited"\n'
+        formatted = []
+
+        def format_lines(lexing, _format=incremental.Lexing.format_lines):
+            html = _format(lexing)
+            formatted.extend(html)
+            return html
+
+        with mock.patch.object(incremental.Lexing, 'format_lines',
+                               format_lines):
+            _, state = incremental.render(''.join(lines), 'python',
+                                          previous=previous, **INPUTS)
+
+        self.assertLess(len(formatted), 5)
+        self.assertIs(state.html[0], previous.html[0])
+        self.assertIs(state.html[99], previous.html[99])
+        self.assertIsNot(state.html[50], previous.html[50])
+
+    def test_unsupported_lexers(self):
+        self.assertTrue(incremental.supports('python'))
+        # Lexers with callbacks of their own.
+        self.assertFalse(incremental.supports('c'))
+        self.assertFalse(incremental.supports('php'))
+
+
+@override_settings(SNIPPETS={'INCREMENTAL_MIN_LINES': 10})
+class SnippetIncrementalRenderTest(TestCase):
+    """Testing that edited snippets are rendered incrementally"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        get_line_states().clear()
+
+    def test_edit_renders_from_previous_line_state(self):
+        code = ''.join('x{} = {}\n'.format(i, i) for i in range(50))
+        snippet = Snippet.objects.create(owner=self.user, code=code)
+        snippet = Snippet.objects.get(id=snippet.id)
+        snippet.code = code.replace('x7 = 7', 'x7 = "seven"')
+        with mock.patch('snippets.budgets.render_incremental',
+                        wraps=budgets.render_incremental) as render:
+            snippet.save()
+
+        self.assertIsNotNone(render.call_args[1]['previous'])
+        self.assertEqual(snippet.highlighted, highlighting.render(
+            snippet.code, 'python', 'friendly', False, '', full=False))
+
+    def test_unsupported_and_short_code_render_fully(self):
+        with mock.patch('snippets.budgets.render_incremental') as render:
+            Snippet.objects.create(owner=self.user, code='int x;\n' * 50,
+                                   language='c')
+            Snippet.objects.create(owner=self.user, code='x = 1\n')
+
+        render.assert_not_called()
+        self.assertEqual(get_line_states().stats()['entries'], 0)
@@ -0,0 +1,118 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from snippets.metrics import Registry, timer
+from snippets.models import Script, Snippet
+
+SAMPLED = {'METRICS_SAMPLE_RATE': 1.0}
+UNSAMPLED = {'METRICS_SAMPLE_RATE': 0.0}
+
+
+def parse_server_timing(header):
+    """Map each Server-Timing metric to its parameters"""
+    timings = {}
+    for entry in header.split(','):
+        name, *params = entry.strip().split(';')
+        timings[name] = dict(param.split('=', 1) for param in params)
+    return timings
+
+
+class MetricsMiddlewareTest(TestCase):
+    """Testing per-request performance metrics"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.client.force_authenticate(user=self.user)
+
+    @override_settings(SNIPPETS=SAMPLED)
+    def test_server_timing_breakdown(self):
+        snippet = Snippet.objects.create(owner=self.user, code='print(1)')
+        script = Script.objects.create(owner=self.user,
+                                       snippets=str(snippet.id))
+
+        res = self.client.get(reverse('script-detail', args=[script.id]))
+
+        timings = parse_server_timing(res['Server-Timing'])
+        self.assertEqual(set(timings),
+                         {'db', 'render', 'serialize', 'total'})
+        self.assertRegex(timings['db']['desc'], r'^"[1-9]\d* queries"$')
+        self.assertGreater(float(timings['serialize']['dur']), 0)
+        self.assertGreaterEqual(float(timings['total']['dur']),
+                                float(timings['serialize']['dur']))
+
+    @override_settings(SNIPPETS=SAMPLED)
+    def test_render_time(self):
+        res = self.client.post(reverse('snippet-list'),
+                               {'code': 'print(1)'}, format='json')
+
+        timings = parse_server_timing(res['Server-Timing'])
+        self.assertGreater(float(timings['render']['dur']), 0)
+
+    @override_settings(SNIPPETS=UNSAMPLED)
+    def test_unsampled_requests_only_report_total(self):
+        res = self.client.get(reverse('snippet-list'))
+
+        self.assertEqual(set(parse_server_timing(res['Server-Timing'])),
+                         {'total'})
+
+    @override_settings(SNIPPETS=dict(SAMPLED, METRICS_SERVER_TIMING=False))
+    def test_server_timing_can_be_disabled(self):
+        res = self.client.get(reverse('snippet-list'))
+
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(SNIPPETS=SAMPLED)
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('snippet-list'))
+
+        res = self.client.get(reverse('metrics'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+        self.assertIn('snippets_requests_total{view="snippet-list",'
+                      'method="GET",status="200"}', body)
+        self.assertIn('snippets_request_duration_seconds_bucket{'
+                      'view="snippet-list",le="+Inf"}', body)
+        self.assertIn('snippets_request_phase_seconds_total{'
+                      'view="snippet-list",phase="db"}', body)
+        self.assertIn('snippets_db_queries_total{view="snippet-list"}',
+                      body)
+
+    def test_metrics_endpoint_is_local_only(self):
+        res = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(res.status_code, 404)
+
+
+class RegistryTest(TestCase):
+    """Testing the Prometheus exposition of the metrics"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        registry.record('view', 'GET', 200, 0.003, 100)
+        registry.record('view', 'GET', 200, 0.2, 5000)
+        registry.record('view', 'GET', 500, 20.0, None)
+
+        lines = registry.export().splitlines()
+
+        self.assertIn('snippets_request_duration_seconds_bucket'
+                      '{view="view",le="0.005"} 1', lines)
+        self.assertIn('snippets_request_duration_seconds_bucket'
+                      '{view="view",le="0.25"} 2', lines)
+        self.assertIn('snippets_request_duration_seconds_bucket'
+                      '{view="view",le="+Inf"} 3', lines)
+        self.assertIn('snippets_request_duration_seconds_count'
+                      '{view="view"} 3', lines)
+        self.assertIn('snippets_response_size_bytes_count{view="view"} 2',
+                      lines)
+        self.assertIn('snippets_requests_total'
+                      '{view="view",method="GET",status="500"} 1', lines)
+
+    def test_timer_outside_request(self):
+        with timer('render'):
+            pass
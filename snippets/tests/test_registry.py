@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+import pygments
+from django.conf import settings
+from django.test import SimpleTestCase
+from pygments.lexers import get_all_lexers
+from pygments.styles import STYLE_MAP
+
+from snippets import registry
+
+
+class LexerRegistryTest(SimpleTestCase):
+    """Testing the precomputed lexer and style registry"""
+
+    def test_registry_matches_installed_pygments(self):
+        self.assertEqual(registry.REGISTRY['pygments_version'],
+                         pygments.__version__)
+        self.assertEqual(registry.load_registry(), registry.build_registry())
+
+    def test_choices_cover_bundled_lexers_and_styles(self):
+        aliases = {alias for alias, _ in registry.LANGUAGE_CHOICES}
+        self.assertIn('python', aliases)
+        self.assertTrue(aliases.issubset(
+            {item[1][0] for item in get_all_lexers() if item[1]}))
+        self.assertEqual([style for style, _ in registry.STYLE_CHOICES],
+                         sorted(STYLE_MAP))
+
+    def test_get_lexer_class(self):
+        lexer_class = registry.get_lexer_class('python')
+
+        self.assertEqual(lexer_class.__name__, 'PythonLexer')
+
+    def test_stale_registry_is_rebuilt(self):
+        path = self.get_stale_registry_path()
+
+        with self.assertWarns(UserWarning):
+            loaded = registry.load_registry(path)
+
+        self.assertEqual(loaded['pygments_version'], pygments.__version__)
+
+    def get_stale_registry_path(self):
+        stale = tempfile.NamedTemporaryFile('w', suffix='.json',
+                                            delete=False)
+        self.addCleanup(os.remove, stale.name)
+        with stale:
+            stale.write('{"pygments_version": "0.0", "languages": [], '
+                        '"styles": []}')
+        return stale.name
+
+    def test_setup_does_not_import_language_lexers(self):
+        code = ('import django, sys; django.setup(); '
+                'import snippets.models, snippets.serializers; '
+                'print("pygments.lexers.python" in sys.modules)')
+        output = subprocess.check_output(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR,
+            env={'DJANGO_SETTINGS_MODULE': 'tutorial.settings'})
+
+        self.assertEqual(output.strip(), b'False')
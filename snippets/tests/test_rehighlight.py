@@ -0,0 +1,184 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from snippets.models import HighlightBlob, Script, Snippet
+from snippets.rehighlight import Rehighlighter
+
+
+class RehighlightTest(TestCase):
+    """Testing the rehighlight management command"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.other = User.objects.create_user(username='other',
+                                              password='testpasswd')
+
+    def create_stale(self, owner=None, **kwargs):
+        kwargs.setdefault('code', 'print(1)')
+        snippet = Snippet.objects.create(owner=owner or self.user, **kwargs)
+        stale = HighlightBlob.from_content('stale')
+        HighlightBlob.store([stale])
+        Snippet.objects.filter(id=snippet.id).update(highlight_blob=stale)
+        return snippet
+
+    def rehighlight(self, *args, **options):
+        out = StringIO()
+        options.setdefault('processes', 1)
+        call_command('rehighlight', *args, stdout=out, stderr=StringIO(),
+                     **options)
+        return out.getvalue()
+
+    def highlighted(self):
+        return {snippet.id: snippet.highlighted for snippet in
+                Snippet.objects.select_related('highlight_blob')}
+
+    def test_rerenders_all_snippets(self):
+        snippets = [self.create_stale(code=f'x = {i}') for i in range(5)]
+        script = Script.objects.create(owner=self.user,
+                                       snippets=str(snippets[0].id))
+
+        out = self.rehighlight(chunk_size=2)
+
+        self.assertIn('Re-rendered 5 snippets', out)
+        self.assertIn('rows/s', out)
+        for snippet in Snippet.objects.all():
+            self.assertIn('<span', snippet.highlighted)
+            self.assertEqual(snippet.revision, 2)
+        revision = script.revision
+        script.refresh_from_db()
+        self.assertGreater(script.revision, revision)
+
+    def test_filters(self):
+        python = self.create_stale(language='python')
+        ruby = self.create_stale(language='ruby')
+        theirs = self.create_stale(owner=self.other, language='python')
+
+        self.rehighlight(language='python', owner='testuser')
+
+        highlighted = self.highlighted()
+        self.assertNotEqual(highlighted[python.id], 'stale')
+        self.assertEqual(highlighted[ruby.id], 'stale')
+        self.assertEqual(highlighted[theirs.id], 'stale')
+
+    def test_fallbacks(self):
+        fallback = self.create_stale()
+        Snippet.objects.filter(id=fallback.id).update(highlight_fallback=True)
+        rendered = self.create_stale()
+
+        self.rehighlight(fallbacks=True)
+
+        highlighted = self.highlighted()
+        self.assertIn('<span', highlighted[fallback.id])
+        self.assertEqual(highlighted[rendered.id], 'stale')
+        self.assertFalse(Snippet.objects.get(id=fallback.id)
+                         .highlight_fallback)
+
+    def test_date_range(self):
+        snippet = self.create_stale()
+
+        self.rehighlight(since='2000-01-01', until='2000-01-02')
+        self.assertEqual(self.highlighted()[snippet.id], 'stale')
+
+        self.rehighlight(since='2000-01-01')
+        self.assertNotEqual(self.highlighted()[snippet.id], 'stale')
+
+    def test_invalid_date(self):
+        with self.assertRaises(CommandError):
+            self.rehighlight(since='yesterday')
+
+    def test_skips_pending_snippets(self):
+        snippet = self.create_stale()
+        Snippet.objects.filter(id=snippet.id).update(
+            highlight_status=Snippet.HIGHLIGHT_PENDING)
+
+        self.rehighlight()
+
+        self.assertEqual(self.highlighted()[snippet.id], 'stale')
+
+    def test_skips_snippets_changed_while_rendering(self):
+        snippet = self.create_stale()
+        render = Rehighlighter.render
+
+        def render_and_edit(rehighlighter, inputs_list):
+            edited = Snippet.objects.get(id=snippet.id)
+            edited.code = 'print(2)'
+            edited.save()
+            return render(rehighlighter, inputs_list)
+
+        with mock.patch.object(Rehighlighter, 'render', render_and_edit):
+            out = self.rehighlight()
+
+        self.assertIn('skipped 1 changed meanwhile', out)
+        snippet.refresh_from_db()
+        self.assertIn('2', snippet.highlighted)
+
+    def test_reports_failures(self):
+        ok = self.create_stale(language='python')
+        broken = self.create_stale(language='ruby')
+
+        def fail_on_ruby(**inputs):
+            if inputs['language'] == 'ruby':
+                raise ValueError('boom')
+            return 'rendered'
+
+        with mock.patch('snippets.highlighting.render', fail_on_ruby):
+            out = self.rehighlight()
+
+        self.assertIn('1 failed', out)
+        highlighted = self.highlighted()
+        self.assertEqual(highlighted[ok.id], 'rendered')
+        self.assertEqual(highlighted[broken.id], 'stale')
+
+    def test_start_after(self):
+        first = self.create_stale()
+        second = self.create_stale()
+
+        self.rehighlight(start_after=first.id)
+
+        highlighted = self.highlighted()
+        self.assertEqual(highlighted[first.id], 'stale')
+        self.assertNotEqual(highlighted[second.id], 'stale')
+
+    def test_resumes_from_checkpoint(self):
+        first = self.create_stale()
+        second = self.create_stale()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'checkpoint.json')
+            with open(path, 'w') as checkpoint_file:
+                json.dump({'filters': {}, 'last_id': first.id},
+                          checkpoint_file)
+
+            out = self.rehighlight(checkpoint=path)
+
+            self.assertIn(f'Resuming after snippet {first.id}', out)
+            self.assertFalse(os.path.exists(path))
+        highlighted = self.highlighted()
+        self.assertEqual(highlighted[first.id], 'stale')
+        self.assertNotEqual(highlighted[second.id], 'stale')
+
+    def test_checkpoint_with_other_filters(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'checkpoint.json')
+            with open(path, 'w') as checkpoint_file:
+                json.dump({'filters': {'language': 'ruby'}, 'last_id': 1},
+                          checkpoint_file)
+
+            with self.assertRaises(CommandError):
+                self.rehighlight(checkpoint=path)
+
+    def test_process_pool(self):
+        snippets = [self.create_stale(code=f'x = {i}') for i in range(4)]
+
+        self.rehighlight(processes=2)
+
+        highlighted = self.highlighted()
+        for snippet in snippets:
+            self.assertIn('<span', highlighted[snippet.id])
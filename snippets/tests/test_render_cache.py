@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets import budgets
+from snippets.models import Snippet
+from snippets.render_cache import RenderCache, get_render_cache
+
+
+def get_snippet_detail_url(pk):
+    """Return snippet detail url"""
+    return reverse('snippet-detail', args=[pk])
+
+
+class RenderCacheTest(TestCase):
+    """Testing the LRU behaviour of the render cache"""
+
+    def test_evicts_least_recently_used(self):
+        cache = RenderCache(max_size=10)
+        cache.set('a', 'aaaa')
+        cache.set('b', 'bbbb')
+        cache.get('a')
+        cache.set('c', 'cccc')
+
+        self.assertEqual(cache.get('a'), 'aaaa')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'cccc')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertLessEqual(cache.stats()['size'], 10)
+
+    def test_skips_entries_larger_than_bound(self):
+        cache = RenderCache(max_size=3)
+        cache.set('a', 'aaaa')
+
+        self.assertIsNone(cache.get('a'))
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_falls_back_to_django_cache(self):
+        RenderCache(max_size=100, backend='default').set('a', 'html')
+        cache = RenderCache(max_size=100, backend='default')
+
+        self.assertEqual(cache.get('a'), 'html')
+        self.assertEqual(cache.stats()['shared_hits'], 1)
+
+
+class SnippetRenderCacheTest(TestCase):
+    """Testing that snippets skip rendering when inputs repeat"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.client.force_authenticate(user=self.user)
+        get_render_cache().clear()
+
+    def test_identical_inputs_render_once(self):
+        with mock.patch('snippets.budgets.render',
+                        wraps=budgets.render) as render:
+            first = Snippet.objects.create(owner=self.user, code='print(1)')
+            second = Snippet.objects.create(owner=self.user, code='print(1)')
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.highlighted, second.highlighted)
+
+    def test_unchanged_update_does_not_render(self):
+        snippet = Snippet.objects.create(owner=self.user, code='print(1)')
+        payload = {'code': 'print(1)', 'title': ''}
+
+        with mock.patch('snippets.render_cache.render') as render:
+            res = self.client.put(get_snippet_detail_url(snippet.id), payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        render.assert_not_called()
+
+    def test_changed_update_renders(self):
+        snippet = Snippet.objects.create(owner=self.user, code='print(1)')
+
+        res = self.client.patch(get_snippet_detail_url(snippet.id),
+                                {'code': 'print(2)'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        snippet.refresh_from_db()
+        self.assertIn('2', snippet.highlighted)
+
+    def test_stats_endpoint(self):
+        before = self.client.get(reverse('render-cache-stats')).data
+        Snippet.objects.create(owner=self.user, code='print(1)')
+        Snippet.objects.create(owner=self.user, code='print(1)')
+
+        res = self.client.get(reverse('render-cache-stats'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['hits'] - before['hits'], 1)
+        self.assertEqual(res.data['misses'] - before['misses'], 1)
+
+    def test_stats_endpoint_is_local_only(self):
+        res = self.client.get(reverse('render-cache-stats'),
+                              REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
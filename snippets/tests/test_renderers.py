@@ -0,0 +1,153 @@
+import datetime
+import decimal
+import unittest
+from collections import OrderedDict
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from scripts.serializers import ScriptSerializer
+from snippets import renderers
+from snippets.models import Script, Snippet
+from snippets.renderers import MessagePackRenderer, ORJSONRenderer
+from snippets.serializers import SnippetSerializer, SnippetSummarySerializer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SNIPPETS_URL = reverse('snippet-list')
+DATA = OrderedDict([
+    ('id', 1), ('title', 'caf\xe9 \u2028\u2029 \U0001F600 "quoted"'),
+    ('lazy', gettext_lazy('Not found.')), ('ratio', 0.1),
+    ('price', decimal.Decimal('1.50')), ('flags', [True, False, None]),
+    ('updated', datetime.datetime(2020, 1, 2, 3, 4, 5, 678901,
+                                  tzinfo=datetime.timezone.utc)),
+    ('expanded', {1: 'print(1)', 2: '<b>&</b>'}),
+    ('large', 1 << 70),
+])
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    """Testing that the orjson renderer matches DRF's JSONRenderer"""
+
+    @unittest.skipIf(renderers.orjson is None, 'orjson is not installed')
+    def test_same_output(self):
+        for data in (DATA, [DATA, DATA], {}, 'text', None):
+            self.assertEqual(ORJSONRenderer().render(data),
+                             JSONRenderer().render(data))
+        media_type = 'application/json; indent=2'
+        self.assertEqual(ORJSONRenderer().render(DATA, media_type),
+                         JSONRenderer().render(DATA, media_type))
+
+    def test_without_orjson(self):
+        with mock.patch('snippets.renderers.orjson', None):
+            self.assertEqual(ORJSONRenderer().render(DATA),
+                             JSONRenderer().render(DATA))
+
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class MessagePackTest(TestCase):
+    """Testing MessagePack responses and requests"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_negotiated_response(self):
+        Snippet.objects.create(owner=self.user, code='print(1)')
+
+        res = self.client.get(SNIPPETS_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content),
+                         self.client.get(SNIPPETS_URL).json())
+        self.assertEqual(MessagePackRenderer().render(None), b'')
+
+    def test_request_body(self):
+        res = self.client.post(
+            SNIPPETS_URL, msgpack.packb({'code': 'x = 1', 'title': 'Packed'}),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(msgpack.unpackb(res.content)['title'], 'Packed')
+        self.assertEqual(Snippet.objects.get().code, 'x = 1')
+
+    def test_invalid_body(self):
+        for content_type, body in (('application/msgpack', b'\xc1'),
+                                   ('application/json', b'{"code": ')):
+            res = self.client.post(SNIPPETS_URL, body,
+                                   content_type=content_type)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastListSerializerTest(TestCase):
+    """Testing that the fast list path matches per object serialization"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.snippets = [
+            Snippet.objects.create(owner=self.user, code='print(1)',
+                                   title='One'),
+            Snippet.objects.create(owner=self.user, code='<p>', title='',
+                                   language='html', linenos=True),
+        ]
+
+    def assertSameOutput(self, serializer_class, instances):
+        fast = serializer_class(instances, many=True).data
+        self.assertEqual(fast, [serializer_class(instance).data
+                                for instance in instances])
+        self.assertEqual([list(item) for item in fast],
+                         [list(serializer_class(instance).data)
+                          for instance in instances])
+
+    def test_snippets(self):
+        snippets = list(Snippet.objects.select_related('owner', 'code_blob'))
+
+        self.assertSameOutput(SnippetSerializer, snippets)
+        self.assertSameOutput(SnippetSummarySerializer, snippets)
+
+    def test_scripts(self):
+        ids = ','.join(str(snippet.id) for snippet in self.snippets)
+        Script.objects.create(owner=self.user, name='Both', snippets=ids)
+        Script.objects.create(owner=self.user, name='None')
+
+        self.assertSameOutput(ScriptSerializer, list(
+            Script.objects.select_related('owner').prefetch_related(
+                'entries')))
+
+    def test_objects_without_attributes_use_fields(self):
+        snippet = Snippet.objects.get(id=self.snippets[0].id)
+        item = {'id': 5, 'title': 'Mapping', 'code': 'x', 'linenos': False,
+                'language': 'python', 'style': 'friendly',
+                'highlight_status': 'ready', 'owner': {'username': 'a'}}
+
+        data = SnippetSerializer([snippet, item], many=True).data
+
+        self.assertEqual(data[1]['owner'], 'a')
+        self.assertEqual(data[0], SnippetSerializer(snippet).data)
+
+    def test_callable_attributes_use_fields(self):
+        snippet = Snippet.objects.get(id=self.snippets[0].id)
+        item = SimpleNamespace(
+            id=lambda: 7, title='Callable', code='x', linenos=False,
+            language='python', style='friendly', highlight_status='ready',
+            owner=SimpleNamespace(username='a'))
+
+        data = SnippetSerializer([snippet, item], many=True).data
+
+        self.assertEqual(data[1]['id'], 7)
+        self.assertEqual(data[0], SnippetSerializer(snippet).data)
@@ -0,0 +1,147 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import OperationalError, connections
+from django.test import (SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets import replicas
+from snippets.checks import check_replica_pin_cache
+from snippets.models import Snippet
+
+SNIPPETS_URL = reverse('snippet-list')
+REPLICAS = {'READ_REPLICAS': ['replica'], 'RESPONSE_CACHE': None}
+
+
+def get_snippet_detail_url(pk):
+    """Return snippet detail url"""
+    return reverse('snippet-detail', args=[pk])
+
+
+@override_settings(SNIPPETS=REPLICAS)
+class ReplicaRoutingTest(TransactionTestCase):
+    """Testing reads from replicas and read-your-writes pinning.
+
+    A second connection to the test database stands in for a replica.
+    Test cases run without a transaction so it sees their rows.
+    """
+
+    def setUp(self):
+        default = connections['default']
+        self.replica = default.__class__(dict(default.settings_dict),
+                                         'replica')
+        setattr(connections._connections, 'replica', self.replica)
+        self.addCleanup(delattr, connections._connections, 'replica')
+        self.addCleanup(self.replica.close)
+        caches['default'].clear()
+        replicas._down.clear()
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.snippet = Snippet.objects.create(owner=self.user,
+                                              code='print(1)')
+
+    def test_safe_reads_go_to_replica(self):
+        with CaptureQueriesContext(self.replica) as queries:
+            res = self.client.get(SNIPPETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['results'][0]['id'], self.snippet.id)
+        self.assertTrue(queries)
+
+    def test_writes_pin_user_to_primary(self):
+        self.client.force_authenticate(user=self.user)
+        res = self.client.patch(get_snippet_detail_url(self.snippet.id),
+                                {'title': 'Pinned'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(self.replica) as queries:
+            res = self.client.get(get_snippet_detail_url(self.snippet.id))
+        self.assertEqual(res.json()['title'], 'Pinned')
+        self.assertFalse(queries)
+
+        with CaptureQueriesContext(self.replica) as queries:
+            APIClient().get(get_snippet_detail_url(self.snippet.id))
+        self.assertTrue(queries)
+
+    def test_failed_writes_dont_pin(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(SNIPPETS_URL, {'code': 'x', 'language': 'unknown'},
+                         format='json')
+
+        self.assertFalse(replicas.is_pinned(self.user))
+
+    @override_settings(SNIPPETS=dict(REPLICAS, RESPONSE_CACHE='responses'))
+    def test_cached_responses_are_computed_on_primary(self):
+        caches['responses'].clear()
+
+        with CaptureQueriesContext(self.replica) as queries:
+            res = self.client.get(SNIPPETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(queries)
+
+    def test_unavailable_replica_is_skipped(self):
+        with mock.patch.object(self.replica, 'ensure_connection',
+                               side_effect=OperationalError) as connect, \
+                self.assertLogs('snippets.replicas', level='WARNING'):
+            self.assertEqual(self.client.get(SNIPPETS_URL).status_code,
+                             status.HTTP_200_OK)
+            self.assertEqual(self.client.get(SNIPPETS_URL).status_code,
+                             status.HTTP_200_OK)
+
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(replicas.get_replica(), 'default')
+
+    def test_objects_read_from_replica_are_saved_on_primary(self):
+        snippet = Snippet.objects.using('replica').get(id=self.snippet.id)
+        owner = User.objects.using('replica').get(id=self.user.id)
+
+        with CaptureQueriesContext(self.replica) as queries:
+            snippet.title = 'Saved'
+            snippet.save()
+            Snippet.objects.create(owner=owner, code='print(2)')
+
+        # Related objects may still be read from the replica.
+        self.assertFalse([query for query in queries.captured_queries
+                          if not query['sql'].startswith('SELECT')])
+        self.assertEqual(snippet._state.db, 'default')
+        self.assertEqual(Snippet.objects.get(id=self.snippet.id).title,
+                         'Saved')
+
+    def test_health_checks_close_broken_connections(self):
+        connection = connections['default']
+        connection.ensure_connection()
+        with mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            with mock.patch.dict(connection.settings_dict,
+                                 CONN_HEALTH_CHECKS=False):
+                replicas.check_connections()
+            close.assert_not_called()
+
+            with mock.patch.dict(connection.settings_dict,
+                                 CONN_HEALTH_CHECKS=True):
+                replicas.check_connections()
+            close.assert_called_once_with()
+
+
+class ReplicaPinCacheCheckTest(SimpleTestCase):
+    """Testing that pins in a local-memory cache are refused"""
+
+    def test_local_memory_cache(self):
+        with override_settings(SNIPPETS=REPLICAS):
+            self.assertEqual([error.id for error in
+                              check_replica_pin_cache(None)],
+                             ['snippets.E002'])
+        with override_settings(SNIPPETS=dict(REPLICAS,
+                                             REPLICA_PIN_CACHE='shared')):
+            self.assertEqual(check_replica_pin_cache(None), [])
+        # Without replicas nothing is pinned.
+        with override_settings(SNIPPETS={}):
+            self.assertEqual(check_replica_pin_cache(None), [])
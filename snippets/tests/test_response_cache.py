@@ -0,0 +1,255 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.checks import Error
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets.checks import check_response_cache
+from snippets.models import Snippet
+from snippets.response_cache import (KEY_PREFIX, CachedResponse,
+                                     ResponseCache)
+from snippets.signals import snippets_updated
+from snippets.workers import HighlightWorker
+
+SNIPPETS_URL = reverse('snippet-list')
+USERS_URL = reverse('user-list')
+
+
+def get_snippet_detail_url(pk):
+    """Return snippet detail url"""
+    return reverse('snippet-detail', args=[pk])
+
+
+def get_user_detail_url(pk):
+    """Return user detail url"""
+    return reverse('user-detail', args=[pk])
+
+
+# The local-memory cache stands in for a shared one in a single process.
+@override_settings(SNIPPETS={'RESPONSE_CACHE': 'responses'})
+class ResponseCacheTest(TestCase):
+    """Testing the cache of snippet and user responses"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.snippet = Snippet.objects.create(owner=self.user,
+                                              code='print(1)')
+
+    def test_list_served_from_cache(self):
+        first = self.client.get(SNIPPETS_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(SNIPPETS_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.json(), first.json())
+
+    def test_pages_cached_separately(self):
+        self.client.get(SNIPPETS_URL)
+
+        res = self.client.get(SNIPPETS_URL, {'include': 'code'})
+
+        self.assertEqual(res.data['results'][0]['code'], 'print(1)')
+
+    def test_detail_keeps_validators(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        first = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second['Last-Modified'], first['Last-Modified'])
+
+    def test_missing_object_not_cached(self):
+        res = self.client.get(get_snippet_detail_url(self.snippet.id + 1))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        snippet = Snippet.objects.create(owner=self.user, code='x')
+        res = self.client.get(get_snippet_detail_url(snippet.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_invalidates_detail_and_list(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        self.client.get(url)
+        self.client.get(SNIPPETS_URL)
+        self.client.force_authenticate(user=self.user)
+
+        self.client.patch(url, {'title': 'changed'})
+
+        self.assertEqual(self.client.get(url).data['title'], 'changed')
+        self.assertEqual(self.client.get(SNIPPETS_URL).data['results'][0]
+                         ['title'], 'changed')
+
+    def test_create_and_delete_invalidate_owner(self):
+        url = get_user_detail_url(self.user.id)
+        self.client.get(url)
+        self.client.get(USERS_URL)
+
+        snippet = Snippet.objects.create(owner=self.user, code='x')
+        self.assertIn(snippet.id, self.client.get(url).data['snippets'])
+        self.assertIn(snippet.id,
+                      self.client.get(USERS_URL).data['results'][0]
+                      ['snippets'])
+
+        snippet.delete()
+        self.assertNotIn(snippet.id, self.client.get(url).data['snippets'])
+
+    def test_username_change_invalidates_snippets(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        self.client.get(url)
+
+        self.user.username = 'renamed'
+        self.user.save()
+
+        self.assertEqual(self.client.get(url).data['owner'], 'renamed')
+
+    def test_bulk_updates_invalidate(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        self.client.get(url)
+
+        Snippet.objects.filter(id=self.snippet.id).update(title='bulk')
+        snippets_updated.send(sender=Snippet, ids=[self.snippet.id],
+                              fields=['title'])
+
+        self.assertEqual(self.client.get(url).data['title'], 'bulk')
+
+    def test_worker_claim_invalidates(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        Snippet.objects.filter(id=self.snippet.id).update(
+            highlight_status=Snippet.HIGHLIGHT_PENDING)
+        snippets_updated.send(sender=Snippet, ids=[self.snippet.id],
+                              fields=['highlight_status'])
+        self.client.get(url)
+
+        HighlightWorker(concurrency=1).claim(1)
+
+        self.assertEqual(self.client.get(url).data['highlight_status'],
+                         Snippet.HIGHLIGHT_RENDERING)
+
+    def test_stats(self):
+        stats_url = reverse('response-cache-stats')
+        before = self.client.get(stats_url).data
+        self.client.get(USERS_URL)
+        self.client.get(USERS_URL)
+
+        stats = self.client.get(stats_url).data
+
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['hits'] - before['hits'], 1)
+        self.assertIsNotNone(stats['hit_ratio'])
+
+    def test_stats_are_local_only(self):
+        res = self.client.get(reverse('response-cache-stats'),
+                              REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# Stand-ins for the shared token cache and the per process responses.
+@override_settings(
+    SNIPPETS={'RESPONSE_CACHE': 'responses',
+              'RESPONSE_TOKEN_CACHE': 'tokens'},
+    CACHES={alias: {'BACKEND': 'django.core.cache.backends.locmem.'
+                               'LocMemCache',
+                    'LOCATION': alias}
+            for alias in ('default', 'responses', 'tokens')})
+class TokenCacheTest(TestCase):
+    """Testing responses invalidated through a separate token cache"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        caches['tokens'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.snippet = Snippet.objects.create(owner=self.user,
+                                              code='print(1)')
+
+    def test_tokens_kept_in_token_cache(self):
+        self.client.get(SNIPPETS_URL)
+
+        self.assertIsNotNone(
+            caches['tokens'].get(KEY_PREFIX + 'token:snippet-list'))
+        with self.assertNumQueries(0):
+            self.client.get(SNIPPETS_URL)
+
+    def test_invalidation_from_another_process(self):
+        url = get_snippet_detail_url(self.snippet.id)
+        self.client.get(url)
+
+        # Another process changes the row and replaces the token, the
+        # response kept by this process is left as it was.
+        Snippet.objects.filter(id=self.snippet.id).update(title='changed')
+        key = f'{KEY_PREFIX}token:snippet:{self.snippet.id}'
+        caches['tokens'].set(key, 'other', timeout=None)
+
+        self.assertEqual(self.client.get(url).data['title'], 'changed')
+
+
+@override_settings(SNIPPETS={'RESPONSE_CACHE': 'responses'})
+class StampedeTest(TestCase):
+    """Testing that concurrent misses compute a response once"""
+
+    def setUp(self):
+        caches['responses'].clear()
+
+    def test_concurrent_misses_compute_once(self):
+        cache = ResponseCache()
+        computed = []
+        barrier = threading.Barrier(5)
+        results = []
+
+        def compute():
+            computed.append(1)
+            time.sleep(0.2)
+            return CachedResponse(200, {'value': 1}, {})
+
+        def request():
+            barrier.wait()
+            results.append(cache.get_or_compute('test', '', compute).data)
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(computed), 1)
+        self.assertEqual(results, [{'value': 1}] * 5)
+        self.assertEqual(cache.stats()['waits'], 4)
+
+
+class ResponseCacheCheckTest(TestCase):
+    """Testing that local-memory response token caches are refused"""
+
+    def test_local_memory_cache(self):
+        for options in ({'RESPONSE_CACHE': 'responses'},
+                        {'RESPONSE_CACHE': 'shared',
+                         'RESPONSE_TOKEN_CACHE': 'responses'}):
+            with override_settings(SNIPPETS=options):
+                errors = check_response_cache(None)
+            self.assertEqual([error.id for error in errors],
+                             ['snippets.E001'])
+            self.assertIsInstance(errors[0], Error)
+
+    def test_disabled_and_shared_caches(self):
+        # Responses kept per process, invalidated through shared tokens.
+        self.assertEqual(check_response_cache(None), [])
+        with override_settings(SNIPPETS={'RESPONSE_CACHE': None}):
+            self.assertEqual(check_response_cache(None), [])
+        with override_settings(
+                SNIPPETS={'RESPONSE_CACHE': 'shared'},
+                CACHES={'shared': {'BACKEND': 'django.core.cache.backends.'
+                                              'db.DatabaseCache',
+                                   'LOCATION': 'shared'}}):
+            self.assertEqual(check_response_cache(None), [])
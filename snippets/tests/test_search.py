@@ -0,0 +1,227 @@
+import unittest
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets import search
+from snippets.models import CodeBlob, SearchToken, Snippet
+from snippets.signals import snippets_updated
+
+try:
+    from django.db.backends.postgresql.base import DatabaseWrapper
+except ImportError:
+    DatabaseWrapper = None
+
+SEARCH_URL = reverse('snippet-search')
+
+
+# Without the response cache, whose tokens are in the database cache.
+@override_settings(SNIPPETS={'RESPONSE_CACHE': None})
+class SearchIndexTest(TestCase):
+    """Testing the inverted index kept for search"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+
+    def get_terms(self, snippet):
+        return dict(SearchToken.objects.filter(snippet=snippet)
+                    .values_list('term', 'weight'))
+
+    def test_tokenize(self):
+        self.assertEqual(list(search.tokenize('Read_File(path, x)')),
+                         ['read_file', 'read', 'file', 'path'])
+
+    def test_save_indexes_title_and_code(self):
+        snippet = Snippet.objects.create(owner=self.user, title='Parser',
+                                         code='parse(parser)')
+
+        self.assertEqual(self.get_terms(snippet),
+                         {'parser': 4, 'parse': 1})
+
+    def test_save_updates_index(self):
+        snippet = Snippet.objects.create(owner=self.user, code='old_name')
+
+        snippet.code = 'new_name'
+        snippet.save()
+
+        self.assertEqual(set(self.get_terms(snippet)),
+                         {'new_name', 'new', 'name'})
+
+    def test_bulk_code_update_reindexes(self):
+        snippet = Snippet.objects.create(owner=self.user, code='old_name')
+        blob = CodeBlob.from_content('new_name')
+        CodeBlob.store([blob])
+
+        Snippet.objects.filter(id=snippet.id).update(code_blob=blob)
+        snippets_updated.send(sender=Snippet, ids=[snippet.id],
+                              fields=['code_blob'])
+
+        self.assertEqual(set(self.get_terms(snippet)),
+                         {'new_name', 'new', 'name'})
+
+    def test_save_without_changes_keeps_index(self):
+        snippet = Snippet.objects.create(owner=self.user, code='value')
+        snippet = Snippet.objects.get(id=snippet.id)
+
+        with self.assertNumQueries(3):
+            # The update and the script lookups, no re-indexing.
+            snippet.save()
+
+    def test_rebuild(self):
+        Snippet.objects.create(owner=self.user, code='alpha beta')
+        SearchToken.objects.all().delete()
+
+        self.assertEqual(search.rebuild_index(), 1)
+
+        self.assertEqual(SearchToken.objects.count(), 2)
+
+    def test_fragments(self):
+        code = 'x' * 100 + ' def load(): pass <b> ' + 'y' * 100
+
+        fragments = search.get_fragments(code, ['load', '<b>'])
+
+        self.assertEqual(len(fragments), 1)
+        self.assertIn('def <mark>load</mark>(): pass <mark>&lt;b&gt;</mark>',
+                      fragments[0])
+        self.assertLess(len(fragments[0]), 150)
+
+
+class SearchApiTest(TestCase):
+    """Testing the snippet search endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.other = User.objects.create_user(username='other',
+                                              password='testpasswd')
+        self.fib = Snippet.objects.create(
+            owner=self.user, title='fibonacci',
+            code='def fibonacci(n):\n    return n if n < 2 else '
+                 'fibonacci(n - 1) + fibonacci(n - 2)\n')
+        self.loop = Snippet.objects.create(
+            owner=self.user, code='for n in range(10):\n    print(n)\n')
+        self.ruby = Snippet.objects.create(
+            owner=self.other, language='rb',
+            code='def fibonacci(n)\n  n\nend\n')
+
+    def search(self, **params):
+        res = self.client.get(SEARCH_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data['results']
+
+    def test_ranked_results(self):
+        results = self.search(q='fibonacci')
+
+        self.assertEqual([r['id'] for r in results],
+                         [self.fib.id, self.ruby.id])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+        self.assertIn('<mark>fibonacci</mark>', results[0]['fragments'][0])
+        self.assertNotIn('code', results[0])
+
+    def test_all_terms_must_match(self):
+        results = self.search(q='fibonacci print')
+
+        self.assertEqual(results, [])
+
+    def test_filters(self):
+        self.assertEqual([r['id'] for r in
+                          self.search(q='fibonacci', language='rb')],
+                         [self.ruby.id])
+        self.assertEqual([r['id'] for r in
+                          self.search(q='fibonacci', owner='testuser')],
+                         [self.fib.id])
+
+    def test_substring_mode(self):
+        results = self.search(q='bonac', mode='substring')
+
+        self.assertEqual({r['id'] for r in results},
+                         {self.fib.id, self.ruby.id})
+        self.assertIn('fi<mark>bonac</mark>ci', results[0]['fragments'][0])
+
+    def test_limit(self):
+        self.assertEqual(len(self.search(q='fibonacci', limit=1)), 1)
+
+    def test_empty_query(self):
+        self.assertEqual(self.search(q=''), [])
+
+    def test_invalid_mode(self):
+        res = self.client.get(SEARCH_URL, {'q': 'x', 'mode': 'regex'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deleted_snippets_leave_the_index(self):
+        self.fib.delete()
+
+        self.assertEqual([r['id'] for r in self.search(q='fibonacci')],
+                         [self.ruby.id])
+
+
+@unittest.skipIf(DatabaseWrapper is None, 'psycopg2 is not installed')
+class PostgresSubstringTest(SimpleTestCase):
+    """Testing that substring search compiles to what the trigram indexes
+    serve on PostgreSQL, without connecting"""
+
+    def test_compiled_sql(self):
+        postgres = DatabaseWrapper(dict(
+            connection.settings_dict, ENGINE='django.db.backends.postgresql'))
+        with mock.patch('snippets.search.uses_postgres', return_value=True):
+            queryset = search.match_substring('Bonac', None, None)
+
+        sql, params = queryset.query.get_compiler(
+            connection=postgres).as_sql()
+
+        self.assertIn('"snippets_snippet"."title" ILIKE %s', sql)
+        self.assertIn('"snippets_codeblob"."content" ILIKE %s', sql)
+        self.assertIn(' UNION ', sql)
+        self.assertNotIn('UPPER(', sql)
+        self.assertNotIn(' OR ', sql)
+        self.assertIn('%Bonac%', params)
+
+
+@unittest.skipIf(DatabaseWrapper is None, 'psycopg2 is not installed')
+class PostgresWordsTest(SimpleTestCase):
+    """Testing that word search compiles to what the full-text indexes
+    serve on PostgreSQL, without connecting"""
+
+    def test_compiled_sql(self):
+        postgres = DatabaseWrapper(dict(
+            connection.settings_dict, ENGINE='django.db.backends.postgresql'))
+        queryset = search.match_words('fibonacci', None, None)
+
+        sql, params = queryset.query.get_compiler(
+            connection=postgres).as_sql()
+
+        self.assertIn(f'{search.PG_TITLE_VECTOR} @@ plainto_tsquery', sql)
+        self.assertIn(f'{search.PG_CODE_VECTOR} @@ plainto_tsquery', sql)
+        self.assertIn(' UNION ', sql)
+        self.assertNotIn(' OR ', sql)
+        self.assertIn('fibonacci', params)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql',
+                     'requires PostgreSQL')
+class PostgresSearchTest(TestCase):
+    """Testing word search on the PostgreSQL full-text indexes"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='testuser',
+                                        password='testpasswd')
+        self.title = Snippet.objects.create(owner=user, title='fibonacci',
+                                            code='pass\n')
+        self.code = Snippet.objects.create(owner=user,
+                                           code='fibonacci(10)\n')
+        Snippet.objects.create(owner=user, code='print(1)\n')
+
+    def test_title_and_code_matches_are_ranked(self):
+        ranked = search.rank_with_postgres('fibonacci', None, None, 10)
+
+        self.assertEqual([snippet_id for snippet_id, rank in ranked],
+                         [self.title.id, self.code.id])
+        self.assertGreater(ranked[0][1], ranked[1][1])
@@ -0,0 +1,122 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets.models import Snippet
+from snippets.views import SnippetViewSet
+
+
+SNIPPETS_URL = reverse('snippet-list')
+USERS_URL = reverse('user-list')
+
+
+def create_sample_users(n, snippets_per_user=2):
+    users = []
+    for i in range(n):
+        user = User.objects.create_user(username=f'user{i}')
+        for j in range(snippets_per_user):
+            Snippet.objects.create(owner=user, code=f'print({i}, {j})')
+        users.append(user)
+    return users
+
+
+# Without the response cache, whose tokens are in the database cache.
+@override_settings(SNIPPETS={'RESPONSE_CACHE': None})
+class SnippetApiQueryCountTest(TestCase):
+    """Testing the number of queries made by the list endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_snippet_list_query_count(self):
+        create_sample_users(5)
+
+        # A single joined page query, cursor pagination runs no COUNT(*).
+        with self.assertNumQueries(1):
+            res = self.client.get(SNIPPETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 10)
+        self.assertEqual(res.data['results'][0]['owner'], 'user0')
+
+    def test_snippet_list_leaves_out_code(self):
+        create_sample_users(1)
+
+        res = self.client.get(SNIPPETS_URL)
+        self.assertNotIn('code', res.data['results'][0])
+
+        res = self.client.get(SNIPPETS_URL, {'include': 'code'})
+        self.assertEqual(res.data['results'][0]['code'], 'print(0, 0)')
+
+    def test_snippet_detail_includes_code(self):
+        snippet = Snippet.objects.create(
+            owner=create_sample_users(1, snippets_per_user=0)[0],
+            code='print(1)')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse('snippet-detail', args=[snippet.id]))
+
+        self.assertEqual(res.data['code'], 'print(1)')
+
+    def test_user_list_query_count(self):
+        users = create_sample_users(5)
+
+        # The users page and the prefetched snippet ids.
+        with self.assertNumQueries(2):
+            res = self.client.get(USERS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'][0]['snippets'],
+            list(users[0].snippets.values_list('id', flat=True)))
+
+
+class SnippetPaginationTest(TestCase):
+    """Testing cursor pagination and export of snippets"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_sample_users(1, snippets_per_user=0)[0]
+        self.snippets = [Snippet.objects.create(owner=self.user,
+                                                code=f'print({i})')
+                         for i in range(25)]
+
+    def test_cursor_pages_cover_all_snippets(self):
+        ids = []
+        url = SNIPPETS_URL
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', res.data)
+            ids.extend(item['id'] for item in res.data['results'])
+            url = res.data['next']
+
+        self.assertEqual(ids, [snippet.id for snippet in self.snippets])
+
+    def test_export_streams_ndjson(self):
+        res = self.client.get(reverse('snippet-export'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        items = [json.loads(line) for line in lines]
+        self.assertEqual([item['id'] for item in items],
+                         [snippet.id for snippet in self.snippets])
+        self.assertEqual(items[0]['code'], 'print(0)')
+
+    def test_export_reads_bounded_chunks(self):
+        view = SnippetViewSet
+        self.addCleanup(setattr, view, 'export_chunk_size',
+                        view.export_chunk_size)
+        view.export_chunk_size = 10
+
+        res = self.client.get(reverse('snippet-export'))
+        # Three chunks of at most 10 rows and the final empty chunk.
+        with self.assertNumQueries(4):
+            lines = b''.join(res.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 25)
@@ -0,0 +1,230 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snippets import budgets
+from snippets.checks import check_throttle_cache
+from snippets.conf import get_setting
+from snippets.models import Script, Snippet
+from snippets.tests.test_async_views import ASGI_MIDDLEWARE
+
+SNIPPETS_URL = reverse('snippet-list')
+
+
+class ThrottleTestCase(TestCase):
+
+    def setUp(self):
+        caches[get_setting('THROTTLE_CACHE')].clear()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+
+@override_settings(SNIPPETS={'THROTTLE_RATES': {'renders': '10/min'},
+                             'RENDER_COST_UNIT': 10})
+class RenderThrottleTest(ThrottleTestCase):
+    """Testing that snippet writes are throttled by the code they render"""
+
+    def setUp(self):
+        super().setUp()
+        # Lexers weigh 1 until measured.
+        patcher = mock.patch('snippets.budgets.render_stats',
+                             budgets.RenderStats())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_writes_cost_their_code_size(self):
+        for _ in range(2):
+            res = self.client.post(SNIPPETS_URL, {'code': 'x' * 50})
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.post(SNIPPETS_URL, {'code': 'x' * 50})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # 5 tokens are refilled in 30 seconds.
+        self.assertEqual(res['Retry-After'], '30')
+        self.assertEqual(Snippet.objects.count(), 2)
+
+    def test_small_writes_cost_a_token(self):
+        for _ in range(10):
+            res = self.client.post(SNIPPETS_URL, {'code': 'x'})
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.post(SNIPPETS_URL, {'code': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_partial_updates_cost_the_stored_code(self):
+        snippet = Snippet.objects.create(owner=self.user, code='x' * 100)
+        url = reverse('snippet-detail', args=[snippet.id])
+
+        res = self.client.patch(url, {'title': 'Renamed'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.patch(url, {'title': 'Renamed again'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_slow_lexers_cost_more(self):
+        stats = budgets.RenderStats()
+        stats.exceeded('bash', 'time')
+        for _ in range(budgets.WEIGHT_MIN_RENDERS):
+            stats.observe('bash', 0.1, 10)
+        with mock.patch('snippets.budgets.render_stats', stats):
+            self.client.post(SNIPPETS_URL, {'code': 'x'})
+            # 2 units weighing 8 each, charged a full bucket.
+            res = self.client.post(SNIPPETS_URL, {'code': 'x' * 11,
+                                                  'language': 'bash'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_reads_and_deletions_are_free(self):
+        snippet = Snippet.objects.create(owner=self.user, code='x' * 1000)
+        for _ in range(20):
+            self.client.get(reverse('snippet-detail', args=[snippet.id]))
+
+        res = self.client.delete(reverse('snippet-detail', args=[snippet.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_buckets_are_per_user(self):
+        self.client.post(SNIPPETS_URL, {'code': 'x' * 100})
+        other = User.objects.create_user(username='other',
+                                         password='testpasswd')
+        self.client.force_authenticate(user=other)
+
+        res = self.client.post(SNIPPETS_URL, {'code': 'x' * 100})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+
+class RenderStatsWeightTest(TestCase):
+    """Testing the relative render cost of lexers"""
+
+    def test_weight_relative_to_mean(self):
+        stats = budgets.RenderStats()
+        for _ in range(budgets.WEIGHT_MIN_RENDERS):
+            stats.observe('python', 0.01, 1000)
+            stats.observe('html', 0.03, 1000)
+
+        self.assertAlmostEqual(stats.get_weight('python'), 0.5)
+        self.assertAlmostEqual(stats.get_weight('html'), 1.5)
+        self.assertEqual(stats.get_weight('sql'), 1.0)
+
+    def test_weight_bounds(self):
+        stats = budgets.RenderStats()
+        stats.observe('python', 0.01, 1000)
+        self.assertEqual(stats.get_weight('python'), 1.0)
+        for _ in range(budgets.WEIGHT_MIN_RENDERS):
+            stats.observe('python', 0.0, 1000)
+            stats.observe('html', 1.0, 1000)
+
+        self.assertEqual(stats.get_weight('python'), budgets.MIN_WEIGHT)
+        stats.exceeded('html', 'time')
+        self.assertEqual(stats.get_weight('html'), budgets.MAX_WEIGHT)
+
+
+@override_settings(SNIPPETS={'THROTTLE_RATES': {'script_expansions': '3/min'}})
+class ScriptExpansionThrottleTest(ThrottleTestCase):
+    """Testing that script details are throttled by their snippets"""
+
+    def test_details_cost_their_snippets(self):
+        snippet = Snippet.objects.create(owner=self.user, code='x = 1')
+        script = Script.objects.create(owner=self.user, name='Script',
+                                       snippets=f'{snippet.id},{snippet.id}')
+        url = reverse('script-detail', args=[script.id])
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+        # The list doesn't expand snippets.
+        res = self.client.get(reverse('script-list'))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@override_settings(SNIPPETS={'RENDER_MAX_IN_FLIGHT': 1,
+                             'RENDER_RETRY_AFTER': 2})
+class RenderAdmissionTest(ThrottleTestCase):
+    """Testing the limit of requests rendering at once"""
+
+    def test_writes_over_the_limit_are_rejected(self):
+        self.assertTrue(budgets.render_admission.acquire())
+        try:
+            res = self.client.post(SNIPPETS_URL, {'code': 'x = 1'})
+            self.assertEqual(self.client.get(SNIPPETS_URL).status_code,
+                             status.HTTP_200_OK)
+        finally:
+            budgets.render_admission.release()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '2')
+        self.assertFalse(Snippet.objects.exists())
+
+    def test_slots_are_released(self):
+        for _ in range(2):
+            res = self.client.post(SNIPPETS_URL, {'code': 'x = 1'})
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.client.post(SNIPPETS_URL, {'code': 'x = 1',
+                                              'language': 'unknown'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(budgets.render_admission.stats()['in_flight'], 0)
+
+    @override_settings(SNIPPETS={'RENDER_MAX_IN_FLIGHT': 0,
+                                 'HIGHLIGHT_MODE': 'deferred'})
+    def test_deferred_writes_are_admitted(self):
+        res = self.client.post(SNIPPETS_URL, {'code': 'x = 1'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+
+@override_settings(ROOT_URLCONF='tutorial.asgi_urls',
+                   MIDDLEWARE=ASGI_MIDDLEWARE,
+                   SNIPPETS={'RENDER_MAX_IN_FLIGHT': 1})
+class AsyncRenderAdmissionTest(TestCase):
+    """Testing the render admission of the async views"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser',
+                                             password='testpasswd')
+        self.client = AsyncClient()
+        self.client.force_login(self.user)
+
+    async def test_writes_over_the_limit_are_rejected(self):
+        self.assertTrue(budgets.render_admission.acquire())
+        try:
+            res = await self.client.post(SNIPPETS_URL, {'code': 'x = 1'},
+                                         content_type='application/json')
+        finally:
+            budgets.render_admission.release()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '1')
+
+    async def test_admitted_once(self):
+        res = await self.client.post(SNIPPETS_URL, {'code': 'x = 1'},
+                                     content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(budgets.render_admission.stats()['in_flight'], 0)
+
+
+class ThrottleCacheCheckTest(TestCase):
+    """Testing the warning about per process token buckets"""
+
+    def test_local_memory_cache(self):
+        with override_settings(SNIPPETS={'THROTTLE_CACHE': 'default'}):
+            self.assertEqual([warning.id for warning in
+                              check_throttle_cache(None)], ['snippets.W001'])
+        with override_settings(SNIPPETS={'THROTTLE_CACHE': 'default',
+                                         'THROTTLE_RATES': {}}):
+            self.assertEqual(check_throttle_cache(None), [])
+        self.assertEqual(check_throttle_cache(None), [])
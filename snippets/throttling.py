@@ -0,0 +1,147 @@
+"""
+Cost-aware request throttling.
+
+Throttles are token buckets per user, or per client address for
+anonymous requests, kept in the Django cache named by ``THROTTLE_CACHE``,
+which must be shared by the web processes for the limits to be global.
+The rate of each scope comes from ``THROTTLE_RATES``: ``'240/min'`` is a
+bucket of 240 tokens refilled over a minute. Unlike DRF's throttles,
+requests take as many tokens as they cost:
+
+- ``RenderThrottle`` charges writes to snippets one token per
+  ``RENDER_COST_UNIT`` characters of code, times the relative cost of
+  the lexer measured by ``budgets.render_stats``;
+- ``ScriptExpansionThrottle`` charges script details one token per
+  snippet they expand.
+
+A request costing more than a full bucket is charged a full bucket.
+Buckets are read and written back without a lock across processes, like
+DRF's throttles, so concurrent requests of a user may both be let in.
+"""
+import math
+import threading
+
+from django.core.cache import caches
+from django.db.models.functions import Length
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+from snippets import budgets
+from snippets.conf import get_setting
+from snippets.metrics import registry
+from snippets.models import ScriptSnippet, Snippet
+
+_lock = threading.Lock()
+
+
+class CostThrottle(SimpleRateThrottle):
+    """Token bucket throttle charging requests ``get_cost`` tokens"""
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        self.cache = caches[get_setting('THROTTLE_CACHE')]
+        super().__init__()
+
+    def get_rate(self):
+        return get_setting('THROTTLE_RATES').get(self.scope)
+
+    def get_cache_key(self, request, view):
+        if request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def get_cost(self, request, view):
+        """Return the tokens ``request`` costs, 0 for those not
+        throttled"""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        cost = min(self.get_cost(request, view), self.num_requests)
+        if not cost:
+            return True
+        self.key = self.get_cache_key(request, view)
+        refill = self.num_requests / self.duration
+        with _lock:
+            tokens, updated = self.cache.get(self.key,
+                                             (self.num_requests, None))
+            self.now = self.timer()
+            if updated is not None:
+                tokens = min(self.num_requests,
+                             tokens + (self.now - updated) * refill)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.cache.set(self.key, (tokens, self.now), self.duration)
+        if allowed:
+            self.wait_seconds = 0
+        else:
+            self.wait_seconds = (cost - tokens) / refill
+            registry.record_rejected(self.scope)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def get_lookup(view):
+    """Return the primary key of a detail view's object, or None"""
+    lookup = view.kwargs.get(view.lookup_url_kwarg or view.lookup_field)
+    try:
+        return int(lookup)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_render_units(size, language):
+    """Tokens rendering ``size`` characters of ``language`` code costs"""
+    units = max(1, math.ceil(size / get_setting('RENDER_COST_UNIT')))
+    return math.ceil(units * budgets.render_stats.get_weight(language))
+
+
+class RenderThrottle(CostThrottle):
+    """Charge snippet writes by the code they render"""
+    scope = 'renders'
+
+    def get_cost(self, request, view):
+        if request.method in SAFE_METHODS or request.method == 'DELETE':
+            return 0
+        if getattr(view, 'action', None) == 'bulk':
+            # Items may be streamed, the body size bounds their code. The
+            # view refuses writes without a Content-Length.
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+            return get_render_units(size, None)
+        data = request.data
+        if not hasattr(data, 'get'):
+            return 1
+        code = data.get('code')
+        language = data.get('language')
+        lookup = get_lookup(view)
+        if lookup is not None and (code is None or language is None):
+            stored = Snippet.objects.filter(pk=lookup).values_list(
+                Length('code_blob__content'), 'language').first()
+            if stored is not None:
+                size, stored_language = stored
+                return get_render_units(
+                    len(code) if isinstance(code, str) else size or 0,
+                    language or stored_language)
+        if not isinstance(code, str):
+            return 1
+        return get_render_units(len(code), language or
+                                Snippet._meta.get_field('language').default)
+
+
+class ScriptExpansionThrottle(CostThrottle):
+    """Charge script details by the snippets they expand"""
+    scope = 'script_expansions'
+
+    def get_cost(self, request, view):
+        if request.method not in SAFE_METHODS or view.action != 'retrieve':
+            return 0
+        lookup = get_lookup(view)
+        if lookup is None:
+            return 1
+        return max(1, ScriptSnippet.objects.filter(script_id=lookup).count())
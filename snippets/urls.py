@@ -9,4 +9,12 @@ router.register(r'users', views.UserViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('styles/<str:style>.css', views.stylesheet, name='stylesheet'),
+    path('stats/render-cache/', views.RenderCacheStatsView.as_view(),
+         name='render-cache-stats'),
+    path('stats/render-budgets/', views.RenderBudgetStatsView.as_view(),
+         name='render-budget-stats'),
+    path('stats/response-cache/', views.ResponseCacheStatsView.as_view(),
+         name='response-cache-stats'),
+    path('metrics', views.metrics, name='metrics'),
 ]
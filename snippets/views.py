@@ -1,19 +1,215 @@
 from snippets.serializers import *
+from types import GeneratorType
 from django.contrib.auth.models import User
-from rest_framework import permissions, viewsets
-from snippets.permissions import IsOwnerOrReadOnly
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from pygments import __version__ as pygments_version
+from rest_framework import permissions, renderers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import (APIException, ParseError,
+                                       ValidationError)
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from snippets import budgets, highlighting, search
+from snippets.bulk import BulkProcessor
+from snippets.metrics import registry
+from snippets.mixins import (CachedResponseMixin, ConditionalRequestMixin,
+                             NDJSONExportMixin, RenderAdmissionMixin,
+                             ReplicaReadMixin)
+from snippets.parsers import NDJSONParser, ORJSONParser
+from snippets.permissions import (IsMetricsClient, IsOwnerOrReadOnly,
+                                 is_metrics_client)
+from snippets.registry import STYLE_CHOICES
+from snippets.render_cache import get_render_cache
+from snippets.response_cache import response_cache
+from snippets.throttling import RenderThrottle
 
+STYLES = {style for style, _ in STYLE_CHOICES}
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = User.objects.all()
+
+class LengthRequired(APIException):
+    status_code = status.HTTP_411_LENGTH_REQUIRED
+    default_detail = 'A Content-Length header is required.'
+    default_code = 'length_required'
+
+
+def get_stylesheet_url(style):
+    """Stylesheet url, versioned so it can be cached indefinitely"""
+    url = reverse('stylesheet', args=[style])
+    return f'{url}?v={pygments_version}'
+
+
+class UserViewSet(ReplicaReadMixin, CachedResponseMixin,
+                  viewsets.ReadOnlyModelViewSet):
+    cache_name = 'user'
+    queryset = User.objects.only('id', 'username').prefetch_related(
+        Prefetch('snippets', queryset=Snippet.objects.only('id', 'owner_id')))
     serializer_class = UserSerializer
 
 
-class SnippetViewSet(viewsets.ModelViewSet):
-    queryset = Snippet.objects.all()
+class SnippetViewSet(ReplicaReadMixin, RenderAdmissionMixin,
+                     CachedResponseMixin, ConditionalRequestMixin,
+                     NDJSONExportMixin, viewsets.ModelViewSet):
+    cache_name = 'snippet'
+    queryset = Snippet.objects.select_related('owner')
     serializer_class = SnippetSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly,
                           IsOwnerOrReadOnly]
+    throttle_classes = [RenderThrottle]
+
+    def includes_code(self):
+        """List views leave out the code unless asked with ?include=code"""
+        return (self.action != 'list' or
+                'code' in self.request.query_params.get('include', ''))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'highlight':
+            return queryset.select_related('highlight_blob')
+        if self.includes_code():
+            queryset = queryset.select_related('code_blob')
+        return queryset
+
+    def get_serializer_class(self):
+        if not self.includes_code():
+            return SnippetSummarySerializer
+        return super().get_serializer_class()
+
+    @action(detail=True, renderer_classes=[renderers.StaticHTMLRenderer])
+    def highlight(self, request, *args, **kwargs):
+        """Return the highlighted HTML, or 202 while it is being rendered.
+
+        The fragment is returned with a ``Link`` to the style's stylesheet;
+        pass ``?full=true`` for a standalone document instead.
+        """
+        snippet = self.get_object()
+        headers = {'X-Highlight-Status': snippet.highlight_status}
+        if snippet.highlight_status == Snippet.HIGHLIGHT_READY:
+            if request.query_params.get('full') in ('true', '1'):
+                return Response(snippet.get_highlighted_document(),
+                                headers=headers)
+            stylesheet_url = request.build_absolute_uri(
+                get_stylesheet_url(snippet.style))
+            headers['Link'] = f'<{stylesheet_url}>; rel="stylesheet"'
+            return Response(snippet.get_highlighted_fragment(),
+                            headers=headers)
+        if snippet.highlight_status == Snippet.HIGHLIGHT_FAILED:
+            return Response('Highlighting failed.',
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers=headers)
+        headers['Retry-After'] = '1'
+        return Response('Highlighting is pending.',
+                        status=status.HTTP_202_ACCEPTED, headers=headers)
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
+
+    @action(detail=False)
+    def search(self, request, *args, **kwargs):
+        """Rank snippets matching ``?q=``, with highlighted fragments.
+
+        ``?mode=substring`` matches the query as a substring instead of
+        as words. Results can be narrowed with ``?language=`` and
+        ``?owner=``, and ``?limit=`` returns up to 100 results.
+        """
+        params = request.query_params
+        mode = params.get('mode', search.MODE_WORDS)
+        if mode not in search.MODES:
+            raise ValidationError({'mode': [
+                'Expected one of: {}.'.format(', '.join(search.MODES))]})
+        try:
+            limit = min(int(params.get('limit', SEARCH_LIMIT)),
+                        MAX_SEARCH_LIMIT)
+        except ValueError:
+            raise ValidationError({'limit': ['Expected an integer.']})
+
+        results = []
+        for snippet, rank, fragments in search.search(
+                params.get('q', '').strip(), mode=mode,
+                language=params.get('language'), owner=params.get('owner'),
+                limit=max(limit, 1)):
+            data = SnippetSummarySerializer(
+                snippet, context=self.get_serializer_context()).data
+            data.update(rank=rank, fragments=fragments)
+            results.append(data)
+        return Response({'results': results})
+
+    @action(detail=False, methods=['post', 'put', 'patch', 'delete'],
+            parser_classes=[ORJSONParser, NDJSONParser])
+    def bulk(self, request, *args, **kwargs):
+        """Create (POST), update (PUT/PATCH) or delete (DELETE) many
+        snippets from a JSON array or NDJSON stream.
+
+        Updates and deletions identify snippets by ``id``; deletions also
+        accept plain ids. The response lists one result per item.
+        """
+        if (request.method != 'DELETE' and
+                not request.META.get('CONTENT_LENGTH')):
+            # RenderThrottle charges bulk writes by the size of the body.
+            raise LengthRequired()
+        items = request.data
+        # A JSON array, or the lines NDJSONParser yields.
+        if not isinstance(items, (list, GeneratorType)):
+            raise ParseError('Expected a list of items.')
+        processor = BulkProcessor(request.user)
+        if request.method == 'POST':
+            results = processor.create(items)
+        elif request.method == 'DELETE':
+            results = processor.delete(items)
+        else:
+            results = processor.update(items,
+                                       partial=request.method == 'PATCH')
+        return Response({'results': results},
+                        status=status.HTTP_207_MULTI_STATUS)
+
+
+class RenderCacheStatsView(APIView):
+    """Hit and miss counters of this process's highlight render cache"""
+    permission_classes = [IsMetricsClient]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_render_cache().stats())
+
+
+class RenderBudgetStatsView(APIView):
+    """Render times per lexer in this process, with the renders that went
+    over a budget, the lexers recorded as slow and the requests rendering"""
+    permission_classes = [IsMetricsClient]
+
+    def get(self, request, *args, **kwargs):
+        return Response(dict(budgets.render_stats.stats(),
+                             admission=budgets.render_admission.stats()))
+
+
+class ResponseCacheStatsView(APIView):
+    """Hit ratio of this process's response cache. Requests that waited
+    for a concurrent request to fill the entry count as hits."""
+    permission_classes = [IsMetricsClient]
+
+    def get(self, request, *args, **kwargs):
+        return Response(response_cache.stats())
+
+
+@condition(etag_func=lambda request, style: f'"{pygments_version}-{style}"')
+def stylesheet(request, style):
+    """CSS rules for highlighted fragments rendered with ``style``"""
+    if style not in STYLES:
+        raise Http404('Unknown style.')
+    response = HttpResponse(highlighting.get_stylesheet(style),
+                            content_type='text/css')
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60,
+                        immutable=True)
+    return response
+
+
+def metrics(request):
+    """Request metrics of this process in the Prometheus text format"""
+    if not is_metrics_client(request):
+        raise Http404
+    return HttpResponse(registry.export(),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,196 @@
+"""
+Highlight workers for deferred rendering.
+
+The snippet table doubles as the work queue: rows saved in deferred mode
+are ``pending`` until a worker claims them. A claim is a conditional
+UPDATE that stamps ``highlight_claimed_at``, and results are only written
+back while that stamp is unchanged, so an edit made during rendering (which
+resets the row to ``pending``) is never overwritten with stale output.
+
+Rendering runs in the processes of a render sandbox, under the budgets of
+``snippets.budgets``.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from snippets import budgets, highlighting
+from snippets.conf import get_setting
+from snippets.models import HighlightBlob, Snippet
+from snippets.render_cache import get_render_cache
+from snippets.signals import snippets_updated
+
+logger = logging.getLogger(__name__)
+
+CLAIM_FIELDS = ['highlight_status', 'highlight_claimed_at',
+                'highlight_attempts', 'revision', 'updated']
+FINISH_FIELDS = CLAIM_FIELDS + ['highlight_blob', 'highlight_format',
+                                'highlight_fallback']
+
+
+class HighlightWorker:
+    """Claim pending snippets and render them in a sandbox of processes"""
+
+    def __init__(self, concurrency=None, retries=None, time_budget=None,
+                 stale_after=None):
+        self.concurrency = concurrency or get_setting('HIGHLIGHT_WORKERS')
+        self.retries = (get_setting('HIGHLIGHT_RETRIES')
+                        if retries is None else retries)
+        self.time_budget = (time_budget or
+                            get_setting('HIGHLIGHT_TIME_BUDGET'))
+        self.stale_after = (get_setting('HIGHLIGHT_STALE_AFTER')
+                            if stale_after is None else stale_after)
+        self.highlight_format = get_setting('HIGHLIGHT_STORAGE')
+        self.sandbox = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.sandbox is not None:
+            self.sandbox.close()
+            self.sandbox = None
+
+    def get_sandbox(self):
+        if self.sandbox is None:
+            self.sandbox = budgets.create_sandbox(
+                processes=self.concurrency, timeout=self.time_budget)
+        return self.sandbox
+
+    def claimable(self):
+        stale_before = timezone.now() - timedelta(seconds=self.stale_after)
+        return Snippet.objects.filter(
+            Q(highlight_status=Snippet.HIGHLIGHT_PENDING) |
+            Q(highlight_status=Snippet.HIGHLIGHT_RENDERING,
+              highlight_claimed_at__lt=stale_before))
+
+    def claim(self, limit):
+        """Claim up to ``limit`` snippets, returning ``(id, claimed_at)``"""
+        claimed = []
+        candidates = self.claimable().order_by('id').values_list(
+            'id', 'highlight_status', 'highlight_claimed_at')[:limit * 2]
+        for snippet_id, status, claimed_at in candidates:
+            claimed_now = timezone.now()
+            updated = Snippet.objects.filter(
+                id=snippet_id,
+                highlight_status=status,
+                highlight_claimed_at=claimed_at,
+            ).update(highlight_status=Snippet.HIGHLIGHT_RENDERING,
+                     highlight_claimed_at=claimed_now,
+                     highlight_attempts=F('highlight_attempts') + 1)
+            if updated:
+                claimed.append((snippet_id, claimed_now))
+            if len(claimed) == limit:
+                break
+        if claimed:
+            snippets_updated.send(
+                sender=Snippet, ids=[snippet_id for snippet_id, _ in claimed],
+                fields=CLAIM_FIELDS)
+        return claimed
+
+    def run_once(self):
+        """Render one batch of claimed snippets and return its size"""
+        claimed = dict(self.claim(self.concurrency))
+        if not claimed:
+            return 0
+
+        snippets = Snippet.objects.filter(id__in=claimed).select_related(
+            'code_blob').only('id', 'code_blob', 'code_blob__content',
+                              'language', 'style', 'linenos', 'title',
+                              'highlight_attempts')
+        cache = get_render_cache()
+        sandbox = self.get_sandbox()
+        full = self.highlight_format == Snippet.FORMAT_DOCUMENT
+        jobs = []
+        for snippet in snippets:
+            inputs = dict(snippet.get_render_inputs(), full=full)
+            key = highlighting.render_key(**inputs)
+            html = cache.get(key)
+            if html is not None:
+                self.finish(snippet, claimed[snippet.id], html)
+            else:
+                jobs.append((snippet, key, budgets.submit(inputs, sandbox)))
+
+        for snippet, key, job in jobs:
+            try:
+                html = job.result()
+            except Exception:
+                logger.exception('Highlighting snippet %s failed', snippet.id)
+                self.fail(snippet, claimed[snippet.id])
+            else:
+                if budgets.is_final(html):
+                    cache.set(key, html)
+                self.finish(snippet, claimed[snippet.id], html)
+        return len(claimed)
+
+    def finish(self, snippet, claimed_at, html):
+        blob = HighlightBlob.from_content(html)
+        with transaction.atomic():
+            HighlightBlob.store([blob])
+            updated = Snippet.objects.filter(
+                id=snippet.id,
+                highlight_status=Snippet.HIGHLIGHT_RENDERING,
+                highlight_claimed_at=claimed_at,
+            ).update(highlight_blob=blob.hash,
+                     highlight_format=self.highlight_format,
+                     highlight_fallback=not budgets.is_final(html),
+                     highlight_status=Snippet.HIGHLIGHT_READY,
+                     highlight_attempts=0,
+                     highlight_claimed_at=None,
+                     revision=F('revision') + 1,
+                     updated=timezone.now())
+        if updated:
+            snippets_updated.send(sender=Snippet, ids=[snippet.id],
+                                  fields=FINISH_FIELDS)
+
+    def fail(self, snippet, claimed_at):
+        if snippet.highlight_attempts > self.retries:
+            status = Snippet.HIGHLIGHT_FAILED
+        else:
+            status = Snippet.HIGHLIGHT_PENDING
+        updated = Snippet.objects.filter(
+            id=snippet.id,
+            highlight_status=Snippet.HIGHLIGHT_RENDERING,
+            highlight_claimed_at=claimed_at,
+        ).update(highlight_status=status,
+                 highlight_claimed_at=None,
+                 revision=F('revision') + 1,
+                 updated=timezone.now())
+        if updated:
+            snippets_updated.send(sender=Snippet, ids=[snippet.id],
+                                  fields=CLAIM_FIELDS)
+
+    def run(self, poll_interval=1.0):
+        """Process the queue until interrupted"""
+        while True:
+            if not self.run_once():
+                time.sleep(poll_interval)
+
+
+def render_many(inputs_list, full):
+    """Render many snippets, spreading cache misses over the render
+    processes.
+
+    Returns one result per input, either the HTML or the exception raised
+    while rendering it.
+    """
+    cache = get_render_cache()
+    inputs_list = [dict(inputs, full=full) for inputs in inputs_list]
+    keys = [highlighting.render_key(**inputs) for inputs in inputs_list]
+    results = [cache.get(key) for key in keys]
+    missing = [index for index, html in enumerate(results) if html is None]
+
+    futures = [budgets.submit(inputs_list[index]) for index in missing]
+    for index, future in zip(missing, futures):
+        html = future.exception() or future.result()
+        results[index] = html
+        if not isinstance(html, Exception) and budgets.is_final(html):
+            cache.set(keys[index], html)
+    return results
@@ -0,0 +1,21 @@
+"""
+ASGI config for tutorial project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Loading it sets ``SERVER_MODE`` to ``asgi``, which routes requests to the
+async views, see ``tutorial/settings.py``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tutorial.settings")
+os.environ.setdefault("SERVER_MODE", "asgi")
+
+# WhiteNoise only wraps WSGI applications.
+application = ASGIStaticFilesHandler(get_asgi_application())
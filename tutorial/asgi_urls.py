@@ -0,0 +1,19 @@
+"""
+URLs served by ``tutorial.asgi``: async views in front of the routes of
+``tutorial.urls``, under the same names.
+"""
+from django.urls import include, path
+
+from scripts import async_views as script_views
+from snippets import async_views as snippet_views
+
+urlpatterns = [
+    path('snippets/', snippet_views.snippet_list, name='snippet-list'),
+    path('snippets/<int:pk>/', snippet_views.snippet_detail,
+         name='snippet-detail'),
+    path('snippets/<int:pk>/highlight/', snippet_views.snippet_highlight,
+         name='snippet-highlight'),
+    path('scripts/<int:pk>/source/', script_views.script_source,
+         name='script-source'),
+    path('', include('tutorial.urls')),
+]
@@ -10,10 +10,14 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
+import importlib.util
 import os
 import dj_database_url
 
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
+# 'wsgi' or 'asgi', the entry point served by the web process, see
+# gunicorn.conf.py.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -41,9 +45,11 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'snippets.apps.SnippetsConfig',
+    'scripts.apps.ScriptsConfig',
 ]
 
 MIDDLEWARE = [
+    'snippets.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -73,17 +79,49 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'tutorial.wsgi.application'
+ASGI_APPLICATION = 'tutorial.asgi.application'
+
+if SERVER_MODE == 'asgi':
+    ROOT_URLCONF = 'tutorial.asgi_urls'
+    # Sync only middleware would run every request in the one thread
+    # Django keeps for sync code. tutorial.asgi serves the static files.
+    MIDDLEWARE = [
+        'snippets.metrics.MetricsMiddleware',
+        'snippets.asynchronous.BufferStreamingMiddleware',
+    ] + [middleware for middleware in MIDDLEWARE[1:]
+         if middleware != 'whitenoise.middleware.WhiteNoiseMiddleware']
 
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
 
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds, and
+# checked before each request reuses them (see snippets/replicas.py).
+CONN_MAX_AGE = int(os.getenv('DATABASE_CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default':
     dj_database_url.config(
-        default='sqlite:///{}'.format(os.path.join(BASE_DIR, 'db.sqlite3'))
+        default='sqlite:///{}'.format(os.path.join(BASE_DIR, 'db.sqlite3')),
+        conn_max_age=CONN_MAX_AGE,
     )
 }
 
+# Read replicas of the default database, as space separated urls. For
+# local testing they can be copies of the SQLite file, or other local
+# PostgreSQL databases.
+READ_REPLICAS = []
+for url in os.getenv('DATABASE_REPLICA_URLS', '').split():
+    alias = 'replica{}'.format(len(READ_REPLICAS) + 1)
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=CONN_MAX_AGE)
+    # Tests read the test database of the primary through the replicas.
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    READ_REPLICAS.append(alias)
+
+for database in DATABASES.values():
+    database['CONN_HEALTH_CHECKS'] = CONN_MAX_AGE > 0
+
+DATABASE_ROUTERS = ['snippets.replicas.ReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -129,7 +167,67 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
     'DEFAULT_PAGINATION_CLASS':
-    'rest_framework.pagination.PageNumberPagination',
+    'snippets.pagination.IdCursorPagination',
+    # JSON is encoded with orjson when it is installed, see
+    # snippets/renderers.py.
+    'DEFAULT_RENDERER_CLASSES': [
+        'snippets.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'snippets.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+# MessagePack is negotiated when msgpack is installed.
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'snippets.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append(
+        'snippets.parsers.MessagePackParser')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by every process through the database, created by
+    # `manage.py createcachetable`.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'snippets_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Cached responses of each process, invalidated through their tokens
+    # in the shared cache. Least recently used entries are culled beyond
+    # MAX_ENTRIES.
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Snippets app, see snippets/conf.py for the available options
+SNIPPETS = {
+    'HIGHLIGHT_MODE': os.getenv('HIGHLIGHT_MODE', 'sync'),
+    'RESPONSE_CACHE': 'responses',
+    'RESPONSE_TOKEN_CACHE': 'shared',
+    'THROTTLE_CACHE': 'shared',
+    'REPLICA_PIN_CACHE': 'shared',
+    'READ_REPLICAS': READ_REPLICAS,
+}
+
+# Data migrations report what they changed on this logger
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'snippets.migrations': {'handlers': ['console'], 'level': 'INFO'},
+    },
 }
 
 if ENVIRONMENT == 'production':